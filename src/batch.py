@@ -0,0 +1,258 @@
+import argparse
+import collections
+import concurrent.futures
+import copy
+import crossword_tools
+import json
+import os
+import solver
+import sys
+import time
+import word_loader
+
+# The extension of the puzzle files read from a directory.
+PUZZLE_FILE_EXTENSION = ".txt"
+
+# How many puzzles are handed to the worker processes for each worker before
+# the results of the first ones are waited on, so that a stream of puzzles is
+# not read any further ahead than the workers need.
+PUZZLES_PER_WORKER = 4
+
+# The word index and search settings of a worker process, set up once by
+# _init_worker.
+_worker_batch = None
+
+def solve_batch(puzzles, word_bank, workers=None, options=None,
+                max_solutions=None, count_only=False):
+    """
+    Solves many puzzles with the same word bank, building the index of the
+    word bank only once. The puzzles are solved one to a process, across a
+    pool of worker processes.
+    
+    Args:
+        puzzles: An iterable of puzzles, each of which is either a
+                 crossword_tools.Puzzle object or the path of a file in the
+                 form crossword_tools.read_tile_map takes. It is only read as
+                 far ahead as the workers need.
+        word_bank: A list of strings, or a word_loader.IndexedWordBank.
+        workers: An optional number of processes to solve the puzzles in. If
+                 it is not provided, or is 1, the puzzles are solved in this
+                 process.
+        options: An optional solver.SearchOptions object holding the settings
+                 of every search.
+        max_solutions: An optional integer limit on the number of solutions
+                       found for each puzzle.
+        count_only: True if the solutions should be counted rather than kept.
+    
+    Yields:
+        A result record, as made by solve_puzzle, for every puzzle, in the
+        same order as the puzzles.
+    """
+    
+    start_time = time.perf_counter()
+    word_index = solver.index_word_bank(word_bank)
+    index_seconds = time.perf_counter() - start_time
+    
+    batch = (word_index, options, max_solutions, count_only)
+    if not workers or workers <= 1:
+        for number, puzzle in enumerate(puzzles):
+            yield _add_index_time(solve_puzzle(number, puzzle, *batch),
+                                  index_seconds)
+        return
+    
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=batch) as executor:
+        pending = collections.deque()
+        for number, puzzle in enumerate(puzzles):
+            pending.append(executor.submit(_solve_worker_puzzle, number,
+                                           puzzle))
+            if len(pending) >= workers * PUZZLES_PER_WORKER:
+                yield _add_index_time(pending.popleft().result(),
+                                      index_seconds)
+        
+        while pending:
+            yield _add_index_time(pending.popleft().result(), index_seconds)
+
+def solve_puzzle(number, puzzle, word_index, options=None, max_solutions=None,
+                 count_only=False):
+    """
+    Solves one puzzle of a batch.
+    
+    Args:
+        number: The integer position of the puzzle in the batch.
+        puzzle: A crossword_tools.Puzzle object, or the path of a puzzle file.
+        word_index: The solver.WordIndex of the word bank.
+        options: An optional solver.SearchOptions object.
+        max_solutions: An optional integer limit on the number of solutions,
+                       where 0 keeps none.
+        count_only: True if the solutions should be counted rather than kept.
+    
+    Returns:
+        A dictionary that can be written out as JSON, holding the number of
+        the puzzle, its path if it was read from a file, the number of lines
+        in it, the number of solutions found, the solutions themselves unless
+        they were only counted, and the seconds spent reading and solving it.
+        If the puzzle could not be read, the record holds the error instead of
+        the lines and solutions.
+    """
+    
+    record = {"number": number}
+    start_time = time.perf_counter()
+    if isinstance(puzzle, str):
+        record["path"] = puzzle
+        try:
+            puzzle = crossword_tools.load_puzzle(puzzle)
+        except (OSError, ValueError) as error:
+            record["error"] = str(error)
+            return record
+    
+    puzzle = solver.compile_puzzle(puzzle)
+    read_time = time.perf_counter()
+    
+    record["lines"] = len(puzzle)
+    fitting_words = solver.fit_words(puzzle, word_index)
+    if fitting_words is None:
+        num_solutions = 0
+        solutions = []
+    elif count_only:
+        num_solutions = solver.tally_solutions(puzzle, word_index,
+                                               fitting_words, options)
+    else:
+        solutions = []
+        if max_solutions is None or max_solutions > 0:
+            for solution in solver.generate_solutions(puzzle, word_index,
+                                                      fitting_words, options):
+                solutions.append(copy.copy(solution))
+                if len(solutions) == max_solutions:
+                    break
+        num_solutions = len(solutions)
+    solve_time = time.perf_counter()
+    
+    record["num_solutions"] = num_solutions
+    if not count_only:
+        record["solutions"] = solutions
+    record["read_seconds"] = read_time - start_time
+    record["solve_seconds"] = solve_time - read_time
+    return record
+
+def _add_index_time(record, index_seconds):
+    """
+    Adds the time spent indexing the word bank, which every puzzle shares, to
+    a result record.
+    """
+    
+    record["index_seconds"] = index_seconds
+    return record
+
+def _init_worker(word_index, options, max_solutions, count_only):
+    """
+    Stores the state shared by every puzzle in a worker process, so that it is
+    only sent to the process once.
+    """
+    
+    global _worker_batch
+    _worker_batch = (word_index, options, max_solutions, count_only)
+
+def _solve_worker_puzzle(number, puzzle):
+    """
+    Solves a puzzle in a worker process set up by _init_worker.
+    """
+    
+    return solve_puzzle(number, puzzle, *_worker_batch)
+
+def find_puzzle_files(paths):
+    """
+    Finds the puzzle files named by a list of paths. A path to a directory
+    stands for every file in it ending in PUZZLE_FILE_EXTENSION, in order of
+    name, and the path "-" stands for the paths read from standard input, one
+    per line.
+    
+    Args:
+        paths: A list of paths.
+    
+    Yields:
+        The path of every puzzle file.
+    """
+    
+    for path in paths:
+        if path == "-":
+            for line in sys.stdin:
+                if line.strip():
+                    yield line.strip()
+        elif os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(PUZZLE_FILE_EXTENSION):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+def write_records(records, output):
+    """
+    Writes result records as JSON, one record per line, as they are made.
+    
+    Args:
+        records: An iterable of dictionaries, as made by solve_puzzle.
+        output: A text file the records are written to.
+    """
+    
+    for record in records:
+        output.write(json.dumps(record) + "\n")
+        output.flush()
+
+def main(args=None):
+    """
+    Solves a batch of puzzle files from the command line, writing a result
+    record for every puzzle.
+    
+    Args:
+        args: An optional list of the command line arguments. If it is not
+              provided, the arguments this process was started with are used.
+    """
+    
+    parser = argparse.ArgumentParser(
+        description="Solve many crossword puzzles with one word list.")
+    parser.add_argument("word_list", help="a file with one word per line")
+    parser.add_argument("puzzles", nargs="+",
+                        help="puzzle files, directories of puzzle files, or - "
+                             "to read their paths from standard input")
+    parser.add_argument("-o", "--output",
+                        help="the file to write the results to, instead of "
+                             "standard output")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(),
+                        help="the number of processes to solve puzzles in")
+    parser.add_argument("-n", "--max-solutions", type=int,
+                        help="the most solutions to find for each puzzle")
+    parser.add_argument("-c", "--count-only", action="store_true",
+                        help="count the solutions rather than writing them")
+    parser.add_argument("--cache-dir",
+                        help="the directory to keep the word list index in")
+    parser.add_argument("--propagate", action="store_true",
+                        help="enforce arc consistency after every guess")
+    parser.add_argument("--heuristic", default=solver.DEFAULT_HEURISTIC,
+                        choices=sorted(solver.HEURISTICS.keys()))
+    parser.add_argument("--engine", default=solver.DEFAULT_ENGINE,
+                        choices=sorted(solver.DOMAIN_STORES.keys()))
+    parser.add_argument("--table-size", type=int, default=0,
+                        help="the number of finished subproblems to remember "
+                             "so they are not searched again")
+    parsed = parser.parse_args(args)
+    if parsed.max_solutions is not None and parsed.max_solutions < 0:
+        parser.error("--max-solutions must be at least 0")
+    
+    word_bank = word_loader.load_word_bank(parsed.word_list, parsed.cache_dir)
+    options = solver.SearchOptions(parsed.propagate, parsed.heuristic,
+                                   engine=parsed.engine, 
+                                   table_size=parsed.table_size)
+    records = solve_batch(find_puzzle_files(parsed.puzzles), word_bank,
+                          parsed.workers, options, parsed.max_solutions,
+                          parsed.count_only)
+    
+    if parsed.output:
+        with open(parsed.output, "w") as output:
+            write_records(records, output)
+    else:
+        write_records(records, sys.stdout)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+import argparse
+import collections
+import constants
+import crossword_tools
+import json
+import os
+import random
+import solver
+import sys
+import time
+import tracemalloc
+
+# The ways the blocked tiles of a generated grid can be laid out. Random grids
+# open each tile on its own, symmetric grids mirror every tile through the
+# centre like a published crossword, and lattice grids open every tile in an
+# even row or column, so that every other tile of a line is a crossing.
+PATTERN_RANDOM = "random"
+PATTERN_SYMMETRIC = "symmetric"
+PATTERN_LATTICE = "lattice"
+
+# The file the baselines are kept in, next to this module.
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "benchmark_baselines.json")
+
+# How much slower, and how much more memory hungry, a case can get than its
+# baseline before the benchmark fails. Timings are noisy, so small absolute
+# changes are never counted as regressions.
+TIME_TOLERANCE = 2.0
+MIN_TIME_CHANGE = 0.05
+MEMORY_TOLERANCE = 1.25
+
+# The number of times each case is timed. The fastest time is reported.
+REPEATS = 3
+
+# A grid and word bank the solver is measured on. The grid is width by height
+# tiles, with about density of them open, laid out in one of the patterns
+# above. The word bank has bank_size words, spelt from the first
+# alphabet_size letters of the alphabet, whose frequencies fall off with
+# their rank raised to the power of skew. If planted is True, the words of one
+# filling of the grid are added to the word bank, so that it has at least one
+# solution.
+BenchmarkCase = collections.namedtuple(
+    "BenchmarkCase", ["name", "width", "height", "density", "pattern",
+                      "bank_size", "alphabet_size", "skew", "planted", "seed"])
+
+CASES = [
+    BenchmarkCase("small-random", 5, 5, 0.7, PATTERN_RANDOM, 120, 26, 1.0,
+                  True, 1),
+    BenchmarkCase("medium-random", 6, 6, 0.65, PATTERN_RANDOM, 150, 26, 0.5,
+                  True, 7),
+    BenchmarkCase("skewed-random", 7, 7, 0.7, PATTERN_RANDOM, 80, 26, 1.5,
+                  True, 4),
+    BenchmarkCase("small-lattice", 5, 5, 1.0, PATTERN_LATTICE, 200, 26, 0.5,
+                  True, 2),
+    BenchmarkCase("medium-lattice", 7, 7, 1.0, PATTERN_LATTICE, 300, 26, 0.5,
+                  True, 2),
+    BenchmarkCase("large-lattice", 9, 9, 0.95, PATTERN_LATTICE, 600, 26, 0.5,
+                  True, 5),
+    BenchmarkCase("medium-symmetric", 7, 7, 0.7, PATTERN_SYMMETRIC, 250, 26,
+                  0.5, True, 3),
+    BenchmarkCase("large-symmetric", 9, 9, 0.75, PATTERN_SYMMETRIC, 600, 26,
+                  0.5, True, 8),
+    BenchmarkCase("unplanted-symmetric", 6, 6, 0.75, PATTERN_SYMMETRIC, 200,
+                  26, 1.0, False, 6),
+    BenchmarkCase("unsolvable-lattice", 7, 7, 1.0, PATTERN_LATTICE, 400, 26,
+                  0.5, False, 9),
+]
+
+# The solver settings every case is run with, by name. Engines that cannot be
+# used here are skipped.
+CONFIGURATIONS = collections.OrderedDict([
+    ("python", {}),
+    ("python-propagate", {"propagate": True}),
+    ("python-wdeg-backjump", {"heuristic": solver.HEURISTIC_DOM_WDEG,
+                              "backjump": True}),
+    ("numpy", {"engine": solver.ENGINE_NUMPY}),
+    ("numpy-propagate", {"engine": solver.ENGINE_NUMPY, "propagate": True}),
+])
+
+def generate_tile_map(width, height, density, pattern, rand):
+    """
+    Generates the tiles of a crossword grid.
+    
+    Args:
+        width: The integer number of columns in the grid.
+        height: The integer number of rows in the grid.
+        density: The chance, between 0 and 1, of each tile being open. For
+                 lattice grids, it is the chance of each tile that the lattice
+                 opens staying open.
+        pattern: PATTERN_RANDOM, PATTERN_SYMMETRIC or PATTERN_LATTICE.
+        rand: The random.Random object the grid is drawn from.
+    
+    Returns:
+        A crossword_tools.DenseCoordMap mapping every tile in the grid to True
+        if it is open, and False if it is blocked.
+    """
+    
+    tile_map = crossword_tools.DenseCoordMap(width, height)
+    for y in range(height):
+        for x in range(width):
+            if pattern == PATTERN_SYMMETRIC:
+                # The second half of the grid copies the first.
+                mirror_x = width - 1 - x
+                mirror_y = height - 1 - y
+                if (y, x) > (mirror_y, mirror_x):
+                    tile_map.set_val(x, y, tile_map.get_val(mirror_x,
+                                                            mirror_y))
+                    continue
+                
+                is_open = rand.random() < density
+            elif pattern == PATTERN_LATTICE:
+                is_open = ((x % 2 == 0 or y % 2 == 0) and
+                           rand.random() < density)
+            elif pattern == PATTERN_RANDOM:
+                is_open = rand.random() < density
+            else:
+                raise ValueError("Unknown grid pattern {}".format(pattern))
+            
+            tile_map.set_val(x, y, is_open)
+    
+    return tile_map
+
+def generate_word_bank(size, lengths, alphabet_size, skew, rand):
+    """
+    Generates a word bank of different random words.
+    
+    Args:
+        size: The integer number of words in the word bank. There are fewer if
+              there are not that many words of the provided lengths.
+        lengths: A list of the lengths the words can have, each of which is
+                 picked as often as the others.
+        alphabet_size: The number of letters, from the start of the alphabet,
+                       the words are spelt with.
+        skew: How much more common the first letters are than the last ones.
+              The chance of each letter is proportional to one over its rank
+              raised to the power of skew, so 0 makes every letter as likely.
+        rand: The random.Random object the words are drawn from.
+    
+    Returns:
+        A list of strings.
+    """
+    
+    letters = [chr(ord('a') + i) for i in range(alphabet_size)]
+    weights = [1 / (rank + 1) ** skew for rank in range(alphabet_size)]
+    lengths = sorted(set(lengths))
+    size = min(size, sum(alphabet_size ** length for length in lengths))
+    
+    words = set()
+    word_bank = []
+    while len(word_bank) < size:
+        word = "".join(rand.choices(letters, weights, k=rand.choice(lengths)))
+        if word not in words:
+            words.add(word)
+            word_bank.append(word)
+    
+    return word_bank
+
+def generate_case(case):
+    """
+    Generates the puzzle and word bank of a benchmark case. The same case
+    always generates the same puzzle and word bank.
+    
+    Args:
+        case: A BenchmarkCase.
+    
+    Returns:
+        A tuple of the crossword_tools.Puzzle and the list of words.
+    """
+    
+    rand = random.Random(case.seed)
+    tile_map = generate_tile_map(case.width, case.height, case.density,
+                                 case.pattern, rand)
+    puzzle = crossword_tools.generate_puzzle_from_selected_tile_map(tile_map)
+    lengths = [line.length for line in puzzle.lines.values()]
+    if not lengths:
+        return puzzle, []
+    
+    word_bank = generate_word_bank(case.bank_size, lengths, case.alphabet_size,
+                                   case.skew, rand)
+    if case.planted:
+        # Filling every tile of the drawn puzzle with a random letter gives
+        # words that all fit together.
+        letters = [chr(ord('a') + i) for i in range(case.alphabet_size)]
+        layout = crossword_tools.PuzzleLayout(puzzle)
+        tiles = {}
+        for line_id, x, y, direction, length in layout.lines:
+            word = []
+            for i in range(length):
+                if direction == crossword_tools.DIR_RIGHT:
+                    tile = (x + i, y)
+                else:
+                    tile = (x, y + i)
+                if tile not in tiles:
+                    tiles[tile] = rand.choice(letters)
+                word.append(tiles[tile])
+            word_bank.append("".join(word))
+    
+    rand.shuffle(word_bank)
+    return puzzle, word_bank
+
+def run_case(case, configuration, repeats=REPEATS):
+    """
+    Solves a benchmark case, measuring how long it takes, how many words the
+    search tries and how much memory it needs.
+    
+    Args:
+        case: A BenchmarkCase.
+        configuration: A dictionary of the keyword arguments solver.solve is
+                       called with.
+        repeats: The number of times the search is timed.
+    
+    Returns:
+        A dictionary holding the number of solutions, the number of words put
+        in lines, the fastest time taken, in seconds, and the most memory
+        allocated at once, in bytes.
+    """
+    
+    puzzle, word_bank = generate_case(case)
+    
+    def solve(stats=None):
+        return solver.solve(puzzle, word_bank, stats=stats, **configuration)
+    
+    stats = solver.SearchStats()
+    solutions = solve(stats)
+    
+    seconds = None
+    for i in range(repeats):
+        start_time = time.perf_counter()
+        solve()
+        run_seconds = time.perf_counter() - start_time
+        if seconds is None or run_seconds < seconds:
+            seconds = run_seconds
+    
+    tracemalloc.start()
+    try:
+        solve()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    
+    return {"solutions": len(solutions) if solutions else 0,
+            "nodes": stats.nodes,
+            "seconds": seconds,
+            "peak_bytes": peak_bytes}
+
+def find_regressions(result, baseline):
+    """
+    Compares the result of a case with its baseline.
+    
+    Args:
+        result: A dictionary returned by run_case.
+        baseline: A dictionary returned by run_case for an earlier version of
+                  the solver.
+    
+    Returns:
+        A list of strings describing every way the result is worse than the
+        baseline, which is empty if it is not.
+    """
+    
+    regressions = []
+    if result["solutions"] != baseline["solutions"]:
+        regressions.append(constants.BENCHMARK_SOLUTIONS_CHANGED_STR.format(
+            baseline["solutions"], result["solutions"]))
+    if result["nodes"] > baseline["nodes"]:
+        regressions.append(constants.BENCHMARK_NODES_REGRESSED_STR.format(
+            baseline["nodes"], result["nodes"]))
+    if (result["seconds"] > baseline["seconds"] * TIME_TOLERANCE and
+            result["seconds"] - baseline["seconds"] > MIN_TIME_CHANGE):
+        regressions.append(constants.BENCHMARK_TIME_REGRESSED_STR.format(
+            baseline["seconds"], result["seconds"]))
+    if result["peak_bytes"] > baseline["peak_bytes"] * MEMORY_TOLERANCE:
+        regressions.append(constants.BENCHMARK_MEMORY_REGRESSED_STR.format(
+            baseline["peak_bytes"], result["peak_bytes"]))
+    
+    return regressions
+
+def available_configurations():
+    """
+    Gets the solver settings that can be used here.
+    
+    Returns:
+        A list of tuples of the name of every configuration in CONFIGURATIONS
+        whose engine can be used, and its keyword arguments.
+    """
+    
+    configurations = []
+    for name, configuration in CONFIGURATIONS.items():
+        try:
+            solver.SearchOptions(**configuration)
+        except ImportError:
+            continue
+        configurations.append((name, configuration))
+    
+    return configurations
+
+def load_baselines(path):
+    """
+    Reads stored baselines.
+    
+    Args:
+        path: The path of a JSON file written by save_baselines.
+    
+    Returns:
+        A dictionary mapping the name of every case and configuration, joined
+        by a slash, to its baseline, which is empty if the file does not exist.
+    """
+    
+    if not os.path.exists(path):
+        return {}
+    
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+def save_baselines(path, baselines):
+    """
+    Writes baselines to a JSON file.
+    
+    Args:
+        path: The path of the file.
+        baselines: A dictionary in the form load_baselines returns.
+    """
+    
+    with open(path, "w") as baseline_file:
+        json.dump(baselines, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write("\n")
+
+def main(args=None):
+    """
+    Runs the benchmark from the command line, printing a line for every case
+    and configuration. Exits with a status of 1 if any of them regressed past
+    its stored baseline.
+    
+    Args:
+        args: An optional list of the command line arguments. If it is not
+              provided, the arguments this process was started with are used.
+    """
+    
+    parser = argparse.ArgumentParser(
+        description="Measure the solver on generated puzzles.")
+    parser.add_argument("cases", nargs="*",
+                        help="the names of the cases to run, which is all of "
+                             "them if none are given")
+    parser.add_argument("--baselines", default=BASELINES_PATH,
+                        help="the file the baselines are kept in")
+    parser.add_argument("--update", action="store_true",
+                        help="store the results as the new baselines rather "
+                             "than comparing them with the old ones")
+    parser.add_argument("--repeats", type=int, default=REPEATS,
+                        help="the number of times each case is timed")
+    parsed = parser.parse_args(args)
+    
+    cases = [case for case in CASES
+             if not parsed.cases or case.name in parsed.cases]
+    unknown_names = set(parsed.cases) - set(case.name for case in CASES)
+    if unknown_names:
+        parser.error("unknown cases: {}".format(
+            ", ".join(sorted(unknown_names))))
+    
+    baselines = load_baselines(parsed.baselines)
+    num_regressions = 0
+    print(constants.BENCHMARK_HEADER_STR.format(
+        "case", "configuration", "solutions", "nodes", "ms", "KiB"))
+    for case in cases:
+        for name, configuration in available_configurations():
+            key = "{}/{}".format(case.name, name)
+            result = run_case(case, configuration, parsed.repeats)
+            print(constants.BENCHMARK_RESULT_STR.format(
+                case.name, name, result["solutions"], result["nodes"],
+                result["seconds"] * 1000, result["peak_bytes"] / 1024))
+            
+            if parsed.update:
+                baselines[key] = result
+            elif key in baselines:
+                for regression in find_regressions(result, baselines[key]):
+                    num_regressions = num_regressions + 1
+                    print(constants.BENCHMARK_REGRESSION_STR.format(
+                        regression))
+    
+    if parsed.update:
+        save_baselines(parsed.baselines, baselines)
+    elif num_regressions:
+        print(constants.BENCHMARK_FAILED_STR.format(num_regressions),
+              file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
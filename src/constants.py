@@ -18,4 +18,24 @@ RIGHT_BTN_TEXT =            (">")
 ENTER_BTN_TEXT =            ("Enter")
 NEW_PUZZLE_BTN_TEXT =       ("New puzzle")
 GUI_SELECTED_TILE_COLOR =   ("white")
-GUI_DESELECTED_TILE_COLOR = ("grey")
\ No newline at end of file
+GUI_DESELECTED_TILE_COLOR = ("grey")
+SOLUTION_HEADER_STR =       ("Solution {}:")
+SOLUTION_COUNT_STR =        ("Found {} solution{}")
+STEP_TIME_STR =             ("{}: {:.3f} seconds")
+READ_STEP_STR =             ("Reading the puzzle")
+LOAD_STEP_STR =             ("Loading the word list")
+SOLVE_STEP_STR =            ("Solving")
+BENCHMARK_HEADER_STR =      ("{:<20} {:<22} {:>9} {:>9} {:>9} {:>9}")
+BENCHMARK_RESULT_STR =      ("{:<20} {:<22} {:>9} {:>9} {:>9.1f} {:>9.1f}")
+BENCHMARK_REGRESSION_STR =  ("    regressed: {}")
+BENCHMARK_SOLUTIONS_CHANGED_STR = ("found {1} solutions rather than {0}")
+BENCHMARK_NODES_REGRESSED_STR = ("tried {1} words rather than {0}")
+BENCHMARK_TIME_REGRESSED_STR = ("took {1:.4f} seconds rather than {0:.4f}")
+BENCHMARK_MEMORY_REGRESSED_STR = ("used {1} bytes rather than {0}")
+BENCHMARK_FAILED_STR =      ("{} regressions past the baselines")
+SEARCH_STATS_STR =          ("Tried {} words, took back {} of them, ran out " +
+                             "of words for a line {} times and ruled out {} " +
+                             "words at crossings")
+STOPPED_EARLY_STR =         ("Stopped early ({} limit reached), so there " +
+                             "may be more solutions")
+SERVER_LISTENING_STR =      ("Serving the word banks {} at {}")
@@ -20,7 +20,7 @@ def display_crossword_generation_window(canvas_width, canvas_height, callback):
                   user input.
     """
     
-    selected_tile_map = crossword_tools.CoordMap()
+    selected_tile_map = crossword_tools.DenseCoordMap()
 
     def on_button_click(btn, r, c):
         """
@@ -84,9 +84,11 @@ def display_puzzle_solutions(puzzle, solution_set, new_puzzle):
     Args:
         puzzle: A crossword_tools.Puzzle object representing the puzzle that
                 was solved.
-        solution_set: A list of solutions to the puzzle, where each solution
-                      is a dictionary mapping every line id in the puzzle to
-                      a string that goes at that line.
+        solution_set: A list or iterator of solutions to the puzzle, where
+                      each solution is a dictionary mapping every line id in
+                      the puzzle to a string that goes at that line. Each
+                      solution is only drawn once its page is shown, so an
+                      iterator is only read as far as the user pages.
         new_puzzle: A function that takes no arguments, and restarts the puzzle
                     creation process
     """
@@ -98,24 +100,25 @@ def display_puzzle_solutions(puzzle, solution_set, new_puzzle):
         
         new_puzzle()
     
-    solution_coord_maps = crossword_tools.get_puzzle_coordmaps(puzzle, solution_set)
-    display_coordmaps_on_pages(solution_coord_maps, 
-                               solution_coord_maps[0].get_max_x() + 1, 
-                               solution_coord_maps[0].get_max_y() + 1, 
+    layout = crossword_tools.PuzzleLayout(puzzle)
+    display_coordmaps_on_pages(solution_set, layout.width, layout.height, 
                                True, constants.NEW_PUZZLE_BTN_TEXT, 
-                               on_restart_button, True)
+                               on_restart_button, True, layout.render)
 
 def display_coordmaps_on_pages(coordmaps, grid_width, grid_height,
                                show_middle_btn=False, middle_btn_text=None,
                                middle_button_action=None, 
-                               close_on_middle_btn=False):
+                               close_on_middle_btn=False, render_page=None):
     """
     Displays the values of each of the provided coordmaps on a page, where the
     user can navigate through the pages using navigation buttons.
     
     Args:
-        coordmaps: A list of crossword_tools.CoordMap objects that are going to
-                   be displayed to the user
+        coordmaps: A list or iterator of crossword_tools.CoordMap objects that
+                   are going to be displayed to the user, or of the pages 
+                   render_page turns into them. An iterator is read one page
+                   ahead of the page being shown, so that it is known whether
+                   there is a next page.
         grid_width: The width, in tiles, the portion of the grid displaying
                     the coordmaps must be in order to show all of them properly
         grid_height: The height, in tiles, the portion of the grid displaying
@@ -128,6 +131,9 @@ def display_coordmaps_on_pages(coordmaps, grid_width, grid_height,
                               is clicked
         close_on_middle_btn: True if the window generated by this function
                              should close when the middle button is clicked
+        render_page: An optional function that takes a page from coordmaps
+                     and returns the CoordMap to display for it. It is only
+                     called when the page is shown.
         
     """
     
@@ -136,10 +142,44 @@ def display_coordmaps_on_pages(coordmaps, grid_width, grid_height,
     
     grid_width = max(grid_width + 2 * BORDER_WIDTH, MIN_WIDTH)
     grid_height = grid_height + 2 * BORDER_WIDTH
-    num_coordmaps = len(coordmaps)
+    remaining_pages = iter(coordmaps)
+    pages = []
     grid_tiles = []
     current_page = 0
     
+    def has_page(page):
+        """
+        Reads pages from coordmaps until the page with the provided number has
+        been read, or there are no more pages.
+        
+        Args:
+            page: The number of the page, starting at 0.
+        
+        Returns:
+            True if the page exists, and False if not.
+        """
+        
+        while len(pages) <= page:
+            try:
+                pages.append(next(remaining_pages))
+            except StopIteration:
+                return False
+        
+        return True
+    
+    def display_page(page):
+        """
+        Displays the page with the provided number, which must have been read.
+        
+        Args:
+            page: The number of the page, starting at 0.
+        """
+        
+        if render_page:
+            display_coordmap(render_page(pages[page]))
+        else:
+            display_coordmap(pages[page])
+    
     def display_coordmap(coordmap):
         """
         Modifies the tkinter elements stored in grid_tiles to display the
@@ -173,16 +213,16 @@ def display_coordmaps_on_pages(coordmaps, grid_width, grid_height,
         """
         
         nonlocal current_page
-        if current_page + 1 >= num_coordmaps:
+        if not has_page(current_page + 1):
             return
         
         current_page = current_page + 1
-        if current_page + 1 >= num_coordmaps:
+        if not has_page(current_page + 1):
             next_page_btn.configure(state=tkinter.DISABLED)
         
         prev_page_btn.configure(state=tkinter.NORMAL)
         
-        display_coordmap(coordmaps[current_page])
+        display_page(current_page)
         
     def prev_page(next_page_btn, prev_page_btn):
         """
@@ -204,7 +244,7 @@ def display_coordmaps_on_pages(coordmaps, grid_width, grid_height,
 
         next_page_btn.configure(state=tkinter.NORMAL)
             
-        display_coordmap(coordmaps[current_page])
+        display_page(current_page)
     
     def on_middle_btn_click(root):
         """
@@ -222,7 +262,7 @@ def display_coordmaps_on_pages(coordmaps, grid_width, grid_height,
         if middle_button_action:
             middle_button_action()
     
-    if not coordmaps:
+    if not has_page(0):
         return
         
     root = tkinter.Tk()
@@ -240,7 +280,7 @@ def display_coordmaps_on_pages(coordmaps, grid_width, grid_height,
             grid_tiles[x].append(tile)
             tile.grid(row=y, column=x)
 
-    if len(coordmaps) <= 1:
+    if not has_page(1):
         next_btn_state = tkinter.DISABLED
     else:
         next_btn_state = tkinter.NORMAL
@@ -266,6 +306,6 @@ def display_coordmaps_on_pages(coordmaps, grid_width, grid_height,
     middle_btn.grid(row=grid_height, column=int(grid_width / 2 - 1), 
                    columnspan = 2 + grid_width % 2)
     
-    display_coordmap(coordmaps[0])
+    display_page(0)
     
     root.mainloop()
@@ -4,12 +4,16 @@ Created on Sep 6, 2016
 @author: Jacob Brunsting
 '''
 
-import copy
+import array
 
 DIR_DOWN = 0
 DIR_RIGHT = 1
 FILLER_CHAR = '#'
 
+# What a DenseCoordMap holds at the coordinates that have not been mapped, so
+# that they can be told apart from coordinates that were mapped to None.
+_UNMAPPED = object()
+
 
 class Puzzle(object):
     """
@@ -99,6 +103,73 @@ class Puzzle(object):
             return (first_word[self.first_intersect]
                  == second_word[self.second_intersect])
 
+class CompiledPuzzle(object):
+    """
+    A Puzzle flattened into the plain sequences a search reads over and over.
+    Lines are numbered from 0 in the order they appear in puzzle.lines, and 
+    each line's crossings are kept as a tuple of integer triples, so walking 
+    them does not mean looking up attributes on intersection point objects.
+    
+    Attributes:
+        source: The Puzzle the lines were taken from.
+        line_ids: A list mapping the number of every line to its id in source.
+        lengths: An array mapping the number of every line to its length.
+        crossings: A list mapping the number of every line to a tuple of
+                   (neighbour, position, neighbour_position) triples, one for
+                   every line it intersects, giving the number of that line,
+                   the position in this line the lines intersect, and the
+                   position in that line the lines intersect.
+    """
+    
+    __slots__ = ('source', 'line_ids', 'lengths', 'crossings')
+    
+    def __init__(self, puzzle, line_ids=None):
+        """
+        Args:
+            puzzle: The Puzzle being compiled.
+            line_ids: An optional list of the ids of the lines to compile. 
+                      Every line they intersect must be in the list too. If it
+                      is not provided, every line in the puzzle is compiled.
+        """
+        
+        if line_ids is None:
+            line_ids = list(puzzle.lines.keys())
+        
+        self.source = puzzle
+        self.line_ids = list(line_ids)
+        self.lengths = array.array('l')
+        self.crossings = []
+        
+        line_numbers = {line_id: number 
+                        for number, line_id in enumerate(self.line_ids)}
+        for line_id in self.line_ids:
+            line = puzzle.lines[line_id]
+            self.lengths.append(line.length)
+            self.crossings.append(tuple(
+                (line_numbers[intersect.second_id], intersect.first_intersect,
+                 intersect.second_intersect) 
+                for intersect in line.intersection_points))
+    
+    def __len__(self):
+        return len(self.line_ids)
+    
+    def subpuzzle(self, line_numbers):
+        """
+        Compiles a part of the same puzzle.
+        
+        Args:
+            line_numbers: A list of the numbers of the lines to compile, in the
+                          order they are numbered in the new puzzle. Every line
+                          they intersect must be in the list too.
+        
+        Returns:
+            A CompiledPuzzle of the lines, whose line_ids still refer to the 
+            lines of source.
+        """
+        
+        line_ids = [self.line_ids[number] for number in line_numbers]
+        return CompiledPuzzle(self.source, line_ids)
+
 class CoordMap(object):
     """
     An enhanced dictionary of dictionaries, mapping x, y coordinates to values
@@ -161,11 +232,8 @@ class CoordMap(object):
                      in the y axis before they are added.
         """
         
-        new_coords = coordmap.get_filled_coords()
-        
-        for coord in new_coords:
-            self.set_val(coord.x + xoffset, coord.y + yoffset, 
-                         coordmap.get_val(coord.x, coord.y))
+        for x, y, val in coordmap.get_filled_items():
+            self.set_val(x + xoffset, y + yoffset, val)
     
     def get_val(self, x, y):
         """
@@ -206,6 +274,19 @@ class CoordMap(object):
                                              y + self._y_shift))
         return coords
     
+    def get_filled_items(self):
+        """
+        Gets the coordinates that are assigned to some value, along with their
+        values.
+        
+        Returns:
+            A list of (x, y, value) tuples, one for every mapped coordinate.
+        """
+        
+        return [(x + self._x_shift, y + self._y_shift, val)
+                for x, column in self._coord_map.items() 
+                for y, val in column.items()]
+    
     def get_min_x(self):
         """
         Gets the minimum x value a mapped coordinate has in this CoordMap.
@@ -297,6 +378,301 @@ class CoordMap(object):
             self.x = x
             self.y = y
 
+class DenseCoordMap(object):
+    """
+    A CoordMap that keeps its values in one flat list, row after row, covering
+    a rectangle around the coordinates that have been mapped, so that getting 
+    or setting a value is only a matter of indexing the list. The rectangle at
+    least doubles in size whenever a value is mapped outside of it, and the 
+    bounds of the mapped coordinates are updated as values are set, rather than
+    found by looking through every value.
+    
+    It can be used wherever a CoordMap is, and is better suited to large grids.
+    """
+    
+    def __init__(self, width=0, height=0):
+        """
+        Args:
+            width: The number of columns, starting at x = 0, to make room for
+                   before any values are set.
+            height: The number of rows, starting at y = 0, to make room for
+                    before any values are set.
+        """
+        
+        self._cells = [_UNMAPPED] * (width * height)
+        self._left = 0
+        self._top = 0
+        self._width = width
+        self._height = height
+        self._x_shift = 0
+        self._y_shift = 0
+        self._min_x = None
+        self._min_y = None
+        self._max_x = None
+        self._max_y = None
+    
+    def set_val(self, x, y, val):
+        """
+        Maps the provided coordinates to the provided value.
+        
+        Args:
+            x: The x coordinate
+            y: The y coordinate
+            val: The value at x, y
+        """
+        
+        x = x - self._x_shift
+        y = y - self._y_shift
+        column = x - self._left
+        row = y - self._top
+        if not (0 <= column < self._width and 0 <= row < self._height):
+            self._make_room(x, y, x, y)
+            column = x - self._left
+            row = y - self._top
+        
+        self._cells[row * self._width + column] = val
+        
+        if self._min_x is None:
+            self._min_x = self._max_x = x
+            self._min_y = self._max_y = y
+            return
+        
+        if x < self._min_x:
+            self._min_x = x
+        elif x > self._max_x:
+            self._max_x = x
+        if y < self._min_y:
+            self._min_y = y
+        elif y > self._max_y:
+            self._max_y = y
+    
+    def add_line(self, direction, x, y, values):
+        """
+        Maps the items in values to a line of coordinates starting at the 
+        provided x and y value, and going in the provided direction.
+        
+        Args:
+            direction: The direction the line is going in, where down is 
+                       DIR_DOWN, and right is DIR_RIGHT.
+            x: The x coordinate the line starts at.
+            y: the y coordinate the line starts at.
+            values: An array of the values that are going to be mapped to 
+                    coordinates in the line.
+        """
+        
+        for i in range(len(values)):
+            if direction == DIR_RIGHT:
+                self.set_val(x + i, y, values[i])
+            elif direction == DIR_DOWN:
+                self.set_val(x, y + i, values[i])
+    
+    def overlay_coordmap(self, coordmap, xoffset, yoffset):
+        """
+        Moves the mappings from the provided CoordMap to the current CoordMap,
+        offsetting the values if required.
+        
+        Args:
+            coordmap: The CoordMap or DenseCoordMap the new values are being 
+                      sourced from.
+            xoffset: The integer amount the values of coordmap should be shifted 
+                     in the x axis before they are added.
+            yoffset: The integer amount the values of coordmap should be shifted 
+                     in the y axis before they are added.
+        """
+        
+        min_x = coordmap.get_min_x()
+        if min_x is None:
+            return
+        
+        # Making room for every new value at once means the list is copied at
+        # most once.
+        self._make_room(
+            min_x + xoffset - self._x_shift,
+            coordmap.get_min_y() + yoffset - self._y_shift,
+            coordmap.get_max_x() + xoffset - self._x_shift,
+            coordmap.get_max_y() + yoffset - self._y_shift)
+        
+        for x, y, val in coordmap.get_filled_items():
+            self.set_val(x + xoffset, y + yoffset, val)
+    
+    def get_val(self, x, y):
+        """
+        Gets the value at the provided coordinate.
+        
+        Args:
+            x: The x coordinate.
+            y: The y coordinate.
+        
+        Returns:
+            The value at (x, y), or None if it is not mapped.
+        """
+        
+        column = x - self._x_shift - self._left
+        row = y - self._y_shift - self._top
+        if 0 <= column < self._width and 0 <= row < self._height:
+            val = self._cells[row * self._width + column]
+            if val is not _UNMAPPED:
+                return val
+        
+        return None
+    
+    def get_filled_coords(self):
+        """
+        Gets the coordinates that are assigned to some value.
+        
+        Returns:
+            A list of CoordMap.Coord objects representing the different
+            coordinates that are mapped in this DenseCoordMap.
+        """
+        
+        return [CoordMap.Coord(x, y) for x, y, val in self.get_filled_items()]
+    
+    def get_filled_items(self):
+        """
+        Gets the coordinates that are assigned to some value, along with their
+        values.
+        
+        Returns:
+            A list of (x, y, value) tuples, one for every mapped coordinate, 
+            row by row.
+        """
+        
+        items = []
+        if self._min_x is None:
+            return items
+        
+        cells = self._cells
+        for y in range(self._min_y, self._max_y + 1):
+            row_start = (y - self._top) * self._width - self._left
+            for x in range(self._min_x, self._max_x + 1):
+                val = cells[row_start + x]
+                if val is not _UNMAPPED:
+                    items.append((x + self._x_shift, y + self._y_shift, val))
+        
+        return items
+    
+    def get_min_x(self):
+        """
+        Gets the minimum x value a mapped coordinate has in this DenseCoordMap.
+        
+        Returns:
+            An integer representing the minimum assigned x value.
+        """
+        
+        if self._min_x is None:
+            return None
+        return self._min_x + self._x_shift
+    
+    def get_min_y(self):
+        """
+        Gets the minimum y value a mapped coordinate has in this DenseCoordMap.
+        
+        Returns:
+            An integer representing the minimum assigned y value.
+        """
+        
+        if self._min_y is None:
+            return None
+        return self._min_y + self._y_shift
+    
+    def get_max_x(self):
+        """
+        Gets the maximum x value a mapped coordinate has in this DenseCoordMap.
+        
+        Returns:
+            An integer representing the maximum assigned x value.
+        """
+        
+        if self._max_x is None:
+            return None
+        return self._max_x + self._x_shift
+    
+    def get_max_y(self):
+        """
+        Gets the maximum y value a mapped coordinate has in this DenseCoordMap.
+        
+        Returns:
+            An integer representing the maximum assigned y value.
+        """
+        
+        if self._max_y is None:
+            return None
+        return self._max_y + self._y_shift
+    
+    def shift_x(self, shift):
+        """
+        Shifts all mapped coordinates by the provided amount in the x axis.
+        
+        Args:
+            shift: The integer amount that should be added to each x coordinate.
+        """
+        
+        self._x_shift = self._x_shift + shift
+    
+    def shift_y(self, shift):
+        """
+        Shifts all mapped coordinates by the provided amount in the y axis.
+        
+        Args:
+            shift: The integer amount that should be added to each y coordinate.
+        """
+        
+        self._y_shift = self._y_shift + shift
+    
+    def _make_room(self, min_x, min_y, max_x, max_y):
+        """
+        Grows the list of values, if it has to, so that it covers a rectangle
+        of coordinates, before any shift is applied. Each side that grows at 
+        least doubles the size of the list in its direction.
+        
+        Args:
+            min_x: The lowest x coordinate to cover.
+            min_y: The lowest y coordinate to cover.
+            max_x: The highest x coordinate to cover.
+            max_y: The highest y coordinate to cover.
+        """
+        
+        left = self._left
+        top = self._top
+        right = left + self._width
+        bottom = top + self._height
+        if not self._cells:
+            left, top, right, bottom = min_x, min_y, max_x + 1, max_y + 1
+        
+        new_left = min(left, min_x)
+        new_top = min(top, min_y)
+        new_right = max(right, max_x + 1)
+        new_bottom = max(bottom, max_y + 1)
+        if new_left < left:
+            new_left = min(new_left, left - self._width)
+        if new_right > right:
+            new_right = max(new_right, right + self._width)
+        if new_top < top:
+            new_top = min(new_top, top - self._height)
+        if new_bottom > bottom:
+            new_bottom = max(new_bottom, bottom + self._height)
+        
+        new_width = new_right - new_left
+        new_height = new_bottom - new_top
+        if (new_left == self._left and new_top == self._top 
+                and new_width == self._width and new_height == self._height):
+            return
+        
+        new_cells = [_UNMAPPED] * (new_width * new_height)
+        old_cells = self._cells
+        for row in range(self._height):
+            old_start = row * self._width
+            new_start = ((row + self._top - new_top) * new_width 
+                         + self._left - new_left)
+            new_cells[new_start:new_start + self._width] = (
+                old_cells[old_start:old_start + self._width])
+        
+        self._cells = new_cells
+        self._left = new_left
+        self._top = new_top
+        self._width = new_width
+        self._height = new_height
+
 def print_puzzle(puzzle):
     """
     Prints the provided puzzle into the console, representing the lines with
@@ -384,139 +760,148 @@ def get_puzzle_coordmaps(puzzle, solution_set = None):
         provided solutions to the puzzle.
     """
     
-    if solution_set:
-        num_solution_coord_maps = len(solution_set)
-    else:
-        num_solution_coord_maps = 1
-    
-    # This list contains the CoordMap's that will eventually be returned to the
-    # caller.
-    solution_coord_maps = [CoordMap() for i in range(num_solution_coord_maps)]
-    
-    lines = copy.deepcopy(puzzle.lines)
-    if not lines:
+    if not puzzle.lines:
         return
     
-    overlay_x_shift = 0
-    
-    # Continually take a key from the lines list, and add it, and its
-    # descendants, to the CoordMap's, until all of the lines have been added.
-    while lines.keys():
-        # First, we get a list of blank CoordMap's, and pick a random line to
-        # insert into them, along with its descendants (lines that are
-        # connected to it through intersection points).
-        line_and_descendant_maps = [CoordMap() for i in range(num_solution_coord_maps)]
-        current_key = list(lines.keys())[0]
-        lines = add_line_and_descendants_to_coordmaps(line_and_descendant_maps, 
-                                                      0, 0, current_key, lines, 
-                                                      solution_set)
-        
-        # Next, we take every CoordMap that was generated, shift it so that all
-        # of its elements are at coordinates greater than (0, 0), and then 
-        # combine them with the master CoordMap, ensuring they do not overlap
-        # by shifting the overlay right by overlay_x_shift
-        for i, solution_coord_map in enumerate(solution_coord_maps):
-            overlay_map = line_and_descendant_maps[i]
-            overlay_map.shift_x(-overlay_map.get_min_x())
-            overlay_map.shift_y(-overlay_map.get_min_y())
-            solution_coord_map.overlay_coordmap(overlay_map, overlay_x_shift, 0)
-            
-        overlay_x_shift = solution_coord_map.get_max_x() + 2
-    
-    # Before returning the CoordMaps to the user, we shift them so that they 
-    # have all their coordinates greater than (0, 0)
-    for coord_map in solution_coord_maps:
-        coord_map.shift_x(-coord_map.get_min_x())
-        coord_map.shift_y(-coord_map.get_min_y())
+    layout = PuzzleLayout(puzzle)
+    if not solution_set:
+        return [layout.render()]
     
-    return solution_coord_maps
-    
-def add_line_and_descendants_to_coordmaps(coordmaps, x, y, line_id, lines, 
-                                          line_solutions_by_coordmap):
+    return [layout.render(solution) for solution in solution_set]
+
+class PuzzleLayout(object):
     """
-    Recursively adds the lines in the lines list to the CoordMaps in the 
-    coordmaps list, using line_solutions_by_cooordmap to determine what 
-    characters to put in each line. It may not end up adding all of the lines
-    in the lines list, because it uses the intersection points of each line to
-    determine what line to add next, so it only adds lines that are connected in
-    some way to the line at line_id. It may seem confusing to use lists of
-    CoordMap's and the line string information, but it is important so that we
-    don't have to run this entire algorithm for every CoordMap.
+    Where every line of a puzzle goes when it is drawn. The lines that are
+    connected to each other through intersection points are drawn together,
+    and each group of them is drawn to the right of the one before it, so that
+    every coordinate is greater than or equal to (0, 0).
     
-    Args:
-        coordmaps: A list of unfilled CoordMaps that will be filled from the
-                   strings in line_solutions_by_coordmap.
-        x: The x coordinate the line with in line_id should start at
-        y: The y coordinate the line with id line_id should start at
-        line_id: The id of the line that should be added in next
-        lines: A list of CrosswordLine objects that still have to be used to
-               populate the coordmaps list.
-        line_solutions_by_coordmap: An array of dictionaries where the keys
-                                    are the id's of different lines in the lines
-                                    list, and the values are the strings that go
-                                    in those lines. The i-th dictionary in the
-                                    array will be used to populate the i-th 
-                                    CoordMap in coordmaps, so it must have the 
-                                    same length as coordmaps, or the spaces will
-                                    be filled with a filler character.
+    The layout only depends on the puzzle, so it is worked out once, and any
+    number of solutions can then be drawn with it one at a time.
     
-    Returns:
-        The lines array with all of the lines that have been added to the
-        CoordMaps in the coordmaps list removed.
+    Attributes:
+        width: The number of columns the drawn puzzle takes up.
+        height: The number of rows the drawn puzzle takes up.
+        lines: A list of tuples of the id, starting x coordinate, starting y
+               coordinate, direction and length of every line in the puzzle,
+               in the order they are drawn.
     """
     
-    line = lines[line_id]
-    
-    # Add the line specified by line_id to the CoordMaps. The ith CoordMap is
-    # filled with the string in the ith dictionary in line_solutions_by_
-    # coordmap, if it exists, or with filler characters, if it does not.
-    for i, coordmap in enumerate(coordmaps):
-        line_solutions = None
-        if line_solutions_by_coordmap:
-            line_solutions = line_solutions_by_coordmap[i]
+    def __init__(self, puzzle):
+        """
+        Args:
+            puzzle: The Puzzle object being drawn.
+        """
+        
+        self.width = 0
+        self.height = 0
+        self.lines = []
+        
+        placed_ids = set()
+        for first_id in puzzle.lines:
+            if first_id in placed_ids:
+                continue
             
-        if line_solutions and line_id in line_solutions:
-            line_string = line_solutions[line_id]
-        else:
-            line_string = [FILLER_CHAR for i in range(line.length)]
+            group = self._place_connected_lines(puzzle, first_id, placed_ids)
             
-        coordmap.add_line(line.direction, x, y, line_string)
-    
-    # Since we have added the line to the CoordMaps, we no longer want it in the
-    # lines list, because we don't want to add it twice and cause infinite
-    # loops.
-    line_intersection_points = line.intersection_points
-    line_direction = line.direction
-    del lines[line_id]
-    
-    # For every intersection point, try to add the intersected line to the 
-    # CoordMaps, if it has not already been added.
-    for intersection in line_intersection_points:
-        newline_x = x
-        newline_y = y
-        
-        if line_direction == DIR_DOWN:
-            newline_y = newline_y + intersection.first_intersect
-        else:
-            newline_x = newline_x + intersection.first_intersect
-        
-        intersected_id = intersection.second_id
-        if intersected_id not in lines:
-            continue
+            # Each group is shifted so that its top left corner is at 
+            # (0, 0), and then moved right past the groups before it.
+            min_x = min(x for line_id, x, y, direction, length in group)
+            min_y = min(y for line_id, x, y, direction, length in group)
+            x_shift = self.width + 1 if self.lines else 0
+            for line_id, x, y, direction, length in group:
+                x = x - min_x + x_shift
+                y = y - min_y
+                self.lines.append((line_id, x, y, direction, length))
+                
+                if direction == DIR_RIGHT:
+                    self.width = max(self.width, x + length)
+                    self.height = max(self.height, y + 1)
+                else:
+                    self.width = max(self.width, x + 1)
+                    self.height = max(self.height, y + length)
+    
+    def render(self, solution=None):
+        """
+        Draws a solution to the puzzle.
         
-        intersected_line = lines[intersected_id]
+        Args:
+            solution: An optional dictionary mapping the id of each of the 
+                      lines in the puzzle to the word that goes in that line.
+                      Lines without a word are filled with filler characters.
         
-        if intersected_line == None:
-            continue
+        Returns:
+            A DenseCoordMap mapping the coordinates of every tile in the puzzle
+            to the character in that tile.
+        """
         
-        if intersected_line.direction == DIR_DOWN:
-            newline_y = newline_y - intersection.second_intersect
-        else:
-            newline_x = newline_x - intersection.second_intersect
+        coordmap = DenseCoordMap(self.width, self.height)
+        for line_id, x, y, direction, length in self.lines:
+            if solution and line_id in solution:
+                line_string = solution[line_id]
+            else:
+                line_string = FILLER_CHAR * length
+            
+            coordmap.add_line(direction, x, y, line_string)
         
-        lines = add_line_and_descendants_to_coordmaps(coordmaps, newline_x, newline_y, intersected_id, lines, line_solutions_by_coordmap)
+        return coordmap
     
-    return lines
+    @staticmethod
+    def _place_connected_lines(puzzle, first_id, placed_ids):
+        """
+        Works out where every line connected to a line, through any number of
+        intersection points, goes relative to that line, which starts at 
+        (0, 0). The lines are followed depth first, through their 
+        intersection points in order.
+        
+        Args:
+            puzzle: The Puzzle object being drawn.
+            first_id: The id of the line the others are placed around.
+            placed_ids: A set of the ids of the lines that have already been
+                        placed, which the newly placed lines are added to.
+        
+        Returns:
+            A list of tuples of the id, starting x coordinate, starting y
+            coordinate, direction and length of every connected line.
+        """
+        
+        first_line = puzzle.lines[first_id]
+        placed_ids.add(first_id)
+        group = [(first_id, 0, 0, first_line.direction, first_line.length)]
+        
+        # Each entry holds the intersection points of a placed line that are
+        # still to be followed, along with where that line starts.
+        stack = [(iter(first_line.intersection_points), 0, 0, 
+                  first_line.direction)]
+        while stack:
+            intersections, x, y, direction = stack[-1]
+            intersection = next(intersections, None)
+            if intersection is None:
+                stack.pop()
+                continue
+            
+            intersected_id = intersection.second_id
+            intersected_line = puzzle.lines.get(intersected_id)
+            if intersected_line is None or intersected_id in placed_ids:
+                continue
+            
+            if direction == DIR_DOWN:
+                y = y + intersection.first_intersect
+            else:
+                x = x + intersection.first_intersect
+            
+            if intersected_line.direction == DIR_DOWN:
+                y = y - intersection.second_intersect
+            else:
+                x = x - intersection.second_intersect
+            
+            placed_ids.add(intersected_id)
+            group.append((intersected_id, x, y, intersected_line.direction,
+                          intersected_line.length))
+            stack.append((iter(intersected_line.intersection_points), x, y,
+                          intersected_line.direction))
+        
+        return group
 
 def generate_puzzle_from_selected_tile_map(coordmap):
     """
@@ -594,44 +979,208 @@ def generate_puzzle_from_selected_tile_map(coordmap):
     find_lines(DIR_DOWN)
     find_lines(DIR_RIGHT)
     
-    puzzle = Puzzle()
+    # Mark every tile of every up/down line with the line it belongs to, and
+    # its position in that line, so that each left/right line can find the
+    # lines crossing it by looking at its own tiles.
+    width = coordmap.get_max_x() + 1
+    down_owners = [None] * (width * (coordmap.get_max_y() + 1))
+    intersections = [[] for row in rows]
+    for line_id, row in enumerate(rows):
+        if row[DIR_FIELD] != DIR_DOWN:
+            continue
+        
+        for offset in range(row[LEN_FIELD]):
+            tile = (row[Y_FIELD] + offset) * width + row[X_FIELD]
+            down_owners[tile] = (line_id, offset)
     
-    # Calculate the intersection points of each row, and combine these points,
-    # and the row information, by adding it to the puzzle.
-    for i, row in enumerate(rows):
-        line_id = i
-        x = row[X_FIELD]
-        y = row[Y_FIELD]
-        length = row[LEN_FIELD]
-        dir = row[DIR_FIELD]
-        intersections = []
-        
-        print("at row " + str(line_id) + " with x, y, len, dir " + str(x) + ", " + str(y) + ", " + str(length) + ", " + str(dir));
-        
-        # Check all other lines to see if they intersect with this one.
-        for i2, row2 in enumerate(rows):
-            c_line_id = i2;
-            c_x = row2[X_FIELD]
-            c_y = row2[Y_FIELD]
-            c_length = row2[LEN_FIELD]
-            c_dir = row2[DIR_FIELD];
-            # ensure that we are not trying to compare a row with itself, and
-            # don't bother finding the intersection of parallel lines
-            if line_id == c_line_id or dir == c_dir:
+    # Calculate the intersection points of each left/right row, adding each 
+    # point to both of the lines it joins. Down lines are numbered before 
+    # right lines, and right lines from top to bottom, and we walk each right
+    # line from left to right, so every line gets its points in the order of 
+    # the ids of the lines crossing it.
+    for line_id, row in enumerate(rows):
+        if row[DIR_FIELD] != DIR_RIGHT:
+            continue
+        
+        first_tile = row[Y_FIELD] * width + row[X_FIELD]
+        for offset in range(row[LEN_FIELD]):
+            owner = down_owners[first_tile + offset]
+            if owner is None:
                 continue
             
+            c_line_id, c_offset = owner
+            intersections[line_id].append(
+                Puzzle.IntersectionPoint(line_id, c_line_id, offset, c_offset))
+            intersections[c_line_id].append(
+                Puzzle.IntersectionPoint(c_line_id, line_id, c_offset, offset))
+    
+    puzzle = Puzzle()
+    for line_id, row in enumerate(rows):
+        puzzle.add_line(row[LEN_FIELD], row[DIR_FIELD], intersections[line_id],
+                        line_id)
+    
+    return puzzle
+
+def read_tile_map(lines):
+    """
+    Reads a plain-text drawing of a puzzle, with one line of text for every row
+    of the grid, where FILLER_CHAR or a space is a tile that is not part of the
+    puzzle, and any other character is an empty spot in the puzzle. Rows 
+    shorter than the longest are treated as if they were padded with filler, 
+    and blank lines at the end are ignored.
+    
+    Args:
+        lines: An iterable of strings, such as an open text file.
+    
+    Returns:
+        A DenseCoordMap mapping every coordinate in the grid to True or False,
+        in the form generate_puzzle_from_selected_tile_map takes.
+    
+    Raises:
+        ValueError: There are no rows in the drawing.
+    """
+    
+    rows = [line.rstrip('\r\n') for line in lines]
+    while rows and not rows[-1].strip():
+        rows.pop()
+    if not rows:
+        raise ValueError("The puzzle drawing has no rows")
+    
+    width = max(len(row) for row in rows)
+    coordmap = DenseCoordMap(width, len(rows))
+    for y, row in enumerate(rows):
+        for x in range(width):
+            selected = x < len(row) and row[x] not in (FILLER_CHAR, ' ')
+            coordmap.set_val(x, y, selected)
+    
+    return coordmap
+
+def load_puzzle(path):
+    """
+    Reads a puzzle from a text file in the form read_tile_map takes.
+    
+    Args:
+        path: The path of the file.
+    
+    Returns:
+        A Puzzle object.
+    """
+    
+    with open(path) as puzzle_file:
+        tile_map = read_tile_map(puzzle_file)
+    
+    return generate_puzzle_from_selected_tile_map(tile_map)
+
+def puzzle_to_dict(puzzle):
+    """
+    Describes a puzzle with plain lists and dictionaries, so that it can be
+    written out as JSON.
+    
+    Args:
+        puzzle: A Puzzle object.
+    
+    Returns:
+        A dictionary in the form puzzle_from_dict takes.
+    """
+    
+    return {"lines": [
+        {"id": line_id, "length": line.length, "direction": line.direction,
+         "intersections": [
+             {"second_id": point.second_id, 
+              "first_intersect": point.first_intersect,
+              "second_intersect": point.second_intersect}
+             for point in line.intersection_points]}
+        for line_id, line in puzzle.lines.items()]}
+
+def puzzle_from_dict(data):
+    """
+    Builds a puzzle from a description read from JSON. The description is
+    either a dictionary with a "lines" list, holding a dictionary for every
+    line with its integer "id", "length" and "direction", and a list of 
+    "intersections", each with the "second_id" of the line it crosses and the
+    "first_intersect" and "second_intersect" positions, in the form of the 
+    attributes of Puzzle.IntersectionPoint; or a dictionary with a "tiles" 
+    list of strings drawing the grid, in the form read_tile_map takes.
+    
+    Args:
+        data: The description of the puzzle.
+    
+    Returns:
+        A Puzzle object.
+    
+    Raises:
+        ValueError: The description is not in either form, or describes lines
+                    that cannot be put together, such as an intersection that
+                    is outside of a line or is not listed by both lines.
+    """
+    
+    if not isinstance(data, dict):
+        raise ValueError("A puzzle must be a JSON object")
+    
+    if "tiles" in data:
+        tiles = data["tiles"]
+        if (not isinstance(tiles, list) or 
+                not all(isinstance(row, str) for row in tiles)):
+            raise ValueError("The tiles of a puzzle must be a list of strings")
+        return generate_puzzle_from_selected_tile_map(read_tile_map(tiles))
+    
+    lines = data.get("lines")
+    if not isinstance(lines, list):
+        raise ValueError("A puzzle must have a list of lines or of tiles")
+    
+    def read_int(item, key, minimum):
+        value = item.get(key) if isinstance(item, dict) else None
+        if (not isinstance(value, int) or isinstance(value, bool) or 
+                value < minimum):
+            raise ValueError("Expected an integer of at least {} for {} in "
+                             "{!r:.80}".format(minimum, key, item))
+        return value
+    
+    lengths = {}
+    for line in lines:
+        line_id = read_int(line, "id", 0)
+        if line_id in lengths:
+            raise ValueError("The line id {} is used twice".format(line_id))
+        lengths[line_id] = read_int(line, "length", 1)
+    
+    puzzle = Puzzle()
+    crossings = set()
+    for line in lines:
+        line_id = line["id"]
+        direction = line.get("direction")
+        if direction not in (DIR_DOWN, DIR_RIGHT):
+            raise ValueError("The direction of line {} must be {} or "
+                             "{}".format(line_id, DIR_DOWN, DIR_RIGHT))
+        
+        points = line.get("intersections", [])
+        if not isinstance(points, list):
+            raise ValueError("The intersections of line {} must be a "
+                             "list".format(line_id))
+        
+        intersection_points = []
+        for point in points:
+            second_id = read_int(point, "second_id", 0)
+            first_intersect = read_int(point, "first_intersect", 0)
+            second_intersect = read_int(point, "second_intersect", 0)
+            if (second_id not in lengths or 
+                    first_intersect >= lengths[line_id] or
+                    second_intersect >= lengths[second_id]):
+                raise ValueError("Line {} has an intersection outside of the "
+                                 "lines: {!r:.80}".format(line_id, point))
             
-            if dir == DIR_DOWN: # Implying row2 has direction right
-                # If they intersect
-                if c_x <= x and c_x + c_length > x and y <= c_y and y + length > c_y:
-                    intersect = Puzzle.IntersectionPoint(line_id, c_line_id, c_y - y, x - c_x)
-                    intersections.append(intersect)
-            elif dir == DIR_RIGHT: # Implying row2 has direction down
-                # If they intersect
-                if x <= c_x and x + length > c_x and c_y <= y and c_y + c_length > y:
-                    intersect = Puzzle.IntersectionPoint(line_id, c_line_id, c_x - x, y - c_y)
-                    intersections.append(intersect)
-        
-        puzzle.add_line(length, dir, intersections, line_id)
-     
-    return puzzle  
+            crossings.add((line_id, second_id, first_intersect, 
+                           second_intersect))
+            intersection_points.append(Puzzle.IntersectionPoint(
+                line_id, second_id, first_intersect, second_intersect))
+        
+        puzzle.add_line(lengths[line_id], direction, intersection_points, 
+                        line_id)
+    
+    for first_id, second_id, first_intersect, second_intersect in crossings:
+        if (second_id, first_id, second_intersect, 
+                first_intersect) not in crossings:
+            raise ValueError("The intersection of line {} with line {} is "
+                             "not listed by line {}".format(
+                                 first_id, second_id, second_id))
+    
+    return puzzle
@@ -4,13 +4,159 @@ Created on Sep 6, 2016
 @author: Jacob Brunsting
 '''
 
+import argparse
 import crossword_tools
 import constants
-import crossword_gui
+import json
+import solution_store
 import solver
+import sys
 import time
+import word_loader
+
+def run(args=None):
+    """
+    Solves a puzzle from the command line. Given a puzzle file and a word list,
+    the solutions are printed without any interaction, and otherwise the user
+    draws the puzzle and enters the word bank through the GUI.
+    
+    args:
+        args: An optional list of the command line arguments. If it is not
+              provided, the arguments this process was started with are used.
+    """
+    
+    parser = argparse.ArgumentParser(
+        description="Solve a crossword puzzle from a word bank. Without any "
+                    "files, the puzzle is drawn in a window.")
+    parser.add_argument("puzzle", nargs="?",
+                        help="a text file drawing the puzzle, one line per "
+                             "row, where {} is a blocked tile and any other "
+                             "character an empty one".format(
+                                 crossword_tools.FILLER_CHAR))
+    parser.add_argument("word_list", nargs="?",
+                        help="a file with one word per line")
+    parser.add_argument("-n", "--max-solutions", type=int,
+                        help="the most solutions to print")
+    parser.add_argument("--json", action="store_true",
+                        help="print each solution as a JSON object mapping "
+                             "line ids to words, one per line")
+    parser.add_argument("--cache-dir",
+                        help="the directory to keep the word list index in")
+    parser.add_argument("--timeout", type=float,
+                        help="the most seconds to search for, after which "
+                             "the solutions found so far are kept")
+    parser.add_argument("--max-nodes", type=int,
+                        help="the most words the search may try, after which "
+                             "the solutions found so far are kept")
+    parser.add_argument("--save", metavar="PATH",
+                        help="also write every solution to a file as it is "
+                             "found, as JSON lines if the path ends in .jsonl "
+                             "and in a compact binary form otherwise")
+    parser.add_argument("--timings", action="store_true",
+                        help="print how long each step took, and what the "
+                             "search did, to standard error")
+    parsed = parser.parse_args(args)
+    if parsed.max_solutions is not None and parsed.max_solutions < 0:
+        parser.error("--max-solutions must be at least 0")
+    if parsed.timeout is not None and parsed.timeout < 0:
+        parser.error("--timeout must be at least 0")
+    if parsed.max_nodes is not None and parsed.max_nodes < 0:
+        parser.error("--max-nodes must be at least 0")
+    
+    if parsed.puzzle is None:
+        main()
+    elif parsed.word_list is None:
+        parser.error("a word list is needed to solve a puzzle file")
+    else:
+        try:
+            solve_files(parsed.puzzle, parsed.word_list, parsed.max_solutions,
+                        parsed.json, parsed.cache_dir, parsed.timings,
+                        parsed.timeout, parsed.max_nodes, parsed.save)
+        except (OSError, ValueError) as error:
+            parser.error(str(error))
+
+def solve_files(puzzle_path, word_list_path, max_solutions=None, 
+                as_json=False, cache_dir=None, timings=False, timeout=None,
+                max_nodes=None, save_path=None):
+    """
+    Reads a puzzle and a word list from files, and prints the solutions to the
+    puzzle as they are found, followed by the number of solutions.
+    
+    args:
+        puzzle_path: The path of a file in the form 
+                     crossword_tools.read_tile_map takes.
+        word_list_path: The path of a file holding one word per line, which
+                        is loaded by word_loader.load_word_bank.
+        max_solutions: An optional integer limit on the number of solutions 
+                       printed.
+        as_json: True if each solution should be printed as a JSON object on
+                 its own line, rather than drawn as a grid.
+        cache_dir: An optional directory to keep the index of the word list 
+                   in.
+        timings: True if the time taken to read the puzzle, load the word list
+                 and solve the puzzle, and what the search did, should be 
+                 printed to standard error.
+        timeout: An optional number of seconds the search may run for.
+        max_nodes: An optional limit on the number of words the search may put
+                   in lines.
+        save_path: An optional path of a solution file every solution is also
+                   written to, by a solution_store.SolutionFileSink.
+    """
+    
+    start_time = time.perf_counter()
+    puzzle = crossword_tools.load_puzzle(puzzle_path)
+    read_time = time.perf_counter()
+    word_bank = word_loader.load_word_bank(word_list_path, cache_dir)
+    load_time = time.perf_counter()
+    
+    layout = crossword_tools.PuzzleLayout(puzzle)
+    stats = solver.SearchStats() if timings else None
+    limits = None
+    if timeout is not None or max_nodes is not None:
+        limits = solver.SearchLimits(timeout, max_nodes)
+    
+    sink = None
+    if save_path:
+        sink = solution_store.SolutionFileSink(save_path, puzzle, word_bank)
+    
+    num_solutions = 0
+    try:
+        for solution in solver.iter_solutions(puzzle, word_bank, max_solutions,
+                                              stats=stats, limits=limits):
+            num_solutions = num_solutions + 1
+            if sink:
+                sink.append(solution)
+            if as_json:
+                print(json.dumps(solution))
+            else:
+                print(constants.SOLUTION_HEADER_STR.format(num_solutions))
+                crossword_tools.print_coord_map(layout.render(solution), 1)
+    finally:
+        if sink:
+            sink.close()
+    solve_time = time.perf_counter()
+    
+    if limits and limits.reason:
+        print(constants.STOPPED_EARLY_STR.format(limits.reason), 
+              file=sys.stderr)
+    if not as_json:
+        print(constants.SOLUTION_COUNT_STR.format(
+            num_solutions, '' if num_solutions == 1 else 's'))
+    
+    if timings:
+        step_times = [(constants.READ_STEP_STR, read_time - start_time),
+                      (constants.LOAD_STEP_STR, load_time - read_time),
+                      (constants.SOLVE_STEP_STR, solve_time - load_time)]
+        for step, seconds in step_times:
+            print(constants.STEP_TIME_STR.format(step, seconds), 
+                  file=sys.stderr)
+        print_search_stats(stats, sys.stderr)
 
 def main():
+    # The GUI is only imported once it is used, so that tkinter is never
+    # loaded by a headless solve.
+    import crossword_gui
+    
     width = read_int(constants.PUZZLE_WIDTH_STR, 2)
     height = read_int(constants.PUZZLE_HEIGHT_STR, 2)
     print(constants.DRAW_PUZZLE_STR)
@@ -28,11 +174,13 @@ def on_puzzle_retrieval(puzzle):
                 user created
     """
     
+    import crossword_gui
+    
     if not puzzle:
         user_input = input(constants.NO_SOLUTIONS_STR)
         if user_input == 'y':
             main()
-        
+    
     print(constants.PRINTING_PUZZLE_STR)
     crossword_tools.print_puzzle(puzzle)
     word_bank = []
@@ -46,25 +194,27 @@ def on_puzzle_retrieval(puzzle):
         word_bank.append(user_input)
     
     print(constants.SOLVING_STR)
-    start_time = time.clock()
-    solutions = solver.solve(puzzle, word_bank)
-    end_time = time.clock()
+    stats = solver.SearchStats()
+    start_time = time.perf_counter()
+    solutions = solver.solve(puzzle, word_bank, stats=stats)
+    end_time = time.perf_counter()
     diff = end_time - start_time
-    seconds = round(diff)
-    mills = round((diff - seconds) * 1000)
+    seconds = int(diff)
+    mills = int((diff - seconds) * 1000)
     
     if seconds == 1:
         seconds_ending = ''
     else:
         seconds_ending = 's'
-        
+    
     if mills == 1:
         mills_ending = ''
     else:
         mills_ending = 's'
-        
+    
     print(constants.SOLVE_TIME_STR.format(seconds, seconds_ending, mills, 
                                           mills_ending))
+    print_search_stats(stats)
     
     if solutions:
         print(constants.DISPLAYING_SOLUTIONS_STR)
@@ -74,6 +224,20 @@ def on_puzzle_retrieval(puzzle):
         if user_input == 'y':
             main()
 
+def print_search_stats(stats, file=None):
+    """
+    Prints what a search did.
+    
+    args:
+        stats: The solver.SearchStats object the search was counted in.
+        file: An optional file to print to, instead of standard output.
+    """
+    
+    print(constants.SEARCH_STATS_STR.format(stats.nodes, stats.backtracks, 
+                                            stats.wipeouts, 
+                                            stats.total_prunes()), 
+          file=file)
+
 def read_int(message, min_val):
     """
     Reads an integer from the user, prompting the user with the provided 
@@ -97,4 +261,5 @@ def read_int(message, min_val):
         except ValueError:
             print(constants.IMPROPER_INPUT_STR)
 
-main();
\ No newline at end of file
+if __name__ == "__main__":
+    run()
\ No newline at end of file
@@ -0,0 +1,412 @@
+import importlib.util
+import weakref
+
+# NumPy, once the engine is first used. It takes longer to import than the
+# rest of the solver put together, so searches that do not use the engine
+# never import it.
+numpy = None
+
+# The tables built for each WordIndex, kept for as long as the index is, so
+# that every search over the same word bank shares them.
+_tables_by_index = weakref.WeakKeyDictionary()
+
+def is_available():
+    """
+    Checks whether NumPy can be imported, which the engine needs.
+    
+    Returns:
+        True if MaskDomainStore can be used, and False if not.
+    """
+    
+    return numpy is not None or importlib.util.find_spec("numpy") is not None
+
+def _import_numpy():
+    """
+    Imports NumPy, if it has not been imported yet.
+    """
+    
+    global numpy
+    if numpy is None:
+        import numpy
+
+class WordTables(object):
+    """
+    The words of a WordIndex laid out for vectorised filtering. The words of
+    each length are kept as a matrix of uint8 letter codes, with a row for
+    every word and a column for every position. The columns are stored one
+    after another, so that comparing a position of every word reads one run of
+    memory.
+    
+    Attributes:
+        codes: A dictionary mapping every letter in the word bank to its
+               integer code.
+    """
+    
+    def __init__(self, word_index):
+        """
+        Args:
+            word_index: The solver.WordIndex holding the words.
+        
+        Raises:
+            ValueError: The word bank has more than 256 different letters,
+                        which do not fit in a uint8.
+        """
+        
+        _import_numpy()
+        letters = sorted(set("".join(word_index.words)))
+        if len(letters) > 256:
+            raise ValueError("The numpy engine supports at most 256 different "
+                             "letters, but the word bank has {}".format(
+                                 len(letters)))
+        
+        self.codes = {letter: code for code, letter in enumerate(letters)}
+        self._code_table = str.maketrans(
+            {letter: chr(code) for letter, code in self.codes.items()})
+        self._word_index = word_index
+        self._tables_by_length = {}
+    
+    def of_length(self, length):
+        """
+        Gets the words with the provided length, building their matrix the
+        first time they are asked for.
+        
+        Args:
+            length: The integer length of the words.
+        
+        Returns:
+            A tuple of a sorted numpy array of the ids of the words, and their
+            matrix of letter codes, whose rows are in the same order as the
+            ids. Neither must be modified.
+        """
+        
+        if length not in self._tables_by_length:
+            ids = self._word_index.ids_of_length(length)
+            words = self._word_index.words
+            
+            # Once every letter is swapped for the character whose number is
+            # its code, each letter is one byte in latin-1.
+            encoded = "".join(words[word_id] for word_id in ids).translate(
+                self._code_table).encode("latin-1")
+            letters = numpy.frombuffer(encoded, dtype=numpy.uint8).reshape(
+                len(ids), length)
+            self._tables_by_length[length] = (
+                numpy.array(ids, dtype=numpy.int64),
+                numpy.asfortranarray(letters))
+        
+        return self._tables_by_length[length]
+
+def word_tables(word_index):
+    """
+    Gets the WordTables of a WordIndex, building them if no search has yet.
+    
+    Args:
+        word_index: A solver.WordIndex.
+    
+    Returns:
+        A WordTables object.
+    """
+    
+    tables = _tables_by_index.get(word_index)
+    if tables is None:
+        tables = WordTables(word_index)
+        _tables_by_index[word_index] = tables
+    
+    return tables
+
+def forget_tables(word_index):
+    """
+    Drops the WordTables of a WordIndex, so that they are built again from its
+    words the next time they are needed. It must be called whenever words are
+    added to or removed from the index.
+    
+    Args:
+        word_index: A solver.WordIndex.
+    """
+    
+    _tables_by_index.pop(word_index, None)
+
+class MaskDomainStore(object):
+    """
+    A solver.DomainStore that keeps the domain of each line as a numpy boolean
+    mask over the words with the line's length, rather than as a set of word
+    ids. Keeping only the words with a letter at a position, or only those a
+    crossing line can still meet, is then a comparison over a column of the
+    line's letter matrix and an AND of masks, however many words there are.
+    
+    Like DomainStore, a mask is never modified in place, so restoring a domain
+    is only a matter of putting the old mask back.
+    """
+    
+    def __init__(self, puzzle, word_index, fitting_words, on_change=None):
+        """
+        Args:
+            puzzle: The puzzle being solved.
+            word_index: The solver.WordIndex the ids in fitting_words refer to.
+            fitting_words: A list mapping every line id to a set of the ids of
+                           the words that can fit at that line, all of which
+                           have the line's length.
+            on_change: An optional function called with the id of a line
+                       every time its domain is narrowed or restored.
+        """
+        
+        tables = word_tables(word_index)
+        self._codes = tables.codes
+        self._ids = []
+        self._letters = []
+        self._masks = []
+        self._sizes = []
+        self._trail = []
+        self._on_change = on_change
+        
+        for line_id, length in enumerate(puzzle.lengths):
+            ids, letters = tables.of_length(length)
+            words = fitting_words[line_id]
+            if len(words) == len(ids):
+                mask = numpy.ones(len(ids), dtype=bool)
+            else:
+                mask = numpy.zeros(len(ids), dtype=bool)
+                mask[numpy.searchsorted(ids, numpy.fromiter(
+                    words, dtype=numpy.int64, count=len(words)))] = True
+            
+            self._ids.append(ids)
+            self._letters.append(letters)
+            self._masks.append(mask)
+            self._sizes.append(len(words))
+    
+    def size(self, line_id):
+        """
+        Gets the number of words still in the domain of a line.
+        
+        Args:
+            line_id: The id of the line.
+        
+        Returns:
+            The integer number of words that can still fit at the line.
+        """
+        
+        return self._sizes[line_id]
+    
+    def words(self, line_id):
+        """
+        Gets the words still in the domain of a line.
+        
+        Args:
+            line_id: The id of the line.
+        
+        Returns:
+            A new list of the ids of the words that can still fit at the line,
+            in increasing order.
+        """
+        
+        return self._ids[line_id][self._masks[line_id]].tolist()
+    
+    def contains(self, line_id, word_id):
+        """
+        Checks whether a word is still in the domain of a line.
+        
+        Args:
+            line_id: The id of the line.
+            word_id: The id of a word with the line's length.
+        
+        Returns:
+            True if the word can still fit at the line, and False if not.
+        """
+        
+        ids = self._ids[line_id]
+        position = int(numpy.searchsorted(ids, word_id))
+        return (position < len(ids) and ids[position] == word_id and 
+                bool(self._masks[line_id][position]))
+    
+    def restrict(self, line_id, allowed_words):
+        """
+        Removes every word that is not in allowed_words from the domain of a
+        line, recording the removal on the undo trail.
+        
+        Args:
+            line_id: The id of the line.
+            allowed_words: A set of the word ids that may stay in the domain.
+        """
+        
+        self._replace(line_id, self._masks[line_id] &
+                      self._mask_of(line_id, allowed_words))
+    
+    def remove(self, line_id, removed_words):
+        """
+        Removes the provided words from the domain of a line, recording the
+        removal on the undo trail.
+        
+        Args:
+            line_id: The id of the line.
+            removed_words: A set of the word ids to take out of the domain.
+        """
+        
+        self._replace(line_id, self._masks[line_id] &
+                      ~self._mask_of(line_id, removed_words))
+    
+    def keep_letter(self, line_id, position, letter):
+        """
+        Removes every word that does not have the provided letter at the
+        provided position from the domain of a line, recording the removal on
+        the undo trail.
+        
+        Args:
+            line_id: The id of the line.
+            position: The position in the line, starting at 0.
+            letter: The letter the words must have at the position.
+        """
+        
+        mask = self._masks[line_id]
+        code = self._codes.get(letter)
+        if code is None:
+            self._replace(line_id, numpy.zeros_like(mask))
+        else:
+            self._replace(line_id,
+                          mask & (self._letters[line_id][:, position] == code))
+    
+    def keep_word(self, line_id, word_id):
+        """
+        Removes every word other than the provided one from the domain of a
+        line, recording the removal on the undo trail.
+        
+        Args:
+            line_id: The id of the line.
+            word_id: The id of the word that may stay in the domain.
+        """
+        
+        ids = self._ids[line_id]
+        mask = self._masks[line_id]
+        new_mask = numpy.zeros_like(mask)
+        position = numpy.searchsorted(ids, word_id)
+        if position < len(ids) and ids[position] == word_id:
+            new_mask[position] = mask[position]
+        self._replace(line_id, new_mask)
+    
+    def revise(self, target_id, target_position, source_id, source_position):
+        """
+        Removes the words from the domain of the target line whose letter at the
+        point of intersection does not appear at that point in any of the words
+        in the domain of the source line, recording the removal on the undo
+        trail.
+        
+        Args:
+            target_id: The id of the line words are being removed from.
+            target_position: The position in the target line the lines
+                             intersect.
+            source_id: The id of the line the target line is checked against.
+            source_position: The position in the source line the lines
+                             intersect.
+        
+        Returns:
+            True if any words were removed from the target line, and False if
+            not.
+        """
+        
+        supported = numpy.zeros(256, dtype=bool)
+        supported[self._letters[source_id][:, source_position][
+            self._masks[source_id]]] = True
+        
+        old_size = self._sizes[target_id]
+        self._replace(target_id, self._masks[target_id] & supported[
+            self._letters[target_id][:, target_position]])
+        return self._sizes[target_id] != old_size
+    
+    def _mask_of(self, line_id, word_ids):
+        """
+        Makes a mask over the words with a line's length holding the provided
+        words.
+        
+        Args:
+            line_id: The id of the line.
+            word_ids: A set of word ids, any of which without the line's length
+                      are left out.
+        
+        Returns:
+            A new numpy boolean mask.
+        """
+        
+        ids = self._ids[line_id]
+        mask = numpy.zeros(len(ids), dtype=bool)
+        if not word_ids or not len(ids):
+            return mask
+        
+        words = numpy.fromiter(word_ids, dtype=numpy.int64,
+                               count=len(word_ids))
+        positions = numpy.searchsorted(ids, words)
+        found = positions < len(ids)
+        found[found] = ids[positions[found]] == words[found]
+        mask[positions[found]] = True
+        return mask
+    
+    def copy_domains(self):
+        """
+        Gets the current domain of every line.
+        
+        Returns:
+            A new list mapping every line id to a new set of the ids of the
+            words that can still fit at that line.
+        """
+        
+        return [set(self.words(line_id)) for line_id in range(len(self._masks))]
+    
+    def lines_changed_since(self, mark):
+        """
+        Gets the lines whose domains have been narrowed since a mark was taken.
+        
+        Args:
+            mark: A value returned by mark.
+        
+        Returns:
+            A list of line ids, without repeats, in the order they were first
+            narrowed.
+        """
+        
+        return list(dict.fromkeys(
+            line_id for line_id, old_mask, old_size in self._trail[mark:]))
+    
+    def mark(self):
+        """
+        Gets a marker for the current position in the undo trail.
+        
+        Returns:
+            A value that can be passed to undo to restore every domain to the
+            state it is in now.
+        """
+        
+        return len(self._trail)
+    
+    def undo(self, mark):
+        """
+        Restores all of the words removed since the provided mark was taken.
+        
+        Args:
+            mark: A value returned by mark.
+        """
+        
+        trail = self._trail
+        while len(trail) > mark:
+            line_id, old_mask, old_size = trail.pop()
+            self._masks[line_id] = old_mask
+            self._sizes[line_id] = old_size
+            if self._on_change:
+                self._on_change(line_id)
+    
+    def _replace(self, line_id, new_mask):
+        """
+        Makes a narrowed mask the domain of a line, recording the old mask on
+        the undo trail, unless no words were removed.
+        
+        Args:
+            line_id: The id of the line.
+            new_mask: A numpy boolean mask with no words the old one lacks.
+        """
+        
+        new_size = int(numpy.count_nonzero(new_mask))
+        if new_size == self._sizes[line_id]:
+            return
+        
+        self._trail.append((line_id, self._masks[line_id],
+                            self._sizes[line_id]))
+        self._masks[line_id] = new_mask
+        self._sizes[line_id] = new_size
+        if self._on_change:
+            self._on_change(line_id)
@@ -0,0 +1,723 @@
+'''
+A long-running local service that solves puzzles sent to it over HTTP, on
+localhost or a Unix socket, with word banks that are loaded once when it
+starts.
+
+POST /solve takes a JSON object holding:
+    
+    puzzle: The puzzle, in the form crossword_tools.puzzle_from_dict takes.
+    word_bank: The name of the word bank to use, which is the file name of its
+               word list without the extension. The first word list the
+               server was started with is used if it is left out.
+    max_solutions: The most solutions to send back.
+    timeout: The most seconds to search for, which is cut down to the
+             server's own limit if it has one.
+    max_nodes: The most words the search may put in lines.
+    options: The settings of the search, named as solver.SearchOptions names
+             them.
+
+and answers with a stream of JSON objects, one per line. Every solution is
+sent as {"solution": {line id: word}} as soon as it is found, and the stream
+ends with {"done": true, "solutions": count, "nodes": count, "stopped": reason},
+where reason is null unless a limit stopped the search. GET /word-banks lists
+the word banks.
+'''
+
+import argparse
+import asyncio
+import concurrent.futures
+import constants
+import crossword_tools
+import http
+import json
+import multiprocessing
+import os
+import queue
+import solver
+import stat
+import sys
+import time
+import word_loader
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8737
+
+# The most solutions a worker sends back at once, and the longest it holds on
+# to a solution before sending it, so that solutions found quickly are not
+# sent one at a time, and those found slowly are not held back.
+SOLUTION_BATCH_SIZE = 64
+SOLUTION_BATCH_SECONDS = 0.1
+
+# The number of batches of solutions that can be waiting to be written to a
+# client. Once there are this many, the search finding them waits for the
+# client to catch up.
+QUEUED_BATCHES = 4
+
+# How many jobs can be waiting for a worker, for each worker, before new
+# solve requests are turned away.
+QUEUED_JOBS_PER_WORKER = 4
+
+# The most seconds a client may go without reading any of what is written to
+# it. A client that falls further behind than this is dropped, and its search
+# cancelled, so that it cannot hold on to a worker. A search that has reached
+# its limits also waits no longer than this for its last solutions to be read.
+WRITE_TIMEOUT = 30
+
+# The largest request body that is read, and the most header lines.
+MAX_BODY_SIZE = 16 << 20
+MAX_HEADER_LINES = 100
+
+# The most bytes read at once from a client while waiting for it to go away.
+# Anything it sends after its request is thrown away.
+DISCARD_READ_SIZE = 4096
+
+# The word index of every word bank in a worker process, set up once by
+# _init_worker.
+_worker_word_indexes = None
+
+class RequestError(Exception):
+    """
+    A request that cannot be answered, along with the HTTP status to answer it
+    with.
+    
+    Attributes:
+        status: The integer HTTP status code.
+    """
+    
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class SolveServer(object):
+    """
+    Answers solve requests from any number of clients at once, running the
+    searches on a bounded pool of worker processes. Each worker builds the
+    index of every word bank once, from the index files loaded when the server
+    starts, and keeps it for every search it runs.
+    
+    Attributes:
+        word_banks: A dictionary mapping the name of every word bank to the
+                    word_loader.IndexedWordBank loaded for it, in the order
+                    the word lists were given.
+        default_word_bank: The name of the word bank used by requests that do
+                           not name one.
+        workers: The number of worker processes.
+        max_timeout: The most seconds any search may run for, or None if
+                     there is no limit.
+    """
+    
+    def __init__(self, word_list_paths, workers=None, cache_dir=None,
+                 max_timeout=None):
+        """
+        Args:
+            word_list_paths: A list of the paths of the word lists to load,
+                             each of which is named after its file name
+                             without the extension.
+            workers: An optional number of worker processes. If it is not
+                     provided, there is one for every CPU.
+            cache_dir: An optional directory to keep the indexes of the word
+                       lists in.
+            max_timeout: An optional most seconds any search may run for.
+        
+        Raises:
+            ValueError: Two word lists have the same name.
+        """
+        
+        self.word_banks = {}
+        self._word_list_paths = {}
+        for path in word_list_paths:
+            name = os.path.splitext(os.path.basename(path))[0]
+            if name in self.word_banks:
+                raise ValueError("Two word lists are named {}".format(name))
+            self.word_banks[name] = word_loader.load_word_bank(path, cache_dir)
+            self._word_list_paths[name] = path
+        
+        self.default_word_bank = next(iter(self.word_banks))
+        self.workers = workers or os.cpu_count() or 1
+        self.max_timeout = max_timeout
+        self._cache_dir = cache_dir
+        self._max_jobs = self.workers * (1 + QUEUED_JOBS_PER_WORKER)
+        self._jobs = 0
+        self._pool = None
+        self._manager = None
+        self._readers = None
+    
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT,
+                    socket_path=None, on_ready=None):
+        """
+        Answers requests until the task running this is cancelled.
+        
+        Args:
+            host: The address to listen on, which should be a local one.
+            port: The port to listen on.
+            socket_path: An optional path of a Unix socket to listen on instead
+                         of host and port.
+            on_ready: An optional function called with the address being
+                      listened on once requests are being accepted.
+        """
+        
+        # The workers are started fresh rather than forked, since the server
+        # has threads holding locks by the time the pool starts them. The
+        # index files were all built when the word banks were loaded, so the
+        # workers only have to map them.
+        context = multiprocessing.get_context("spawn")
+        self._pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=context,
+            initializer=_init_worker,
+            initargs=(self._word_list_paths, self._cache_dir))
+        self._manager = context.Manager()
+        self._readers = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self._max_jobs)
+        
+        socket_created = False
+        try:
+            if socket_path:
+                _remove_stale_socket(socket_path)
+                server = await asyncio.start_unix_server(
+                    self.handle_connection, socket_path)
+                socket_created = True
+                address = socket_path
+            else:
+                server = await asyncio.start_server(
+                    self.handle_connection, host, port)
+                address = "http://{}:{}".format(
+                    *server.sockets[0].getsockname()[:2])
+            
+            async with server:
+                if on_ready:
+                    on_ready(address)
+                await server.serve_forever()
+        finally:
+            self._readers.shutdown(wait=False, cancel_futures=True)
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._manager.shutdown()
+            if socket_created and os.path.exists(socket_path):
+                os.unlink(socket_path)
+    
+    async def handle_connection(self, reader, writer):
+        """
+        Answers the one request sent over a connection, then closes it.
+        
+        Args:
+            reader: The asyncio.StreamReader of the connection.
+            writer: The asyncio.StreamWriter of the connection.
+        """
+        
+        try:
+            try:
+                method, path, body = await _read_request(reader)
+                if path == "/solve":
+                    if method != "POST":
+                        raise RequestError(405, "Solve requests must be POST")
+                    await self.solve(body, reader, writer)
+                elif path == "/word-banks":
+                    if method != "GET":
+                        raise RequestError(405, "Word banks must be GET")
+                    await _write_json(writer, 200, self.describe())
+                else:
+                    raise RequestError(404, "No such path: {}".format(path))
+            except RequestError as error:
+                await _write_json(writer, error.status, {"error": str(error)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await asyncio.wait_for(writer.wait_closed(), WRITE_TIMEOUT)
+            except asyncio.TimeoutError:
+                writer.transport.abort()
+            except ConnectionError:
+                pass
+    
+    def describe(self):
+        """
+        Describes the word banks and how busy the server is.
+        
+        Returns:
+            A dictionary that can be written out as JSON.
+        """
+        
+        return {
+            "word_banks": [{"name": name, "words": len(word_bank)}
+                           for name, word_bank in self.word_banks.items()],
+            "default_word_bank": self.default_word_bank,
+            "workers": self.workers,
+            "jobs": self._jobs,
+        }
+    
+    async def solve(self, body, reader, writer):
+        """
+        Solves the puzzle in a solve request on a worker, streaming the
+        solutions back as they are found. If the client falls behind, the
+        search is paused along with it, and if the client goes away, or reads
+        nothing for WRITE_TIMEOUT seconds, the search is cancelled.
+        
+        Args:
+            body: The bytes of the request body.
+            reader: The asyncio.StreamReader of the connection, which is
+                    watched for the client closing it.
+            writer: The asyncio.StreamWriter of the connection.
+        
+        Raises:
+            RequestError: The request is not a valid solve request, or there
+                          are too many jobs already.
+        """
+        
+        job = self.read_job(body)
+        if self._jobs >= self._max_jobs:
+            raise RequestError(503, "Too many puzzles are being solved")
+        
+        loop = asyncio.get_running_loop()
+        solution_queue = self._manager.Queue(QUEUED_BATCHES)
+        cancel_event = self._manager.Event()
+        
+        # A job holds its place until its worker is done with it, even if its
+        # client has gone, so that the pool is never given more than its share.
+        self._jobs = self._jobs + 1
+        future = loop.run_in_executor(self._pool, _run_job, *job,
+                                      solution_queue, cancel_event)
+        future.add_done_callback(self._finish_job)
+        client_gone = asyncio.ensure_future(_wait_for_eof(reader))
+        
+        try:
+            _write_head(writer, 200, "application/x-ndjson", chunked=True)
+            while True:
+                # Every message a job sends is on the queue by the time its
+                # future is done, so once nothing more comes after that, the
+                # job has ended without saying so.
+                finished = future.done()
+                message = await loop.run_in_executor(
+                    self._readers, _next_message, solution_queue)
+                if message is None:
+                    # A search that finds nothing for a long while never
+                    # writes, so a client that has gone is only noticed here.
+                    if client_gone.done():
+                        return
+                    if not finished:
+                        continue
+                    error = future.exception()
+                    message = ("error", str(error) if error else
+                               "The search ended without a result")
+                
+                if message[0] == "solutions":
+                    _write_chunk(writer, "".join(
+                        json.dumps({"solution": solution}) + "\n"
+                        for solution in message[1]).encode("utf-8"))
+                    await _drain(writer)
+                    continue
+                
+                if message[0] == "done":
+                    unused, num_solutions, num_nodes, reason = message
+                    result = {"done": True, "solutions": num_solutions,
+                              "nodes": num_nodes, "stopped": reason}
+                else:
+                    result = {"error": message[1]}
+                _write_chunk(writer, (json.dumps(result) + "\n").encode(
+                    "utf-8"))
+                _write_chunk(writer, b"")
+                await _drain(writer)
+                return
+        finally:
+            client_gone.cancel()
+            cancel_event.set()
+    
+    def read_job(self, body):
+        """
+        Reads the search a solve request asks for.
+        
+        Args:
+            body: The bytes of the request body.
+        
+        Returns:
+            A tuple of the arguments _run_job takes before its queue and event:
+            the name of the word bank, the crossword_tools.Puzzle, the
+            solver.SearchOptions, and the limits on the number of solutions,
+            seconds and words put in lines, each of which may be None.
+        
+        Raises:
+            RequestError: The request is not a valid solve request.
+        """
+        
+        try:
+            request = json.loads(body.decode("utf-8"))
+        except ValueError as error:
+            raise RequestError(400, "The request is not JSON: {}".format(
+                error))
+        if not isinstance(request, dict):
+            raise RequestError(400, "The request must be a JSON object")
+        
+        try:
+            puzzle = crossword_tools.puzzle_from_dict(request.get("puzzle"))
+        except ValueError as error:
+            raise RequestError(400, str(error))
+        
+        name = request.get("word_bank", self.default_word_bank)
+        if name not in self.word_banks:
+            raise RequestError(400, "No word bank is named {}".format(name))
+        
+        search_options = request.get("options", {})
+        if not isinstance(search_options, dict):
+            raise RequestError(400, "The options must be a JSON object")
+        try:
+            options = solver.SearchOptions(**search_options)
+        except (TypeError, ValueError, ImportError) as error:
+            raise RequestError(400, str(error))
+        
+        max_solutions = _read_limit(request, "max_solutions", int)
+        timeout = _read_limit(request, "timeout", (int, float))
+        max_nodes = _read_limit(request, "max_nodes", int)
+        if self.max_timeout is not None:
+            timeout = min(timeout if timeout is not None
+                          else self.max_timeout, self.max_timeout)
+        
+        return name, puzzle, options, max_solutions, timeout, max_nodes
+    
+    def _finish_job(self, future):
+        """
+        Frees the place of a job once its worker is done with it.
+        
+        Args:
+            future: The future of the job.
+        """
+        
+        self._jobs = self._jobs - 1
+
+def _read_limit(request, key, types):
+    """
+    Reads an optional limit from a solve request.
+    
+    Args:
+        request: The dictionary read from the request.
+        key: The name of the limit.
+        types: The type, or tuple of types, the limit may have.
+    
+    Returns:
+        The limit, or None if it is not in the request.
+    
+    Raises:
+        RequestError: The limit is negative or not of the right type.
+    """
+    
+    value = request.get(key)
+    if value is None:
+        return None
+    if (not isinstance(value, types) or isinstance(value, bool) or
+            value < 0):
+        raise RequestError(400, "{} must be a number of at least 0".format(
+            key))
+    
+    return value
+
+async def _read_request(reader):
+    """
+    Reads an HTTP request from a connection.
+    
+    Args:
+        reader: The asyncio.StreamReader of the connection.
+    
+    Returns:
+        A tuple of the method, the path without its query, and the bytes of
+        the body.
+    
+    Raises:
+        RequestError: The request is not one that can be read.
+    """
+    
+    parts = (await reader.readline()).decode("latin-1").split()
+    if len(parts) != 3:
+        raise RequestError(400, "Malformed request line")
+    method, target, version = parts
+    
+    headers = {}
+    for line_number in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if not line.strip():
+            break
+        name, unused, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise RequestError(431, "Too many header lines")
+    
+    if "transfer-encoding" in headers:
+        raise RequestError(411, "The request body must have a length")
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise RequestError(400, "Malformed content length")
+    if not 0 <= length <= MAX_BODY_SIZE:
+        raise RequestError(413, "The request body is too large")
+    
+    body = await reader.readexactly(length)
+    return method, target.split("?", 1)[0], body
+
+def _write_head(writer, status, content_type, length=None, chunked=False):
+    """
+    Writes the status line and headers of an HTTP response.
+    
+    Args:
+        writer: The asyncio.StreamWriter of the connection.
+        status: The integer HTTP status code.
+        content_type: The media type of the body.
+        length: The number of bytes in the body, if it is not chunked.
+        chunked: True if the body is sent in chunks as it is made.
+    """
+    
+    lines = ["HTTP/1.1 {} {}".format(status, http.HTTPStatus(status).phrase),
+             "Content-Type: {}".format(content_type),
+             "Connection: close"]
+    if chunked:
+        lines.append("Transfer-Encoding: chunked")
+    else:
+        lines.append("Content-Length: {}".format(length))
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+def _write_chunk(writer, data):
+    """
+    Writes a chunk of a chunked HTTP response body. An empty chunk ends the
+    body.
+    
+    Args:
+        writer: The asyncio.StreamWriter of the connection.
+        data: The bytes of the chunk.
+    """
+    
+    writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+async def _write_json(writer, status, value):
+    """
+    Writes a whole HTTP response holding a JSON value.
+    
+    Args:
+        writer: The asyncio.StreamWriter of the connection.
+        status: The integer HTTP status code.
+        value: The value to write out as JSON.
+    """
+    
+    body = (json.dumps(value) + "\n").encode("utf-8")
+    _write_head(writer, status, "application/json", len(body))
+    writer.write(body)
+    await _drain(writer)
+
+async def _drain(writer):
+    """
+    Waits for what has been written to a connection to be sent, dropping the
+    connection if the client does not read it within WRITE_TIMEOUT seconds.
+    
+    Args:
+        writer: The asyncio.StreamWriter of the connection.
+    
+    Raises:
+        ConnectionAbortedError: The client stopped reading, and the connection
+                                was dropped.
+    """
+    
+    try:
+        await asyncio.wait_for(writer.drain(), WRITE_TIMEOUT)
+    except asyncio.TimeoutError:
+        writer.transport.abort()
+        raise ConnectionAbortedError("The client stopped reading")
+
+async def _wait_for_eof(reader):
+    """
+    Waits for a client to close its side of a connection, throwing away
+    anything it sends first.
+    
+    Args:
+        reader: The asyncio.StreamReader of the connection.
+    """
+    
+    try:
+        while await reader.read(DISCARD_READ_SIZE):
+            pass
+    except ConnectionError:
+        pass
+
+def _next_message(solution_queue):
+    """
+    Waits a short while for the next message from a job's worker.
+    
+    Args:
+        solution_queue: The queue the worker sends its messages on.
+    
+    Returns:
+        The message, or None if none came.
+    """
+    
+    try:
+        return solution_queue.get(timeout=SOLUTION_BATCH_SECONDS)
+    except queue.Empty:
+        return None
+
+def _remove_stale_socket(socket_path):
+    """
+    Removes a Unix socket left behind by a server that did not shut down
+    cleanly, so that a new one can listen at the same path.
+    
+    Args:
+        socket_path: The path of the socket.
+    
+    Raises:
+        OSError: Something other than a socket is at the path.
+    """
+    
+    try:
+        mode = os.stat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError("{} exists and is not a socket".format(
+            socket_path))
+    os.unlink(socket_path)
+
+def _init_worker(word_list_paths, cache_dir):
+    """
+    Builds the word index of every word bank in a worker process.
+    
+    Args:
+        word_list_paths: A dictionary mapping the name of every word bank to
+                         the path of its word list.
+        cache_dir: The directory the indexes of the word lists are kept in, or
+                   None.
+    """
+    
+    global _worker_word_indexes
+    _worker_word_indexes = {
+        name: solver.index_word_bank(word_loader.load_word_bank(path,
+                                                                cache_dir))
+        for name, path in word_list_paths.items()}
+
+def _run_job(word_bank_name, puzzle, options, max_solutions, timeout,
+             max_nodes, solution_queue, cancel_event):
+    """
+    Solves a puzzle in a worker process, sending the solutions back in batches
+    as they are found. Whenever the queue is full, the search waits for it to
+    be read, until it is cancelled or reaches its limits. Once it has reached
+    them, what it has found waits at most WRITE_TIMEOUT more seconds to be
+    read.
+    
+    Args:
+        word_bank_name: The name of the word bank to use.
+        puzzle: The crossword_tools.Puzzle to solve.
+        options: The solver.SearchOptions of the search.
+        max_solutions: The most solutions to find, or None.
+        timeout: The most seconds to search for, or None.
+        max_nodes: The most words to put in lines, or None.
+        solution_queue: The queue to send messages to the server on. Batches
+                        of solutions are sent as ("solutions", list), and then
+                        either ("done", solutions, nodes, reason) or
+                        ("error", message).
+        cancel_event: An event that is set once the server no longer wants the
+                      solutions.
+    """
+    
+    limits = solver.SearchLimits(timeout, max_nodes, cancel_event)
+    batch = []
+    last_send = time.monotonic()
+    give_up_time = None
+    
+    def send(message):
+        nonlocal give_up_time
+        while not cancel_event.is_set():
+            try:
+                solution_queue.put(message, timeout=SOLUTION_BATCH_SECONDS)
+                return True
+            except queue.Full:
+                if not limits.poll():
+                    continue
+                if give_up_time is None:
+                    give_up_time = time.monotonic() + WRITE_TIMEOUT
+                elif time.monotonic() >= give_up_time:
+                    return False
+        return False
+    
+    def send_batch():
+        nonlocal batch, last_send
+        sent = not batch or send(("solutions", batch))
+        batch = []
+        last_send = time.monotonic()
+        return sent
+    
+    # Solutions found just before the search goes quiet are sent while it
+    # carries on, rather than waiting for the next one.
+    def on_progress(stats):
+        if batch and time.monotonic() - last_send >= SOLUTION_BATCH_SECONDS:
+            send_batch()
+    
+    stats = solver.SearchStats(on_progress=on_progress,
+                               progress_interval=solver.LIMIT_CHECK_INTERVAL)
+    try:
+        puzzle = solver.compile_puzzle(puzzle)
+        word_index = _worker_word_indexes[word_bank_name]
+        fitting_words = solver.fit_words(puzzle, word_index)
+        num_solutions = 0
+        if fitting_words is not None and max_solutions != 0:
+            for solution in solver.generate_solutions(
+                    puzzle, word_index, fitting_words, options, stats,
+                    limits):
+                batch.append(dict(solution))
+                num_solutions = num_solutions + 1
+                if (len(batch) >= SOLUTION_BATCH_SIZE or
+                        time.monotonic() - last_send >=
+                        SOLUTION_BATCH_SECONDS):
+                    if not send_batch():
+                        break
+                if max_solutions is not None and num_solutions >= max_solutions:
+                    break
+        
+        if send_batch():
+            send(("done", num_solutions, stats.nodes, limits.reason))
+    except Exception as error:
+        send(("error", "{}: {}".format(type(error).__name__, error)))
+
+def main(args=None):
+    """
+    Starts a solve server from the command line.
+    
+    Args:
+        args: An optional list of the command line arguments. If it is not
+              provided, the arguments this process was started with are used.
+    """
+    
+    parser = argparse.ArgumentParser(
+        description="Solve puzzles sent over HTTP, on localhost or a Unix "
+                    "socket, with word lists that are loaded once.")
+    parser.add_argument("word_lists", nargs="+",
+                        help="files with one word per line, each of which is "
+                             "named after its file name without the "
+                             "extension; the first is the default")
+    parser.add_argument("--host", default=DEFAULT_HOST,
+                        help="the address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help="the port to listen on")
+    parser.add_argument("--socket",
+                        help="the path of a Unix socket to listen on instead "
+                             "of a port")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(),
+                        help="the number of worker processes")
+    parser.add_argument("--cache-dir",
+                        help="the directory to keep the word list indexes in")
+    parser.add_argument("--max-timeout", type=float,
+                        help="the most seconds any search may run for")
+    parsed = parser.parse_args(args)
+    
+    try:
+        server = SolveServer(parsed.word_lists, parsed.workers,
+                             parsed.cache_dir, parsed.max_timeout)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    
+    def on_ready(address):
+        print(constants.SERVER_LISTENING_STR.format(
+            ", ".join(server.word_banks), address), file=sys.stderr)
+    
+    try:
+        asyncio.run(server.serve(parsed.host, parsed.port, parsed.socket,
+                                 on_ready))
+    except OSError as error:
+        parser.error(str(error))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,578 @@
+import collections
+import copy
+import crossword_tools
+import solver
+
+# How far one tile along a line of each direction is from the last.
+_STEPS = {
+    crossword_tools.DIR_DOWN: (0, 1),
+    crossword_tools.DIR_RIGHT: (1, 0),
+}
+
+class SolverSession(object):
+    """
+    A puzzle and word bank that are solved again and again as they are edited,
+    keeping what earlier solves worked out. The word index is built once and
+    changed in place, the arc consistent domain of every line is kept, and the
+    solutions of every group of connected lines are kept until an edit touches
+    that group. Each edit only redoes the work for the groups it touches:
+    
+    - Removing a word narrows the domains it was in and drops the solutions
+      that used it, without searching.
+    - Adding a new word widens the domains outwards from the lines it fits
+      in, keeps every earlier solution, since they all still hold, and only
+      searches the branches that put the new word in a line.
+    - Toggling a tile rebuilds the lines through it and gives the lines that
+      crossed the old or new ones fresh domains, and only the groups holding
+      them are searched again.
+    
+    Lines keep their ids across edits that do not change them, so solutions
+    before and after an edit can be compared. The solutions are the same as
+    solver.solve finds for the same puzzle and word bank, though not always in
+    the same order.
+    
+    Attributes:
+        puzzle: The crossword_tools.Puzzle being solved, which is kept up to
+                date with the tiles. It must not be modified.
+        word_index: The solver.WordIndex of the word bank, which is kept up to
+                    date with the words. It must not be modified.
+        options: The solver.SearchOptions every search is run with.
+    """
+    
+    def __init__(self, tile_map, word_bank, options=None):
+        """
+        Args:
+            tile_map: A CoordMap or DenseCoordMap mapping coordinates to
+                      boolean values, in the form
+                      crossword_tools.generate_puzzle_from_selected_tile_map
+                      takes. Lines are numbered the same way it numbers them.
+            word_bank: A list of strings, or a word_loader.IndexedWordBank.
+                       Words of every length are indexed, so that lines of any
+                       length can be added later.
+            options: An optional solver.SearchOptions object holding the
+                     settings of every search.
+        """
+        
+        self.puzzle = crossword_tools.Puzzle()
+        self.word_index = solver.index_word_bank(word_bank)
+        self.options = options
+        self._tiles = {(x, y) for x, y, selected in tile_map.get_filled_items()
+                       if selected}
+        self._runs = {}
+        self._owners = {}
+        self._next_line_id = 0
+        self._domains = {}
+        self._components = None
+        self._solutions_by_component = {}
+        
+        # Down lines are numbered before right lines, column by column, and
+        # right lines row by row, in the same order as a puzzle generated from
+        # the tile map.
+        for direction, major, minor in ((crossword_tools.DIR_DOWN, 0, 1),
+                                        (crossword_tools.DIR_RIGHT, 1, 0)):
+            dx, dy = _STEPS[direction]
+            starts = [tile for tile in self._tiles
+                      if (tile[0] - dx, tile[1] - dy) not in self._tiles]
+            for x, y in sorted(starts, key=lambda tile: (tile[major],
+                                                         tile[minor])):
+                run = self._find_run(x, y, direction)
+                if run[3] > 1:
+                    self._add_line(run)
+        
+        for line_ids in self._get_components():
+            self._reset_domains(line_ids)
+    
+    def solve(self, stats=None):
+        """
+        Finds every solution to the puzzle, searching only the groups of lines
+        whose solutions are not already known.
+        
+        Args:
+            stats: An optional solver.SearchStats object the searches are
+                   counted in.
+        
+        Returns:
+            A list of new dictionaries, each mapping every line id in the
+            puzzle to a word from the word bank, or None if the puzzle has no
+            lines.
+        """
+        
+        if not self.puzzle.lines:
+            return None
+        
+        component_solutions = []
+        for line_ids in self._get_components():
+            key = frozenset(line_ids)
+            solutions = self._solutions_by_component.get(key)
+            if solutions is None:
+                solutions = self._search_component(line_ids, stats=stats)
+                self._solutions_by_component[key] = solutions
+            if not solutions:
+                return []
+            component_solutions.append(solutions)
+        
+        if len(component_solutions) == 1:
+            solutions = [copy.copy(solution)
+                         for solution in component_solutions[0]]
+        else:
+            solutions = [copy.copy(solution) for solution in
+                         solver.combine_solutions(component_solutions,
+                                                  self.word_index,
+                                                  collections.Counter(), {})]
+        
+        if stats:
+            stats.solutions += len(solutions)
+        
+        return solutions
+    
+    def add_word(self, word):
+        """
+        Adds a copy of a word to the word bank.
+        
+        Args:
+            word: The string to add.
+        """
+        
+        word_index = self.word_index
+        try:
+            already_in_bank = word_index.copies[word_index.id_of(word)] > 0
+        except KeyError:
+            already_in_bank = False
+        word_id = word_index.add_word(word)
+        
+        for line_ids in self._get_components_with_length(len(word)):
+            # The domains only depend on which words are in the word bank, not
+            # on how many copies of them there are.
+            if not already_in_bank:
+                self._grow_domains(line_ids, word_id)
+            key = frozenset(line_ids)
+            solutions = self._solutions_by_component.get(key)
+            if solutions is None:
+                continue
+            
+            # Another copy of a word already in the bank can go in any number
+            # of lines, so its group is searched again. A new word leaves every
+            # earlier solution standing, and every new solution uses it.
+            if already_in_bank:
+                del self._solutions_by_component[key]
+            else:
+                solutions.extend(self._search_with_word(line_ids, word_id))
+    
+    def remove_word(self, word):
+        """
+        Removes a copy of a word from the word bank.
+        
+        Args:
+            word: A string in the word bank.
+        
+        Raises:
+            KeyError: The word has no copies in the word bank.
+        """
+        
+        word_id = self.word_index.remove_word(word)
+        copies = self.word_index.copies[word_id]
+        
+        for line_ids in self._get_components_with_length(len(word)):
+            if not copies:
+                self._narrow_domains(line_ids, word_id)
+            
+            key = frozenset(line_ids)
+            solutions = self._solutions_by_component.get(key)
+            if solutions is not None:
+                self._solutions_by_component[key] = [
+                    solution for solution in solutions
+                    if list(solution.values()).count(word) <= copies]
+    
+    def toggle_tile(self, x, y):
+        """
+        Adds a tile to the puzzle if it is not part of it, and takes it out if
+        it is, changing the lines running through it.
+        
+        Args:
+            x: The x coordinate of the tile.
+            y: The y coordinate of the tile.
+        """
+        
+        self.set_tile(x, y, (x, y) not in self._tiles)
+    
+    def set_tile(self, x, y, selected):
+        """
+        Adds a tile to the puzzle or takes it out, changing the lines running
+        through it.
+        
+        Args:
+            x: The x coordinate of the tile.
+            y: The y coordinate of the tile.
+            selected: True if the tile should be part of the puzzle, and False
+                      if not.
+        """
+        
+        if selected == ((x, y) in self._tiles):
+            return
+        
+        if selected:
+            self._tiles.add((x, y))
+        else:
+            self._tiles.discard((x, y))
+        
+        # Only the lines through the tile or ending next to it can change. The
+        # rest of the lines keep their ids, but the ones crossing a changed
+        # line have their domains worked out again.
+        lines_changed = False
+        changed_ids = set()
+        for direction, (dx, dy) in _STEPS.items():
+            old_ids = set()
+            new_runs = set()
+            for tile in ((x - dx, y - dy), (x, y), (x + dx, y + dy)):
+                owner = self._owners.get(tile + (direction,))
+                if owner is not None:
+                    old_ids.add(owner[0])
+                if tile in self._tiles:
+                    run = self._find_run(tile[0], tile[1], direction)
+                    if run[3] > 1:
+                        new_runs.add(run)
+            
+            for line_id in old_ids:
+                if self._runs[line_id] in new_runs:
+                    new_runs.discard(self._runs[line_id])
+                else:
+                    changed_ids.update(self._crossing_ids(line_id))
+                    self._remove_line(line_id)
+                    lines_changed = True
+            for run in sorted(new_runs):
+                line_id = self._add_line(run)
+                changed_ids.add(line_id)
+                changed_ids.update(self._crossing_ids(line_id))
+                lines_changed = True
+        
+        if not lines_changed:
+            return
+        
+        # The solutions of groups that were split up, joined or changed are 
+        # dropped, and those of the groups left alone are kept.
+        self._components = None
+        solutions_by_component = {}
+        for line_ids in self._get_components():
+            key = frozenset(line_ids)
+            if not changed_ids.isdisjoint(line_ids):
+                self._reset_domains(line_ids)
+            elif key in self._solutions_by_component:
+                solutions_by_component[key] = (
+                    self._solutions_by_component[key])
+        self._solutions_by_component = solutions_by_component
+    
+    def line_at(self, x, y, direction):
+        """
+        Finds the line running through a tile in a direction.
+        
+        Args:
+            x: The x coordinate of the tile.
+            y: The y coordinate of the tile.
+            direction: crossword_tools.DIR_DOWN or crossword_tools.DIR_RIGHT.
+        
+        Returns:
+            A tuple of the id of the line and the position of the tile in it,
+            or None if no line in that direction runs through the tile.
+        """
+        
+        return self._owners.get((x, y, direction))
+    
+    def _find_run(self, x, y, direction):
+        """
+        Finds the longest run of tiles in the puzzle, in a direction, through a
+        tile that is in the puzzle.
+        
+        Args:
+            x: The x coordinate of the tile.
+            y: The y coordinate of the tile.
+            direction: crossword_tools.DIR_DOWN or crossword_tools.DIR_RIGHT.
+        
+        Returns:
+            A tuple of the x and y coordinates of the first tile of the run,
+            the direction, and the integer number of tiles in the run.
+        """
+        
+        dx, dy = _STEPS[direction]
+        while (x - dx, y - dy) in self._tiles:
+            x = x - dx
+            y = y - dy
+        
+        length = 1
+        while (x + dx * length, y + dy * length) in self._tiles:
+            length = length + 1
+        
+        return (x, y, direction, length)
+    
+    def _add_line(self, run):
+        """
+        Adds a line to the puzzle, along with its intersection points with the
+        lines crossing it.
+        
+        Args:
+            run: A tuple in the form _find_run returns.
+        
+        Returns:
+            The id given to the line.
+        """
+        
+        x, y, direction, length = run
+        dx, dy = _STEPS[direction]
+        line_id = self._next_line_id
+        self._next_line_id = line_id + 1
+        self._runs[line_id] = run
+        
+        intersections = []
+        for offset in range(length):
+            tile = (x + dx * offset, y + dy * offset)
+            self._owners[tile + (direction,)] = (line_id, offset)
+            crossing = self._owners.get(tile + (1 - direction,))
+            if crossing is None:
+                continue
+            
+            second_id, second_offset = crossing
+            intersections.append(crossword_tools.Puzzle.IntersectionPoint(
+                line_id, second_id, offset, second_offset))
+            self.puzzle.lines[second_id].intersection_points.append(
+                crossword_tools.Puzzle.IntersectionPoint(
+                    second_id, line_id, second_offset, offset))
+        
+        self.puzzle.add_line(length, direction, intersections, line_id)
+        return line_id
+    
+    def _remove_line(self, line_id):
+        """
+        Takes a line out of the puzzle, along with its intersection points.
+        
+        Args:
+            line_id: The id of the line.
+        """
+        
+        x, y, direction, length = self._runs.pop(line_id)
+        dx, dy = _STEPS[direction]
+        for offset in range(length):
+            del self._owners[(x + dx * offset, y + dy * offset, direction)]
+        
+        for second_id in self._crossing_ids(line_id):
+            second_line = self.puzzle.lines[second_id]
+            second_line.intersection_points = [
+                point for point in second_line.intersection_points
+                if point.second_id != line_id]
+        
+        del self.puzzle.lines[line_id]
+        self._domains.pop(line_id, None)
+    
+    def _crossing_ids(self, line_id):
+        """
+        Gets the lines crossing a line.
+        
+        Args:
+            line_id: The id of the line.
+        
+        Returns:
+            A list of the ids of the lines crossing it.
+        """
+        
+        return [point.second_id
+                for point in self.puzzle.lines[line_id].intersection_points]
+    
+    def _get_components(self):
+        """
+        Gets the groups of lines that are connected to each other, working
+        them out again if the lines have changed.
+        
+        Returns:
+            A list of lists of line ids, as solver.find_components makes them,
+            with line ids from puzzle.
+        """
+        
+        if self._components is None:
+            compiled = crossword_tools.CompiledPuzzle(
+                self.puzzle, sorted(self.puzzle.lines.keys()))
+            self._components = [[compiled.line_ids[number] for number in group]
+                                for group in solver.find_components(compiled)]
+        
+        return self._components
+    
+    def _get_components_with_length(self, length):
+        """
+        Gets the groups of lines holding a line with a length.
+        
+        Args:
+            length: The integer length of the line.
+        
+        Returns:
+            A list of lists of line ids.
+        """
+        
+        lines = self.puzzle.lines
+        return [line_ids for line_ids in self._get_components()
+                if any(lines[line_id].length == length
+                       for line_id in line_ids)]
+    
+    def _reset_domains(self, line_ids):
+        """
+        Works out the domains of a group of lines from the word bank, and makes
+        them arc consistent.
+        
+        Args:
+            line_ids: A list of the ids of the lines in the group.
+        """
+        
+        compiled = crossword_tools.CompiledPuzzle(self.puzzle, line_ids)
+        fitting_words = solver.fit_words(compiled, self.word_index)
+        if fitting_words is not None:
+            domains = solver.DomainStore(compiled, self.word_index,
+                                         fitting_words)
+            if solver.enforce_arc_consistency(compiled, domains):
+                self._domains.update(zip(line_ids, domains.copy_domains()))
+                return
+        
+        # A group that cannot be solved is left with empty domains.
+        for line_id in line_ids:
+            self._domains[line_id] = set()
+    
+    def _grow_domains(self, line_ids, word_id):
+        """
+        Puts a new word in the domains of a group of lines, along with the 
+        words that were taken out of them for having no partner on some 
+        crossing line, but have one again now, and makes the domains arc
+        consistent again. Only the lines whose domains grow, and the lines
+        crossing them, are checked.
+        
+        Args:
+            line_ids: A list of the ids of the lines in the group.
+            word_id: The id of the word, which must have just been put back in
+                     the word index.
+        """
+        
+        compiled = crossword_tools.CompiledPuzzle(self.puzzle, line_ids)
+        word_index = self.word_index
+        words = word_index.words
+        domains = [set(self._domains[line_id]) for line_id in line_ids]
+        
+        # A word that can go in a line now, but could not before, has a 
+        # partner on some crossing line that could not go there before either,
+        # so the words to put back are found by following the new words from
+        # line to line. Words put back that still lack a partner somewhere are
+        # taken out again by arc consistency.
+        added = [set() for line_id in line_ids]
+        pending = []
+        for number, length in enumerate(compiled.lengths):
+            if length == len(words[word_id]):
+                added[number].add(word_id)
+                pending.append((number, {word_id}))
+        
+        while pending:
+            number, new_ids = pending.pop()
+            for second_number, first_intersect, second_intersect in (
+                    compiled.crossings[number]):
+                letters = {words[new_id][first_intersect] 
+                           for new_id in new_ids}
+                ids_by_letter = word_index.letters(
+                    compiled.lengths[second_number], second_intersect)
+                partner_ids = set()
+                for letter in letters:
+                    partner_ids.update(ids_by_letter.get(letter, ()))
+                partner_ids.difference_update(domains[second_number],
+                                              added[second_number])
+                if partner_ids:
+                    added[second_number].update(partner_ids)
+                    pending.append((second_number, partner_ids))
+        
+        changed_numbers = set()
+        for number, new_ids in enumerate(added):
+            if new_ids:
+                domains[number].update(new_ids)
+                changed_numbers.update(second_number for second_number, _, _ 
+                                       in compiled.crossings[number])
+        
+        domains = solver.DomainStore(compiled, word_index, domains)
+        if solver.enforce_arc_consistency(compiled, domains, 
+                                          sorted(changed_numbers)):
+            self._domains.update(zip(line_ids, domains.copy_domains()))
+        else:
+            for line_id in line_ids:
+                self._domains[line_id] = set()
+    
+    def _narrow_domains(self, line_ids, word_id):
+        """
+        Takes a word out of the domains of a group of lines, and takes out the
+        words that no longer have a partner on some crossing line as a result.
+        
+        Args:
+            line_ids: A list of the ids of the lines in the group.
+            word_id: The id of the word.
+        """
+        
+        compiled = crossword_tools.CompiledPuzzle(self.puzzle, line_ids)
+        domains = solver.DomainStore(compiled, self.word_index,
+                                     [self._domains[line_id]
+                                      for line_id in line_ids])
+        changed_numbers = [number for number in range(len(line_ids))
+                           if word_id in domains.words(number)]
+        if not changed_numbers:
+            return
+        
+        for number in changed_numbers:
+            domains.remove(number, {word_id})
+        if (all(domains.size(number) for number in changed_numbers) and
+                solver.enforce_arc_consistency(compiled, domains,
+                                               changed_numbers)):
+            self._domains.update(zip(line_ids, domains.copy_domains()))
+        else:
+            for line_id in line_ids:
+                self._domains[line_id] = set()
+    
+    def _search_component(self, line_ids, domains=None, stats=None):
+        """
+        Searches for every solution to a group of lines.
+        
+        Args:
+            line_ids: A list of the ids of the lines in the group.
+            domains: An optional list mapping the position of every line in
+                     line_ids to the set of the ids of the words to try in it.
+                     If it is not provided, the kept domains are used.
+            stats: An optional solver.SearchStats object the search is counted
+                   in.
+        
+        Returns:
+            A list of new dictionaries mapping every line id in the group to a
+            word.
+        """
+        
+        if domains is None:
+            domains = [self._domains[line_id] for line_id in line_ids]
+        if not all(domains):
+            return []
+        
+        compiled = crossword_tools.CompiledPuzzle(self.puzzle, line_ids)
+        return [copy.copy(solution) for solution in solver.search_solutions(
+            compiled, self.word_index, domains, self.options, stats)]
+    
+    def _search_with_word(self, line_ids, word_id):
+        """
+        Searches for the solutions to a group of lines that use a word. They
+        are split up by the first line holding the word, so that none is found
+        twice.
+        
+        Args:
+            line_ids: A list of the ids of the lines in the group.
+            word_id: The id of the word.
+        
+        Returns:
+            A list of new dictionaries mapping every line id in the group to a
+            word.
+        """
+        
+        domains = [self._domains[line_id] for line_id in line_ids]
+        solutions = []
+        for number, domain in enumerate(domains):
+            if word_id not in domain:
+                continue
+            
+            forced_domains = list(domains)
+            forced_domains[number] = {word_id}
+            solutions.extend(self._search_component(line_ids, forced_domains))
+            domains[number] = domain - {word_id}
+        
+        return solutions
@@ -0,0 +1,345 @@
+import hashlib
+import json
+import os
+import struct
+
+import solver
+
+# The first bytes of every binary solution file, which change whenever the
+# layout of the file does.
+SOLUTION_MAGIC = b"CWSOL001"
+
+# The ways a solution file can be written. Binary files hold every solution in
+# a record of the same size, so any page of them can be read straight away,
+# while JSON lines files can be read by anything that reads JSON.
+FORMAT_BINARY = "binary"
+FORMAT_JSONL = "jsonl"
+FORMATS = (FORMAT_BINARY, FORMAT_JSONL)
+
+# The number of solutions written between flushes of a solution file, so that
+# at most this many are lost if the process is killed.
+FLUSH_INTERVAL = 256
+
+_HEADER_SIZE = struct.Struct("<Q")
+_WORD_ID_FORMAT = "<{}I"
+
+def hash_word_bank(word_bank):
+    """
+    Hashes the words of a word bank, in the order they are iterated over, so
+    that a solution file can tell whether it is being read with the word bank
+    it was written with.
+    
+    Args:
+        word_bank: A list of strings, or a word_loader.IndexedWordBank.
+    
+    Returns:
+        A string of hexadecimal digits.
+    """
+    
+    word_bank_hash = hashlib.sha1()
+    for word in word_bank:
+        word_bank_hash.update(word.encode("utf-8"))
+        word_bank_hash.update(b"\n")
+    
+    return word_bank_hash.hexdigest()
+
+def get_file_format(path):
+    """
+    Picks the format of a solution file from the extension of its path.
+    
+    Args:
+        path: The path of the solution file.
+    
+    Returns:
+        FORMAT_JSONL if the path ends in .jsonl, and FORMAT_BINARY otherwise.
+    """
+    
+    if path.lower().endswith(".jsonl"):
+        return FORMAT_JSONL
+    return FORMAT_BINARY
+
+class SolutionSink(object):
+    """
+    Somewhere solutions are handed as a search finds them. A sink only needs
+    an append method taking a solution, so a plain list is a sink that keeps
+    every solution in memory; this class adds closing, and using the sink in a
+    with statement, for sinks that hold on to a file or other resource.
+    """
+    
+    def append(self, solution):
+        """
+        Takes a solution found by the search. The solution may be changed by
+        the search once this returns, so it must be copied to be kept.
+        
+        Args:
+            solution: A dictionary mapping every line id in the puzzle to a
+                      word from the word bank.
+        """
+        
+        raise NotImplementedError
+    
+    def close(self):
+        """
+        Finishes writing any solutions that have not been written yet, and
+        frees the resources of the sink.
+        """
+        
+        pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class SolutionFileSink(SolutionSink):
+    """
+    A sink that appends each solution to a file as it is found, rather than
+    holding it in memory, so a search keeps using the same memory however many
+    solutions it finds, and a crash loses no more than the last few of them.
+    
+    A solution is stored as the positions, in the word bank, of the words at
+    each line, ordered by line id. The file starts with a header recording the
+    line ids and a hash of the word bank, so it can be read back with
+    SolutionFile given the same word bank.
+    
+    Attributes:
+        path: The path of the solution file.
+        file_format: The format of the file, which is one of FORMATS.
+        line_ids: The sorted ids of the lines of the puzzle.
+        count: The number of solutions written so far.
+    """
+    
+    def __init__(self, path, puzzle, word_bank, file_format=None):
+        """
+        Args:
+            path: The path of the solution file, which is overwritten if it
+                  exists.
+            puzzle: The crossword_tools.Puzzle, or a
+                    crossword_tools.CompiledPuzzle made from one, whose
+                    solutions are being written.
+            word_bank: The list of strings, or word_loader.IndexedWordBank, the
+                       puzzle is being solved with.
+            file_format: An optional format to write the file in, which is one
+                         of FORMATS. If it is not provided, it is picked from
+                         the extension of path by get_file_format.
+        
+        Raises:
+            ValueError: If file_format is not one of FORMATS.
+        """
+        
+        if file_format is None:
+            file_format = get_file_format(path)
+        if file_format not in FORMATS:
+            raise ValueError("Unknown solution file format: {}".format(
+                file_format))
+        
+        self.path = path
+        self.file_format = file_format
+        self.line_ids = sorted(solver.compile_puzzle(puzzle).line_ids)
+        self.count = 0
+        
+        # A word kept more than once in a list word bank is stored as its
+        # first copy, which reads back as the same word.
+        self._word_ids = {}
+        for word_id, word in enumerate(word_bank):
+            self._word_ids.setdefault(word, word_id)
+        self._record = struct.Struct(_WORD_ID_FORMAT.format(
+            len(self.line_ids)))
+        
+        header = {
+            "format": file_format,
+            "line_ids": self.line_ids,
+            "word_count": len(word_bank),
+            "word_bank_hash": hash_word_bank(word_bank),
+        }
+        if file_format == FORMAT_BINARY:
+            self._file = open(path, "wb")
+            header = json.dumps(header).encode("utf-8")
+            self._file.write(SOLUTION_MAGIC)
+            self._file.write(_HEADER_SIZE.pack(len(header)))
+            self._file.write(header)
+        else:
+            self._file = open(path, "w", encoding="utf-8")
+            self._file.write(json.dumps(header) + "\n")
+        self._file.flush()
+    
+    def append(self, solution):
+        """
+        Writes a solution to the end of the file.
+        
+        Args:
+            solution: A dictionary mapping every line id in the puzzle to a
+                      word from the word bank.
+        """
+        
+        word_ids = [self._word_ids[solution[line_id]]
+                    for line_id in self.line_ids]
+        if self.file_format == FORMAT_BINARY:
+            self._file.write(self._record.pack(*word_ids))
+        else:
+            self._file.write(json.dumps(word_ids, separators=(",", ":")) +
+                             "\n")
+        
+        self.count = self.count + 1
+        if self.count % FLUSH_INTERVAL == 0:
+            self._file.flush()
+    
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+class SolutionFile(object):
+    """
+    A solution file written by SolutionFileSink, opened to be read back. The
+    solutions can be iterated over, or read a page at a time. Solutions are
+    only read as they are asked for, and a solution that was cut off by a
+    crash while it was being written is left out. Reads share the position in
+    the file, so only one iteration over it should be under way at a time.
+    
+    Attributes:
+        path: The path of the solution file.
+        file_format: The format of the file, which is one of FORMATS.
+        line_ids: The sorted ids of the lines of the puzzle.
+    """
+    
+    def __init__(self, path, word_bank=None):
+        """
+        Args:
+            path: The path of the solution file.
+            word_bank: The list of strings, or word_loader.IndexedWordBank, the
+                       file was written with. If it is provided, solutions are
+                       read as dictionaries mapping every line id to a word,
+                       and otherwise as lists of the positions of the words in
+                       the word bank, ordered by line id.
+        
+        Raises:
+            ValueError: If the file is not a solution file, or was written
+                        with another word bank.
+        """
+        
+        self.path = path
+        self._file = open(path, "rb")
+        if self._file.read(len(SOLUTION_MAGIC)) == SOLUTION_MAGIC:
+            header_size, = _HEADER_SIZE.unpack(
+                self._file.read(_HEADER_SIZE.size))
+            header = json.loads(self._file.read(header_size).decode("utf-8"))
+        else:
+            self._file.seek(0)
+            try:
+                header = json.loads(self._file.readline().decode("utf-8"))
+            except ValueError:
+                header = None
+        
+        if not isinstance(header, dict) or header.get("format") not in FORMATS:
+            self._file.close()
+            raise ValueError("Not a solution file: {}".format(path))
+        
+        self.file_format = header["format"]
+        self.line_ids = header["line_ids"]
+        self._data_offset = self._file.tell()
+        self._record = struct.Struct(_WORD_ID_FORMAT.format(
+            len(self.line_ids)))
+        
+        self._words = None
+        if word_bank is not None:
+            if (len(word_bank) != header["word_count"] or
+                    hash_word_bank(word_bank) != header["word_bank_hash"]):
+                self._file.close()
+                raise ValueError(
+                    "The solution file {} was written with another word "
+                    "bank".format(path))
+            self._words = list(word_bank)
+    
+    def __len__(self):
+        if self.file_format == FORMAT_BINARY:
+            data_size = os.fstat(self._file.fileno()).st_size - \
+                self._data_offset
+            return data_size // self._record.size
+        return sum(1 for _ in self._iter_word_ids())
+    
+    def __iter__(self):
+        return self._iter_solutions(self._iter_word_ids())
+    
+    def page(self, start, count):
+        """
+        Reads a page of solutions. Binary files go straight to the first
+        solution of the page, and JSON lines files are read up to it.
+        
+        Args:
+            start: The number of the first solution of the page, starting at 0.
+            count: The most solutions the page holds.
+        
+        Returns:
+            A list of the solutions on the page, which is shorter than count if
+            the file ends before the page does.
+        """
+        
+        if self.file_format == FORMAT_BINARY:
+            word_ids = self._iter_word_ids(start, count)
+        else:
+            word_ids = self._iter_word_ids()
+            for _ in zip(range(start), word_ids):
+                pass
+            word_ids = (ids for ids, _ in zip(word_ids, range(count)))
+        
+        return list(self._iter_solutions(word_ids))
+    
+    def close(self):
+        self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def _iter_solutions(self, word_ids):
+        """
+        Turns lists of word positions read from the file into solutions.
+        
+        Args:
+            word_ids: An iterator of lists of the positions of the words in the
+                      word bank, ordered by line id.
+        
+        Yields:
+            A dictionary mapping every line id to a word if the file was opened
+            with its word bank, and otherwise each list of word_ids.
+        """
+        
+        for ids in word_ids:
+            if self._words is None:
+                yield ids
+            else:
+                yield {line_id: self._words[word_id]
+                       for line_id, word_id in zip(self.line_ids, ids)}
+    
+    def _iter_word_ids(self, start=0, count=None):
+        """
+        Reads the positions of the words of solutions from the file.
+        
+        Args:
+            start: The number of the first solution to read, which must be 0
+                   for JSON lines files.
+            count: An optional most solutions to read.
+        
+        Yields:
+            A list of the positions of the words in the word bank of every
+            solution, ordered by line id.
+        """
+        
+        if self.file_format == FORMAT_BINARY:
+            self._file.seek(self._data_offset + start * self._record.size)
+            while count is None or count > 0:
+                record = self._file.read(self._record.size)
+                if len(record) < self._record.size:
+                    return
+                yield list(self._record.unpack(record))
+                if count is not None:
+                    count = count - 1
+        else:
+            self._file.seek(self._data_offset)
+            for line in self._file:
+                if not line.endswith(b"\n"):
+                    return
+                yield json.loads(line.decode("utf-8"))
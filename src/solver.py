@@ -1,23 +1,283 @@
+import bisect
+import collections
 import copy
+import crossword_tools
+import heapq
+import numpy_engine
+import time
+import word_loader
 
-def solve(puzzle, word_bank):
+_NO_WORDS = frozenset()
+_NO_LETTERS = {}
+
+# How many subproblems a parallel search tries to give each worker, so that
+# the workers that draw small subtrees can keep picking up more work while the
+# others finish their large ones.
+SUBPROBLEMS_PER_WORKER = 16
+
+# The number of words a search puts in lines between calls to the progress
+# function of its SearchStats.
+PROGRESS_INTERVAL = 10000
+
+# The number of words a search puts in lines between checks of the deadline 
+# and cancellation event of its SearchLimits, and the number of seconds a 
+# parallel search waits for its workers between checks.
+LIMIT_CHECK_INTERVAL = 256
+LIMIT_POLL_SECONDS = 0.05
+
+# The reasons a search can stop before it is finished. See SearchLimits.
+STOP_DEADLINE = "deadline"
+STOP_NODES = "nodes"
+STOP_CANCELLED = "cancelled"
+
+# The fewest lines a subproblem must have left for a TranspositionTable to
+# remember it, since the words of a single line are quicker to count than to
+# look up.
+TABLE_MIN_LINES = 2
+
+# The most solutions kept for each group of lines whose solutions are combined
+# with those of other groups. A group with more solutions than this is searched
+# again every time they are combined, rather than having them kept.
+COMPONENT_SOLUTIONS_KEPT = 4096
+
+# The search state of a worker process, set up once by _init_worker.
+_worker_search = None
+
+# The names of the rules for picking the next line to guess. See HEURISTICS.
+HEURISTIC_DOM = "dom"
+HEURISTIC_DOM_DEG = "dom/deg"
+HEURISTIC_DOM_WDEG = "dom/wdeg"
+DEFAULT_HEURISTIC = HEURISTIC_DOM
+
+# The ways of choosing between lines a heuristic rates equally: the first line
+# in the puzzle, or the line crossing the most other lines.
+TIE_BREAK_ORDER = "order"
+TIE_BREAK_INTERSECTIONS = "intersections"
+
+# The ways of keeping track of the words that can still fit at each line: sets
+# of word ids, or NumPy boolean masks over the words of each length. See
+# DOMAIN_STORES.
+ENGINE_PYTHON = "python"
+ENGINE_NUMPY = "numpy"
+DEFAULT_ENGINE = ENGINE_PYTHON
+
+def solve(puzzle, word_bank, propagate=False, workers=None, 
+          heuristic=DEFAULT_HEURISTIC, tie_break=TIE_BREAK_ORDER, 
+          backjump=False, max_nogoods=0, engine=DEFAULT_ENGINE, stats=None,
+          limits=None, sink=None, table_size=0):
     """
     Solves the provided crossword puzzle using words from the word bank.
     
     Args:
-        puzzle: A crossword_tools.Puzzle object.
-        word_bank: A list of strings.
+        puzzle: A crossword_tools.Puzzle object, or a CompiledPuzzle made from
+                one.
+        word_bank: A list of strings, or a word_loader.IndexedWordBank.
+        propagate: True if arc consistency should be enforced again after 
+                   every guess, rather than only once before the search.
+        heuristic: The name of the rule used to pick the next line to guess,
+                   which is one of the keys of HEURISTICS.
+        tie_break: How to choose between lines the heuristic rates equally,
+                   either TIE_BREAK_ORDER or TIE_BREAK_INTERSECTIONS.
+        backjump: True if a failed search branch should jump straight back to
+                  the latest guess to blame for it, rather than trying the next
+                  word of the line guessed just before.
+        max_nogoods: The number of failed sets of guesses to remember, so that
+                     other branches making the same guesses are cut short. 
+                     Remembering any turns on backjumping.
+        engine: The name of the way the words that can still fit at each line
+                are kept track of, which is one of the keys of DOMAIN_STORES.
+                Every engine finds the same solutions, though not always in
+                the same order.
+        workers: An optional number of processes to split the search across.
+                 The solutions found are the same as with a single process, 
+                 and their order is the same from one run to the next.
+        stats: An optional SearchStats object the search is counted in.
+        limits: An optional SearchLimits object that can stop the search 
+                before it is finished.
+        sink: An optional object with an append method, such as a 
+              solution_store.SolutionFileSink, that each solution is handed to
+              as it is found, rather than being kept in a list.
+        table_size: The number of finished subproblems to remember, so that
+                    the search can skip those other guesses leave again 
+                    without solutions. See TranspositionTable.
     
     Returns:
         A list of dictionaries, where each dictionary is a solution to the
         puzzle, mapping every line id in the puzzle to a word from the word 
-        bank. None is returned if a solution could not be found.
-        found.
+        bank. None is returned if a solution could not be found. If the limits
+        stopped the search, the solutions found before it stopped are returned
+        as a PartialSolutions list, even if there are none. If a sink is
+        provided, it is returned in place of the list, and whether the search
+        was stopped is told by the reason of the limits.
+    """
+    
+    puzzle = compile_puzzle(puzzle)
+    search_input = prepare_search(puzzle, word_bank)
+    if not search_input:
+        return None
+    
+    word_index, fitting_words = search_input
+    options = SearchOptions(propagate, heuristic, tie_break, backjump, 
+                            max_nogoods, engine, table_size)
+    solution_set = [] if sink is None else sink
+    
+    # Finally, we pass in the information we have generated to the 
+    # find_solutions function, which will modify solution_set to contain all of
+    # the solutions to the puzzle, so it can be returned to the user.
+    if workers and workers > 1:
+        find_solutions_in_parallel(puzzle, word_index, fitting_words, 
+                                   solution_set, workers, options, stats, 
+                                   limits)
+    else:
+        find_solutions(puzzle, word_index, fitting_words, solution_set, 
+                       options, stats, limits)
+    
+    if limits and limits.reason and sink is None:
+        return PartialSolutions(solution_set, limits.reason)
+    
+    return solution_set
+
+def iter_solutions(puzzle, word_bank, max_solutions=None, first_only=False,
+                   propagate=False, heuristic=DEFAULT_HEURISTIC, 
+                   tie_break=TIE_BREAK_ORDER, backjump=False, max_nogoods=0,
+                   engine=DEFAULT_ENGINE, stats=None, limits=None, 
+                   table_size=0):
+    """
+    Lazily solves the provided crossword puzzle using words from the word bank,
+    yielding each solution as soon as the search finds it. The search only goes
+    as far as the caller consumes, so stopping early also stops the search. 
+    Only the solution being yielded is held in memory, along with, for puzzles
+    made up of several groups of connected lines, up to 
+    COMPONENT_SOLUTIONS_KEPT solutions to each group but the largest.
+    
+    Args:
+        puzzle: A crossword_tools.Puzzle object, or a CompiledPuzzle made from
+                one.
+        word_bank: A list of strings, or a word_loader.IndexedWordBank.
+        max_solutions: An optional integer limit on the number of solutions
+                       yielded, after which the search stops.
+        first_only: True if the search should stop after the first solution,
+                    the same as setting max_solutions to 1.
+        propagate: True if arc consistency should be enforced again after 
+                   every guess, rather than only once before the search.
+        heuristic: The name of the rule used to pick the next line to guess,
+                   which is one of the keys of HEURISTICS.
+        tie_break: How to choose between lines the heuristic rates equally,
+                   either TIE_BREAK_ORDER or TIE_BREAK_INTERSECTIONS.
+        backjump: True if a failed search branch should jump straight back to
+                  the latest guess to blame for it, rather than trying the next
+                  word of the line guessed just before.
+        max_nogoods: The number of failed sets of guesses to remember, so that
+                     other branches making the same guesses are cut short. 
+                     Remembering any turns on backjumping.
+        engine: The name of the way the words that can still fit at each line
+                are kept track of, which is one of the keys of DOMAIN_STORES.
+                Every engine finds the same solutions, though not always in
+                the same order.
+        stats: An optional SearchStats object the search is counted in.
+        limits: An optional SearchLimits object that can stop the search 
+                before it is finished. If it does, no more solutions are 
+                yielded, and its reason is set.
+        table_size: The number of finished subproblems to remember, so that
+                    the search can skip those other guesses leave again 
+                    without solutions. See TranspositionTable.
+    
+    Yields:
+        Dictionaries mapping every line id in the puzzle to a word from the word
+        bank, in the same order solve would return them. Each dictionary is a
+        new object the caller is free to keep or modify.
+    """
+    
+    if first_only:
+        max_solutions = 1
+    if max_solutions is not None and max_solutions <= 0:
+        return
+    
+    puzzle = compile_puzzle(puzzle)
+    search_input = prepare_search(puzzle, word_bank)
+    if not search_input:
+        return
+    
+    word_index, fitting_words = search_input
+    options = SearchOptions(propagate, heuristic, tie_break, backjump, 
+                            max_nogoods, engine, table_size)
+    num_solutions = 0
+    for solution in generate_solutions(puzzle, word_index, fitting_words, 
+                                       options, stats, limits):
+        yield copy.copy(solution)
+        num_solutions = num_solutions + 1
+        if num_solutions == max_solutions:
+            return
+
+def compile_puzzle(puzzle):
+    """
+    Gets the form of a puzzle the search runs on.
+    
+    Args:
+        puzzle: A crossword_tools.Puzzle or crossword_tools.CompiledPuzzle 
+                object.
+    
+    Returns:
+        A crossword_tools.CompiledPuzzle object, which is puzzle itself if it
+        is already compiled.
+    """
+    
+    if isinstance(puzzle, crossword_tools.CompiledPuzzle):
+        return puzzle
+    return crossword_tools.CompiledPuzzle(puzzle)
+
+def prepare_search(puzzle, word_bank):
+    """
+    Builds the word index and the initial domain of every line that a search
+    over the provided puzzle starts from.
+    
+    Args:
+        puzzle: A crossword_tools.CompiledPuzzle object.
+        word_bank: A list of strings, or a word_loader.IndexedWordBank, of
+                   which only the words with the lengths of the lines in the
+                   puzzle are read.
+    
+    Returns:
+        A tuple of the WordIndex built from word_bank, and a list mapping every
+        line id in the puzzle to a set of the ids of the words that are the
+        right length to fit in that line. None is returned if the puzzle has 
+        no lines, or if some line has no words that fit it.
+    """
+    
+    word_index = index_word_bank(word_bank, set(puzzle.lengths))
+    fitting_words = fit_words(puzzle, word_index)
+    if fitting_words is None:
+        return None
+    
+    return word_index, fitting_words
+
+def index_word_bank(word_bank, lengths=None):
+    """
+    Builds the index of a word bank that searches look words up in. A single
+    index can be shared by the searches over any number of puzzles.
+    
+    Args:
+        word_bank: A list of strings, or a word_loader.IndexedWordBank.
+        lengths: An optional collection of the integer lengths of the words 
+                 that will be looked up. If it is provided, the words with 
+                 other lengths may be left out of the index.
+    
+    Returns:
+        A WordIndex.
     """
     
-    fitting_words = {}
     word_by_length = {}
-    solution_set = []
+    
+    if isinstance(word_bank, word_loader.IndexedWordBank):
+        # A loaded word bank is already bucketed by length and indexed, so we
+        # only take the lengths we need out of it
+        if lengths is None:
+            lengths = word_bank.lengths()
+        for length in sorted(lengths):
+            words = word_bank.words_of_length(length)
+            if words:
+                word_by_length[length] = words
+        return WordIndex(word_by_length, word_bank.letters)
     
     # First, we make a dictionary mapping a length to a list of words from the
     # word bank with that length
@@ -27,27 +287,41 @@ def solve(puzzle, word_bank):
             word_by_length[length] = []
         word_by_length[length].append(word)
     
-    # Next, we find the length of each line and take the list of words that can
-    # fit there from the word_by_length dictionary
-    for line_id, line in puzzle.lines.items():
-        if line.length not in word_by_length:
-            return None
-        fitting_words[line_id] = copy.copy(word_by_length[line.length])
-        if fitting_words[line_id] == None:
+    # Then we index those words by the letters at each of their positions, so
+    # that crossing lines can be filtered with set intersections
+    return WordIndex(word_by_length)
+
+def fit_words(puzzle, word_index):
+    """
+    Finds the initial domain of every line of a puzzle.
+    
+    Args:
+        puzzle: A crossword_tools.CompiledPuzzle object.
+        word_index: A WordIndex holding the words of every length the lines in
+                    the puzzle have.
+    
+    Returns:
+        A list mapping every line id in the puzzle to a set of the ids of the 
+        words that are the right length to fit in that line, or None if the 
+        puzzle has no lines, or if some line has no words that fit it.
+    """
+    
+    # We find the length of each line and take the set of ids of the words
+    # that can fit there from the word index
+    fitting_words = []
+    for length in puzzle.lengths:
+        ids = word_index.ids_of_length(length)
+        if not ids:
             return None
+        fitting_words.append(set(ids))
     
-    keylist = list(puzzle.lines.keys())
-    if not keylist:
+    if not fitting_words:
         return None
     
-    # Finally, we pass in the information we have generated to the 
-    # find_solutions function, which will modify solution_set to contain all of
-    # the solutions to the puzzle, so it can be returned to the user.
-    find_solutions(puzzle, fitting_words, solution_set)
-    
-    return solution_set
+    return fitting_words
 
-def find_solutions(puzzle, fitting_words, solution_set):
+def find_solutions(puzzle, word_index, fitting_words, solution_set, 
+                   options=None, stats=None, limits=None):
     """
     Fills solution_set with all of the possible solutions to the puzzle, based
     on the words from fitting_words, where each solution is a dictionary mapping
@@ -55,119 +329,2687 @@ def find_solutions(puzzle, fitting_words, solution_set):
     
     Args:
         puzzle: The puzzle being solved.
-        fitting_words: A dictionary mapping every line id in puzzle to a list of
-                       words that are the right size to fit in that line.
+        word_index: The WordIndex built from the word bank.
+        fitting_words: A list mapping every line id in puzzle to a set of
+                       the ids, in word_index, of the words that are the right
+                       size to fit in that line.
+        solution_set: An empty list that will be modified to contain multiple
+                      dictionaries, where each dictionary is a solution to the
+                      puzzle, mapping every line id to a word from 
+                      fitting_words. Any other object with an append method
+                      can be used instead, to be handed each solution as it
+                      is found.
+        options: An optional SearchOptions object holding the settings of the
+                 search.
+        stats: An optional SearchStats object the search is counted in.
+        limits: An optional SearchLimits object that can stop the search 
+                before it is finished. If it does, solution_set holds the 
+                solutions found before it stopped, and its reason is set.
+    """
+    
+    for solution in generate_solutions(puzzle, word_index, fitting_words, 
+                                       options, stats, limits):
+        solution_set.append(copy.copy(solution))
+
+def find_solutions_in_parallel(puzzle, word_index, fitting_words, 
+                               solution_set, workers, options=None, 
+                               stats=None, limits=None):
+    """
+    Fills solution_set with all of the possible solutions to the puzzle, like
+    find_solutions, but splits the search tree into subproblems that are solved
+    by a pool of worker processes. The subproblems are handed out a few at a 
+    time as workers become free, and their solutions are added to solution_set
+    in the order of the subproblems, regardless of which finishes first.
+    
+    Args:
+        puzzle: The puzzle being solved.
+        word_index: The WordIndex built from the word bank.
+        fitting_words: A list mapping every line id in puzzle to a set of
+                       the ids, in word_index, of the words that are the right
+                       size to fit in that line.
         solution_set: An empty list that will be modified to contain multiple
                       dictionaries, where each dictionary is a solution to the
                       puzzle, mapping every line id to a word from 
-                      fitting_words.
+                      fitting_words. Any other object with an append method
+                      can be used instead, to be handed each solution as its
+                      subproblem comes back.
+        workers: The number of worker processes to use.
+        options: An optional SearchOptions object holding the settings of the
+                 search.
+        stats: An optional SearchStats object the search is counted in. The
+               workers count their subproblems separately, and their counts
+               are added to it as each subproblem's solutions come back.
+        limits: An optional SearchLimits object that can stop the search 
+                before it is finished. The workers share its node budget, 
+                taking words from it a few at a time, so that together they
+                put no more words in lines than it allows, and their words are
+                added up as their subproblems come back. Once a limit is hit,
+                the workers stop at their next check, and solution_set holds
+                the solutions of the subproblems before the one that was 
+                stopped, along with those the stopped one found.
+    """
+    
+    domains = DomainStore(puzzle, word_index, fitting_words)
+    if not enforce_arc_consistency(puzzle, domains):
+        return
+    
+    target_subproblems = workers * SUBPROBLEMS_PER_WORKER
+    subproblems = split_search(puzzle, word_index, domains, target_subproblems)
+    if not subproblems:
+        return
+    
+    # The workers start from the arc consistent domains, so that none of them
+    # has to repeat the work done on the full puzzle.
+    consistent_words = domains.copy_domains()
+    chunk_size = max(1, len(subproblems) // target_subproblems)
+    chunks = [subproblems[i:i + chunk_size] 
+              for i in range(0, len(subproblems), chunk_size)]
+    time_depths = stats.time_depths if stats else None
+    
+    # Only parallel searches need the process pool and its events, so they are
+    # imported here rather than slowing down the start of every process that
+    # solves.
+    import concurrent.futures
+    import multiprocessing
+    
+    # The workers cannot see the caller's cancellation event, so they are 
+    # given one of their own, which is set once any limit is hit, and they
+    # share what is left of the node budget.
+    stop_event = None
+    node_budget = None
+    worker_limits = None
+    if limits:
+        stop_event = multiprocessing.Event()
+        if limits.max_nodes is not None:
+            node_budget = multiprocessing.Value(
+                "q", max(0, limits.max_nodes - limits.nodes))
+        worker_limits = (limits.deadline, node_budget, stop_event)
+    
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, 
+            initargs=(puzzle, word_index, consistent_words, options,
+                      time_depths, worker_limits)) as executor:
+        futures = [executor.submit(_solve_subproblems, chunk) 
+                   for chunk in chunks]
+        for i, future in enumerate(futures):
+            if limits:
+                while not future.done():
+                    concurrent.futures.wait([future], LIMIT_POLL_SECONDS)
+                    if limits.poll():
+                        stop_event.set()
+            
+            for solutions, subproblem_stats, num_nodes, reason in (
+                    future.result()):
+                for solution in solutions:
+                    solution_set.append(solution)
+                if stats:
+                    stats.merge(subproblem_stats)
+                if limits:
+                    limits.nodes = limits.nodes + num_nodes
+                    if reason and not limits.reason:
+                        limits.reason = reason
+            
+            if limits and (limits.reason or 
+                           (i + 1 < len(futures) and limits.poll())):
+                stop_event.set()
+                for unfinished_future in futures[i + 1:]:
+                    unfinished_future.cancel()
+                break
+    
+    # The subproblems whose solutions were not used still put words in lines,
+    # so the words taken from the budget are counted rather than only those
+    # of the subproblems that came back.
+    if node_budget is not None:
+        limits.nodes = max(limits.nodes, 
+                           limits.max_nodes - node_budget.value)
+
+def split_search(puzzle, word_index, domains, min_subproblems, max_depth=2):
+    """
+    Splits the search over a puzzle into subproblems, each of which fixes the
+    words in the first few lines the search would guess. Every solution to the
+    puzzle is a solution to exactly one of the subproblems.
+    
+    Args:
+        puzzle: The puzzle being solved.
+        word_index: The WordIndex the ids in domains refer to.
+        domains: An arc consistent DomainStore holding the ids of the words that
+                 can fit at each line. It is left as it was found.
+        min_subproblems: The number of subproblems to aim for. The split goes
+                         one level deeper into the search tree each time there
+                         are fewer subproblems than this.
+        max_depth: The maximum number of lines a subproblem fixes.
+    
+    Returns:
+        A list of dictionaries, each mapping the ids of the lines a subproblem
+        fixes to the id of the word it fixes them to. Subproblems that can be
+        seen to have no solutions are left out, and the list is in the same
+        order on every call.
     """
     
-    initial_id = get_optimal_guess_line(list(puzzle.lines.keys()), fitting_words)
+    subproblems = [{}]
+    for depth in range(max_depth):
+        if len(subproblems) >= min_subproblems:
+            break
         
-    current_solution = {}
-    for possible_word in fitting_words[initial_id]:
-        guess_word(puzzle, initial_id, possible_word, fitting_words, 
-                   current_solution, solution_set)
+        split_subproblems = []
+        for fixed_words in subproblems:
+            mark = domains.mark()
+            
+            # Apply the subproblem's fixed words, skipping subproblems that use 
+            # more copies of a word than the word bank has, or that leave some 
+            # line without any words.
+            fixed_counts = collections.Counter(fixed_words.values())
+            if any(count > word_index.copies[word_id] 
+                   for word_id, count in fixed_counts.items()):
+                continue
+            for line_id, word_id in fixed_words.items():
+                domains.keep_word(line_id, word_id)
+            if not enforce_arc_consistency(puzzle, domains, 
+                                           list(fixed_words.keys())):
+                domains.undo(mark)
+                continue
+            
+            open_ids = [x for x in range(len(puzzle)) if x not in fixed_words]
+            if not open_ids:
+                split_subproblems.append(fixed_words)
+            else:
+                target_id = get_optimal_guess_line(open_ids, domains)
+                for word_id in sorted(domains.words(target_id)):
+                    split_fixed_words = dict(fixed_words)
+                    split_fixed_words[target_id] = word_id
+                    split_subproblems.append(split_fixed_words)
+            
+            domains.undo(mark)
+        
+        subproblems = split_subproblems
+    
+    return subproblems
+
+def _init_worker(puzzle, word_index, fitting_words, options, time_depths,
+                 worker_limits):
+    """
+    Stores the state shared by every subproblem in a worker process, so that it
+    is only sent to the process once. If time_depths is None, the subproblems
+    are not counted, and otherwise it is passed to their SearchStats. If 
+    worker_limits is not None, it is a tuple of the deadline, shared node 
+    budget and cancellation event every subproblem's SearchLimits is made 
+    with.
+    """
+    
+    global _worker_search
+    _worker_search = (puzzle, word_index, fitting_words, options, time_depths,
+                      worker_limits)
+
+def _solve_subproblems(subproblems):
+    """
+    Solves a list of subproblems in a worker process, one after another, 
+    stopping after the first one a limit stops.
+    
+    Args:
+        subproblems: A list of subproblems made by split_search.
+    
+    Returns:
+        A list of what _solve_subproblem returned for each subproblem that was
+        solved.
+    """
+    
+    results = []
+    for fixed_words in subproblems:
+        results.append(_solve_subproblem(fixed_words))
+        if results[-1][3]:
+            break
+    
+    return results
+
+def _solve_subproblem(fixed_words):
+    """
+    Finds all of the solutions to a subproblem made by split_search, in a
+    worker process set up by _init_worker.
+    
+    Args:
+        fixed_words: A dictionary mapping line ids to the ids of the words the
+                     subproblem fixes them to.
+    
+    Returns:
+        A tuple of a list of the solutions to the subproblem, the SearchStats 
+        of its search, or None if the search is not being counted, the number
+        of words its search put in lines, or 0 if it has no limits, and the 
+        reason its limits stopped it, or None if they did not.
+    """
+    
+    (puzzle, word_index, fitting_words, options, time_depths, 
+     worker_limits) = _worker_search
+    subproblem_words = list(fitting_words)
+    for line_id, word_id in fixed_words.items():
+        subproblem_words[line_id] = {word_id}
+    
+    stats = None
+    if time_depths is not None:
+        stats = SearchStats(time_depths)
+    limits = None
+    if worker_limits is not None:
+        deadline, node_budget, stop_event = worker_limits
+        limits = SearchLimits(cancel_event=stop_event, deadline=deadline,
+                              node_budget=node_budget)
+    
+    solutions = []
+    find_solutions(puzzle, word_index, subproblem_words, solutions, options,
+                   stats, limits)
+    if not limits:
+        return solutions, stats, 0, None
+    
+    limits.return_nodes()
+    return solutions, stats, limits.nodes, limits.reason
 
-def guess_word(puzzle, line_id, guess, fitting_words, current_solution, 
-               solution_set):
+def generate_solutions(puzzle, word_index, fitting_words, options=None,
+                       stats=None, limits=None):
     """
-    Recursively attempts to fill in the lines not yet assigned in
-    current_solution with all possible words, as described by fitting_words, 
-    starting by attempting to fill the line with ID line_id with the word stored 
-    at guess. When current_solution is filled, meaning a solution has been 
-    found, the solution is added to solution_set.
+    Searches for all of the possible solutions to the puzzle, based on the words
+    from fitting_words, yielding each one as it is found.
     
     Args:
         puzzle: The puzzle being solved.
-        line_id: The id (as stored in puzzle) of the line we are trying to fit
-                 a word into.
-        guess: The word we are trying to insert at line_id
-        fitting_words: a dictionary of arrays, where the dictionary has a key
-                       for every line id in puzzle, and the key maps to a list
-                       of all the words that could fit at that line, given the
-                       words that have already been filled in current_solution
-        current_solution: A dictionary of strings, where the dictionary has a 
-                          key for every line id in puzzle, and the key maps to
-                          the word that we are putting at that line in an
-                          attempt to find a solution
-        solution_set: A list containing all of the solutions that have been
-                      found so far, where each solution is a dictionary mapping
-                      every line id in puzzle to a word that goes in that line
-    """
-    
-    current_solution[line_id] = guess
-    guessed_line = puzzle.lines[line_id]
-    # We copy new_fitting_words so that we can remove words from it without
-    # modifying the fitting_words list in other solution branches.
-    new_fitting_words = copy.deepcopy(fitting_words)
-    
-    # Remove all words from the new_fitting_words list that don't fit with the
-    # new guess.
-    for intersect in guessed_line.intersection_points:
-        # If the spot is filled, don't bother doing any calculations
-        if intersect.second_id in current_solution:
+        word_index: The WordIndex built from the word bank.
+        fitting_words: A list mapping every line id in puzzle to a set of
+                       the ids, in word_index, of the words that are the right
+                       size to fit in that line.
+        options: An optional SearchOptions object holding the settings of the
+                 search.
+        stats: An optional SearchStats object the search is counted in.
+        limits: An optional SearchLimits object that can stop the search 
+                before it is finished. If it does, the search ends as though
+                there were no more solutions, and its reason is set.
+    
+    Yields:
+        A dictionary mapping every line id in puzzle to a word from 
+        fitting_words. The same dictionary is yielded every time and keeps
+        changing as the search goes on, so it must be copied to be kept.
+    """
+    
+    components = find_components(puzzle)
+    if len(components) > 1:
+        solutions = generate_component_solutions(puzzle, components, 
+                                                 word_index, fitting_words, 
+                                                 options, stats, limits)
+    else:
+        solutions = search_solutions(puzzle, word_index, fitting_words, 
+                                     options, stats, limits)
+    
+    try:
+        if not stats:
+            yield from solutions
+            return
+        
+        for solution in solutions:
+            stats.solutions += 1
+            stats.pause()
+            yield solution
+            stats.resume()
+    except SearchStopped:
+        return
+
+def search_solutions(puzzle, word_index, fitting_words, options=None,
+                     stats=None, limits=None):
+    """
+    Searches for all of the possible solutions to a puzzle whose lines are all
+    connected to each other, like generate_solutions, but without counting
+    the solutions in stats or splitting the puzzle into groups of lines.
+    
+    Args:
+        puzzle: The puzzle being solved.
+        word_index: The WordIndex built from the word bank.
+        fitting_words: A list mapping every line id in puzzle to a set of
+                       the ids, in word_index, of the words that are the right
+                       size to fit in that line.
+        options: An optional SearchOptions object holding the settings of the
+                 search.
+        stats: An optional SearchStats object the search is counted in.
+        limits: An optional SearchLimits object the search is held to.
+    
+    Yields:
+        A dictionary mapping every line id in puzzle to a word from 
+        fitting_words. The same dictionary is yielded every time and keeps
+        changing as the search goes on, so it must be copied to be kept.
+    
+    Raises:
+        SearchStopped: The limits stopped the search.
+    """
+    
+    state = SearchState(puzzle, word_index, fitting_words, options, stats, 
+                        limits)
+    
+    # Words that have no partner on some crossing line can never be part of a
+    # solution, so we get rid of them once here rather than rediscovering it in
+    # every branch of the search.
+    if not enforce_initial_consistency(state):
+        return
+    
+    initial_id = state.line_queue.pop()
+    for word_id in state.domains.words(initial_id):
+        conflict = yield from guess_word(state, initial_id, word_id)
+        if conflict is not None and initial_id not in conflict:
+            break
+
+def count_solutions(puzzle, word_bank, propagate=False, 
+                    heuristic=DEFAULT_HEURISTIC, tie_break=TIE_BREAK_ORDER,
+                    backjump=False, max_nogoods=0, engine=DEFAULT_ENGINE,
+                    stats=None, table_size=0):
+    """
+    Counts the solutions to the provided crossword puzzle using words from the
+    word bank. This walks the same search as solve, but never builds the
+    solutions, so its memory use does not grow with the number of solutions.
+    
+    Args:
+        puzzle: A crossword_tools.Puzzle object, or a CompiledPuzzle made from
+                one.
+        word_bank: A list of strings, or a word_loader.IndexedWordBank.
+        propagate: True if arc consistency should be enforced again after 
+                   every guess, rather than only once before the search.
+        heuristic: The name of the rule used to pick the next line to guess,
+                   which is one of the keys of HEURISTICS.
+        tie_break: How to choose between lines the heuristic rates equally,
+                   either TIE_BREAK_ORDER or TIE_BREAK_INTERSECTIONS.
+        backjump: True if a failed search branch should jump straight back to
+                  the latest guess to blame for it, rather than trying the next
+                  word of the line guessed just before.
+        max_nogoods: The number of failed sets of guesses to remember, so that
+                     other branches making the same guesses are cut short. 
+                     Remembering any turns on backjumping.
+        engine: The name of the way the words that can still fit at each line
+                are kept track of, which is one of the keys of DOMAIN_STORES.
+        stats: An optional SearchStats object the search is counted in.
+        table_size: The number of finished subproblems to remember along with
+                    their numbers of solutions, so that the search does not 
+                    count them again when other guesses leave them. See 
+                    TranspositionTable.
+    
+    Returns:
+        The integer number of solutions, which is the length of the list solve
+        would return, or 0 where solve would return None.
+    """
+    
+    puzzle = compile_puzzle(puzzle)
+    search_input = prepare_search(puzzle, word_bank)
+    if not search_input:
+        return 0
+    
+    word_index, fitting_words = search_input
+    options = SearchOptions(propagate, heuristic, tie_break, backjump, 
+                            max_nogoods, engine, table_size)
+    return tally_solutions(puzzle, word_index, fitting_words, options, stats)
+
+def tally_solutions(puzzle, word_index, fitting_words, options=None, 
+                    stats=None):
+    """
+    Counts all of the possible solutions to the puzzle, based on the words from
+    fitting_words, without building any of them.
+    
+    Args:
+        puzzle: The puzzle being solved.
+        word_index: The WordIndex built from the word bank.
+        fitting_words: A list mapping every line id in puzzle to a set of
+                       the ids, in word_index, of the words that are the right
+                       size to fit in that line.
+        options: An optional SearchOptions object holding the settings of the
+                 search.
+        stats: An optional SearchStats object the search is counted in. The
+               solutions are only added to it once they have all been counted.
+    
+    Returns:
+        The integer number of solutions.
+    """
+    
+    components = find_components(puzzle)
+    if len(components) > 1:
+        num_solutions = tally_component_solutions(puzzle, components, 
+                                                  word_index, fitting_words, 
+                                                  options, stats)
+    else:
+        num_solutions = search_tally(puzzle, word_index, fitting_words, 
+                                     options, stats)
+    
+    if stats:
+        stats.solutions += num_solutions
+    
+    return num_solutions
+
+def search_tally(puzzle, word_index, fitting_words, options=None, stats=None):
+    """
+    Counts all of the possible solutions to a puzzle whose lines are all
+    connected to each other, like tally_solutions, but without counting the
+    solutions in stats or splitting the puzzle into groups of lines.
+    
+    Args:
+        puzzle: The puzzle being solved.
+        word_index: The WordIndex built from the word bank.
+        fitting_words: A list mapping every line id in puzzle to a set of
+                       the ids, in word_index, of the words that are the right
+                       size to fit in that line.
+        options: An optional SearchOptions object holding the settings of the
+                 search.
+        stats: An optional SearchStats object the search is counted in.
+    
+    Returns:
+        The integer number of solutions.
+    """
+    
+    state = SearchState(puzzle, word_index, fitting_words, options, stats)
+    if not enforce_initial_consistency(state):
+        return 0
+    
+    initial_id = state.line_queue.pop()
+    num_solutions = 0
+    for word_id in state.domains.words(initial_id):
+        word_solutions, conflict = count_guesses(state, initial_id, word_id)
+        num_solutions = num_solutions + word_solutions
+        if conflict is not None and initial_id not in conflict:
+            break
+    
+    return num_solutions
+
+def find_components(puzzle):
+    """
+    Splits the lines of a puzzle into groups of lines that are connected to
+    each other through their intersection points. The words in one group do 
+    not constrain the words in another, other than by not being reusable.
+    
+    Args:
+        puzzle: A crossword_tools.CompiledPuzzle object.
+    
+    Returns:
+        A list of lists of line ids, with one list per group. The groups are
+        ordered by their lowest line id, and the ids in each group are in 
+        increasing order.
+    """
+    
+    component_by_id = {}
+    components = []
+    for start_id in range(len(puzzle)):
+        if start_id in component_by_id:
             continue
         
-        second_id_fitting_words = copy.copy(new_fitting_words[intersect.second_id])
-        for word in second_id_fitting_words:
-            if not intersect.words_fit(guess, word):
-                new_fitting_words[intersect.second_id].remove(word)
-                
-        if not new_fitting_words[intersect.second_id]:
-            del current_solution[line_id]
+        component_number = len(components)
+        component_by_id[start_id] = component_number
+        unvisited_ids = [start_id]
+        while unvisited_ids:
+            line_id = unvisited_ids.pop()
+            for second_id, unused, unused in puzzle.crossings[line_id]:
+                if second_id not in component_by_id:
+                    component_by_id[second_id] = component_number
+                    unvisited_ids.append(second_id)
+        components.append([])
+    
+    for line_id in range(len(puzzle)):
+        components[component_by_id[line_id]].append(line_id)
+    
+    return components
+
+def split_components(puzzle, components, fitting_words):
+    """
+    Makes a separate puzzle out of each of the provided groups of lines.
+    
+    Args:
+        puzzle: The puzzle being solved.
+        components: A list of lists of line ids, as made by find_components.
+        fitting_words: A list mapping every line id in puzzle to a set of
+                       the ids of the words that are the right size to fit in 
+                       that line.
+    
+    Returns:
+        A list holding, for each group, a tuple of a 
+        crossword_tools.CompiledPuzzle object of the group's lines, and the 
+        part of fitting_words for those lines.
+    """
+    
+    component_puzzles = []
+    for line_ids in components:
+        component_words = [fitting_words[line_id] for line_id in line_ids]
+        component_puzzles.append((puzzle.subpuzzle(line_ids), component_words))
+    
+    return component_puzzles
+
+def generate_component_solutions(puzzle, components, word_index, fitting_words,
+                                 options=None, stats=None, limits=None):
+    """
+    Searches for all of the possible solutions to a puzzle made up of several
+    groups of connected lines by solving each group on its own, and yielding
+    every combination of the groups' solutions that does not use a word twice.
+    
+    Every group is searched lazily, alongside the combinations, with the 
+    largest group outermost so that it is only searched once. The solutions of
+    each other group are kept as they are found, up to 
+    COMPONENT_SOLUTIONS_KEPT of them, and the group is searched again for 
+    every combination of the groups before it if it has more. Each other group
+    is searched up to its first solution before the largest is searched, so 
+    that a group without any solutions ends the search before it starts. A 
+    word can be used by as many groups as there are copies of it in the word
+    bank.
+    
+    Args:
+        puzzle: The puzzle being solved.
+        components: A list of lists of line ids, as made by find_components.
+        word_index: The WordIndex built from the word bank.
+        fitting_words: A list mapping every line id in puzzle to a set of
+                       the ids, in word_index, of the words that are the right
+                       size to fit in that line.
+        options: An optional SearchOptions object holding the settings of the
+                 search.
+        stats: An optional SearchStats object the search of every group is
+               counted in.
+        limits: An optional SearchLimits object the search of every group is
+                held to.
+    
+    Yields:
+        A dictionary mapping every line id in puzzle to a word from 
+        fitting_words. The same dictionary is yielded every time and keeps
+        changing as the search goes on, so it must be copied to be kept.
+    
+    Raises:
+        SearchStopped: The limits stopped the search.
+    """
+    
+    component_puzzles = split_components(puzzle, components, fitting_words)
+    largest = 0
+    for i, line_ids in enumerate(components):
+        if len(line_ids) > len(components[largest]):
+            largest = i
+    
+    component_searches = []
+    for i, (component_puzzle, component_words) in enumerate(component_puzzles):
+        component_search = ComponentSearch(component_puzzle, word_index, 
+                                           component_words, options, stats, 
+                                           limits)
+        if i == largest:
+            component_searches.insert(0, component_search)
+            continue
+        if not component_search.has_solutions():
             return
+        component_searches.append(component_search)
     
-    solved_ids = current_solution.keys()
-    all_ids = puzzle.lines.keys()
-    possible_ids = [x for x in all_ids if x not in solved_ids]
+    yield from combine_solutions(component_searches, word_index, 
+                                 collections.Counter(), {})
+
+def combine_solutions(component_solutions, word_index, used_copies, 
+                      current_solution):
+    """
+    Recursively fills current_solution with every combination of one solution
+    from each group of lines that uses no more copies of a word than the word
+    bank has.
     
-    # If there are no more id's to guess, meaning all of the lines have been
-    # filled in, we have found a solution, so we add it to the current_solutions
-    # list.
-    if not possible_ids:
-        solution_set.append(copy.copy(current_solution))
-        del current_solution[line_id]
+    Args:
+        component_solutions: A list holding, for each group of lines, a list of
+                             the solutions to that group, or a ComponentSearch
+                             that can be iterated over any number of times.
+        word_index: The WordIndex built from the word bank.
+        used_copies: A collections.Counter of the number of times each word is
+                     used by the groups already in current_solution. It is 
+                     left as it was found.
+        current_solution: The dictionary the solutions are combined into.
+    
+    Yields:
+        current_solution, each time it holds a solution from every group.
+    """
+    
+    if not component_solutions:
+        yield current_solution
         return
     
-    target_id = get_optimal_guess_line(possible_ids, new_fitting_words)
+    for solution in component_solutions[0]:
+        word_counts = collections.Counter(solution.values())
+        if any(used_copies[word] + count 
+               > word_index.copies[word_index.id_of(word)]
+               for word, count in word_counts.items()):
+            continue
+        
+        current_solution.update(solution)
+        used_copies.update(word_counts)
+        yield from combine_solutions(component_solutions[1:], word_index, 
+                                     used_copies, current_solution)
+        used_copies.subtract(word_counts)
+
+def tally_component_solutions(puzzle, components, word_index, fitting_words,
+                              options=None, stats=None):
+    """
+    Counts the solutions to a puzzle made up of several groups of connected
+    lines. When no word fits in more than one group, the groups cannot get in
+    each other's way, so the count is the product of the groups' counts.
+    Otherwise, the combinations are counted as generate_component_solutions 
+    makes them.
+    
+    Args:
+        puzzle: The puzzle being solved.
+        components: A list of lists of line ids, as made by find_components.
+        word_index: The WordIndex built from the word bank.
+        fitting_words: A list mapping every line id in puzzle to a set of
+                       the ids, in word_index, of the words that are the right
+                       size to fit in that line.
+        options: An optional SearchOptions object holding the settings of the
+                 search.
+        stats: An optional SearchStats object the search of every group is
+               counted in.
+    
+    Returns:
+        The integer number of solutions.
+    """
+    
+    component_puzzles = split_components(puzzle, components, fitting_words)
     
-    for possible_word in new_fitting_words[target_id]:
-        if possible_word not in current_solution.values():
-            guess_word(puzzle, target_id, possible_word, new_fitting_words, 
-                       current_solution, solution_set)
+    seen_words = set()
+    for component_puzzle, component_words in component_puzzles:
+        words = set().union(*component_words)
+        if not seen_words.isdisjoint(words):
+            return sum(1 for solution in generate_component_solutions(
+                puzzle, components, word_index, fitting_words, options, 
+                stats))
+        seen_words.update(words)
     
-    # It is important to remove the guess from the current_solutions list after
-    # we are done with it so that it is not still there when we are attempting
-    # to start a new search branch.
-    del current_solution[line_id]
+    num_solutions = 1
+    for component_puzzle, component_words in component_puzzles:
+        num_solutions = num_solutions * search_tally(
+            component_puzzle, word_index, component_words, options, stats)
+        if not num_solutions:
+            break
+    
+    return num_solutions
 
-def get_optimal_guess_line(id_list, fitting_words):
+def guess_word(state, line_id, guess):
     """
-    Finds the id from id_list that maps to the smallest list of words in
-    fitting_words.
+    Recursively attempts to fill in the lines not yet assigned in the current
+    solution with all possible words, as described by the domains, starting by
+    attempting to fill the line with ID line_id with the word whose id is 
+    guess. Every time the current solution is filled, meaning a solution has 
+    been found, it is yielded.
     
     Args:
-        id_list: A list of id's which are keys in fitting_words.
-        fitting_words: A dictionary with integer keys that map to lists of
-                       strings
+        state: The SearchState of the search. Everything this call changes in
+               it is restored before it returns.
+        line_id: The id (as stored in puzzle) of the line we are trying to fit
+                 a word into.
+        guess: The id, in the word index, of the word we are trying to insert 
+               at line_id
+    
+    Yields:
+        state.current_solution, each time it holds a complete solution.
     
     Returns:
-        The id in id_list that, of all the ids in the list, maps to the smallest
-        list in fitting_words
+        If the search tracks conflicts and no solution was found, a set of the
+        ids of the filled lines, including line_id, whose words between them
+        leave no solution. None otherwise.
     """
     
-    if not id_list:
+    # Everything removed from the domains past this mark belongs to this
+    # search branch, and is put back once we are done with the branch.
+    mark = state.domains.mark()
+    conflicts = state.conflicts
+    stats = state.stats
+    if not place_word(state, line_id, guess):
+        if stats:
+            stats.backtracks += 1
+        remove_word(state, line_id, guess, mark)
+        return conflicts.failure if conflicts else None
+    
+    # If there are no more id's to guess, meaning all of the lines have been
+    # filled in, we have found a solution, so we hand it to the caller.
+    if len(state.current_solution) == state.num_lines:
+        yield state.current_solution
+        remove_word(state, line_id, guess, mark)
         return None
     
-    target_id = id_list[0]
-    lowest_possibility_count = len(fitting_words[target_id])
-    for line_id in id_list:
-        num_fitting_words = len(fitting_words[line_id])
-        if num_fitting_words < lowest_possibility_count:
-            lowest_possibility_count = num_fitting_words
-            target_id = line_id
+    # Solutions cannot be rebuilt from the table, so only subproblems found to
+    # have none are remembered. The lines to blame for one are not known, so
+    # every filled line is.
+    table = state.table
+    key = table.signature(state) if table else None
+    if key is not None and table.get(key) == 0:
+        conflict = conflicts.filled_lines() if conflicts else None
+        remove_word(state, line_id, guess, mark)
+        return conflict
     
-    return target_id
-    
\ No newline at end of file
+    target_id = state.line_queue.pop()
+    target_conflict = conflicts.line_conflict(target_id) if conflicts else None
+    found = False
+    
+    available_copies = state.available_copies
+    for word_id in state.domains.words(target_id):
+        if not available_copies[word_id]:
+            if conflicts:
+                target_conflict.update(conflicts.word_conflict(word_id))
+            continue
+        
+        word_conflict = yield from guess_word(state, target_id, word_id)
+        if word_conflict is None:
+            found = True
+        elif target_id not in word_conflict:
+            # The lines to blame were all filled before the target line, so
+            # none of its other words can do any better.
+            target_conflict = word_conflict
+            break
+        else:
+            target_conflict.update(word_conflict)
+    
+    state.line_queue.push(target_id)
+    if stats and not found:
+        stats.backtracks += 1
+    if key is not None and not found:
+        table.store(key, 0)
+    
+    conflict = None
+    if conflicts and not found:
+        target_conflict.discard(target_id)
+        conflicts.record_nogood(target_conflict)
+        conflict = target_conflict
+    
+    # It is important to restore the domains and remove the guess from the
+    # current solution after we are done with it so that neither is still
+    # there when we are attempting to start a new search branch.
+    remove_word(state, line_id, guess, mark)
+    return conflict
+
+def count_guesses(state, line_id, guess):
+    """
+    Counts the solutions guess_word would yield for the same arguments, without
+    yielding or copying anything.
+    
+    Args:
+        state: The SearchState of the search. Everything this call changes in
+               it is restored before it returns.
+        line_id: The id of the line we are trying to fit a word into.
+        guess: The id, in the word index, of the word we are trying to insert 
+               at line_id
+    
+    Returns:
+        A tuple of the integer number of solutions that extend the current 
+        solution with the guess, and the conflict guess_word would return.
+    """
+    
+    mark = state.domains.mark()
+    conflicts = state.conflicts
+    stats = state.stats
+    if not place_word(state, line_id, guess):
+        if stats:
+            stats.backtracks += 1
+        remove_word(state, line_id, guess, mark)
+        return 0, conflicts.failure if conflicts else None
+    
+    if len(state.current_solution) == state.num_lines:
+        remove_word(state, line_id, guess, mark)
+        return 1, None
+    
+    table = state.table
+    key = table.signature(state) if table else None
+    if key is not None:
+        num_solutions = table.get(key)
+        if num_solutions is not None:
+            conflict = None
+            if conflicts and not num_solutions:
+                conflict = conflicts.filled_lines()
+            remove_word(state, line_id, guess, mark)
+            return num_solutions, conflict
+    
+    target_id = state.line_queue.pop()
+    target_conflict = conflicts.line_conflict(target_id) if conflicts else None
+    num_solutions = 0
+    
+    available_copies = state.available_copies
+    for word_id in state.domains.words(target_id):
+        if not available_copies[word_id]:
+            if conflicts:
+                target_conflict.update(conflicts.word_conflict(word_id))
+            continue
+        
+        word_solutions, word_conflict = count_guesses(state, target_id, 
+                                                      word_id)
+        num_solutions = num_solutions + word_solutions
+        if word_conflict is None:
+            continue
+        elif target_id not in word_conflict:
+            target_conflict = word_conflict
+            break
+        else:
+            target_conflict.update(word_conflict)
+    
+    state.line_queue.push(target_id)
+    if stats and not num_solutions:
+        stats.backtracks += 1
+    if key is not None:
+        table.store(key, num_solutions)
+    
+    conflict = None
+    if conflicts and not num_solutions:
+        target_conflict.discard(target_id)
+        conflicts.record_nogood(target_conflict)
+        conflict = target_conflict
+    
+    remove_word(state, line_id, guess, mark)
+    return num_solutions, conflict
+
+def place_word(state, line_id, guess):
+    """
+    Puts a word in a line, and removes the words that no longer fit from the
+    domains of the lines crossing it. Whether or not it succeeds, the changes
+    it makes are undone by calling remove_word with a mark taken from the 
+    domains before calling this.
+    
+    Args:
+        state: The SearchState of the search.
+        line_id: The id of the line the word is put in.
+        guess: The id, in the word index, of the word being put in the line.
+    
+    Returns:
+        False if some line was left without any words that fit it, or if the
+        search tracks conflicts and the guess completes a recorded nogood, and
+        True otherwise. On failure, the lines to blame are left in 
+        state.conflicts.failure.
+    
+    Raises:
+        SearchStopped: The search's limits were hit before the word was put
+                       in, in which case nothing has been changed.
+    """
+    
+    puzzle = state.puzzle
+    word_index = state.word_index
+    domains = state.domains
+    line_words = state.line_words
+    heuristic = state.heuristic
+    conflicts = state.conflicts
+    stats = state.stats
+    
+    if state.limits:
+        state.limits.count_node()
+    if stats:
+        stats.enter_node(len(state.current_solution))
+    
+    guessed_word = word_index.words[guess]
+    state.current_solution[puzzle.line_ids[line_id]] = guessed_word
+    line_words[line_id] = guess
+    state.available_copies[guess] -= 1
+    if heuristic.uses_neighbours:
+        state.line_queue.push_neighbours(line_id)
+    narrowed_ids = []
+    
+    if conflicts:
+        conflicts.fill(line_id, guess)
+        nogood_ids = conflicts.find_nogood(line_id, guess)
+        if nogood_ids is not None:
+            conflicts.failure = nogood_ids
+            return False
+    
+    # Remove all words from the domains of the crossing lines that don't fit
+    # with the new guess, by keeping only the words that have the guessed 
+    # letter at the point of intersection.
+    for second_id, first_intersect, second_intersect in (
+            puzzle.crossings[line_id]):
+        # If the spot is filled, don't bother doing any calculations
+        if line_words[second_id] is not None:
+            continue
+        
+        old_size = domains.size(second_id)
+        domains.keep_letter(second_id, second_intersect, 
+                            guessed_word[first_intersect])
+        
+        if stats:
+            stats.record_prune(puzzle.line_ids[line_id], 
+                               puzzle.line_ids[second_id], 
+                               old_size - domains.size(second_id))
+        
+        if not domains.size(second_id):
+            state.record_wipeout(second_id, line_id)
+            if conflicts:
+                # The words the crossing line had left were taken out by the
+                # lines that narrowed it before, and the rest by this guess.
+                conflicts.failure = conflicts.line_conflict(second_id)
+                conflicts.failure.add(line_id)
+            return False
+        
+        if domains.size(second_id) != old_size:
+            narrowed_ids.append(second_id)
+            if conflicts:
+                conflicts.prune(line_id, second_id)
+    
+    # The crossing lines that lost words may in turn leave words on their own
+    # crossing lines without a partner, so we carry on from them.
+    if state.propagate and narrowed_ids:
+        propagation_mark = domains.mark()
+        domains.keep_word(line_id, guess)
+        
+        # Propagation does not keep track of which guesses each removal came
+        # from, so every line filled so far is blamed for it.
+        if not enforce_arc_consistency(puzzle, domains, narrowed_ids, 
+                                       state.record_wipeout, 
+                                       state.record_prune if stats else None):
+            if conflicts:
+                conflicts.failure = conflicts.filled_lines()
+            return False
+        
+        if conflicts:
+            for narrowed_id in domains.lines_changed_since(propagation_mark):
+                if line_words[narrowed_id] is None:
+                    conflicts.prune(line_id, narrowed_id, True)
+    
+    return True
+
+def remove_word(state, line_id, guess, mark):
+    """
+    Takes a word put in a line by place_word back out, restoring the words it
+    removed from the domains.
+    
+    Args:
+        state: The SearchState passed to place_word.
+        line_id: The id of the line the word was put in.
+        guess: The id of the word that was put in the line.
+        mark: The mark taken from the domains before place_word was called.
+    """
+    
+    state.domains.undo(mark)
+    del state.current_solution[state.puzzle.line_ids[line_id]]
+    state.line_words[line_id] = None
+    state.available_copies[guess] += 1
+    if state.conflicts:
+        state.conflicts.empty(line_id, guess)
+    state.line_queue.push(line_id)
+    if state.heuristic.uses_neighbours:
+        state.line_queue.push_neighbours(line_id)
+    if state.stats:
+        state.stats.leave_node(len(state.current_solution))
+
+def get_optimal_guess_line(id_list, domains):
+    """
+    Finds the id from id_list that has the smallest domain in domains.
+    
+    Args:
+        id_list: A list of line id's which are stored in domains.
+        domains: A DomainStore holding the words that can fit at each line.
+    
+    Returns:
+        The id in id_list that, of all the ids in the list, has the fewest words
+        left in domains
+    """
+    
+    if not id_list:
+        return None
+    
+    target_id = id_list[0]
+    lowest_possibility_count = domains.size(target_id)
+    for line_id in id_list:
+        num_fitting_words = domains.size(line_id)
+        if num_fitting_words < lowest_possibility_count:
+            lowest_possibility_count = num_fitting_words
+            target_id = line_id
+    
+    return target_id
+
+def enforce_arc_consistency(puzzle, domains, changed_ids=None, 
+                            on_wipeout=None, on_prune=None):
+    """
+    Removes words from the domains until every word left has, on every line
+    crossing its own, at least one word with the same letter at the point of
+    intersection, in the manner of AC-3. Only the crossing constraints are
+    considered, so no word that is part of a solution is ever removed.
+    
+    Args:
+        puzzle: The puzzle being solved.
+        domains: A DomainStore holding the ids of the words that can fit at 
+                 each line. Removals are recorded on its undo trail.
+        changed_ids: An optional list of the ids of the lines whose domains 
+                     have been narrowed since the domains were last consistent.
+                     If it is not provided, every crossing is checked.
+        on_wipeout: An optional function called with the id of a line whose
+                    domain became empty and the id of the line it was being
+                    checked against when it did.
+        on_prune: An optional function called with the id of a line that lost
+                  words, the id of the line it was checked against, and the
+                  number of words it lost, every time a line loses words.
+    
+    Returns:
+        False if the domain of some line became empty, meaning there is no
+        solution, and True otherwise.
+    """
+    
+    # Each arc is a tuple of the form (target_id, target_position, source_id, 
+    # source_position), and asks for the words in the target line that have 
+    # no partner in the source line to be removed.
+    arcs = []
+    if changed_ids is None:
+        for line_id, crossings in enumerate(puzzle.crossings):
+            for second_id, first_intersect, second_intersect in crossings:
+                arcs.append((line_id, first_intersect, second_id, 
+                             second_intersect))
+    else:
+        for line_id in changed_ids:
+            for second_id, first_intersect, second_intersect in (
+                    puzzle.crossings[line_id]):
+                arcs.append((second_id, second_intersect, line_id, 
+                             first_intersect))
+    
+    queued_arcs = set(arcs)
+    while arcs:
+        arc = arcs.pop()
+        queued_arcs.discard(arc)
+        target_id, target_position, source_id, source_position = arc
+        
+        if on_prune:
+            old_size = domains.size(target_id)
+        if not domains.revise(target_id, target_position, source_id, 
+                              source_position):
+            continue
+        
+        if on_prune:
+            on_prune(target_id, source_id, old_size - domains.size(target_id))
+        
+        if not domains.size(target_id):
+            if on_wipeout:
+                on_wipeout(target_id, source_id)
+            return False
+        
+        # The target line lost words, so the lines crossing it, other than the
+        # one that caused the loss, have to be checked against it again.
+        for second_id, first_intersect, second_intersect in (
+                puzzle.crossings[target_id]):
+            if second_id == source_id:
+                continue
+            new_arc = (second_id, second_intersect, target_id, 
+                       first_intersect)
+            if new_arc not in queued_arcs:
+                queued_arcs.add(new_arc)
+                arcs.append(new_arc)
+    
+    return True
+
+def enforce_initial_consistency(state):
+    """
+    Enforces arc consistency over every crossing of a puzzle before its search
+    starts, counting what it removes in the search's SearchStats.
+    
+    Args:
+        state: The SearchState of the search.
+    
+    Returns:
+        False if the domain of some line became empty, meaning there is no
+        solution, and True otherwise.
+    """
+    
+    if not state.stats:
+        return enforce_arc_consistency(state.puzzle, state.domains)
+    
+    return enforce_arc_consistency(state.puzzle, state.domains, None, 
+                                   state.record_wipeout, state.record_prune)
+
+class SearchState(object):
+    """
+    Everything a search over a puzzle keeps track of while it guesses words,
+    shared by every guess in the search.
+    
+    Attributes:
+        puzzle: The puzzle being solved.
+        word_index: The WordIndex the word ids in the search refer to.
+        domains: A DomainStore holding the ids of the words that can still fit
+                 at each line.
+        current_solution: A dictionary mapping the ids, in puzzle.source, of
+                          the lines that have been filled to the words filling
+                          them.
+        line_words: A list mapping every line id to the id of the word filling
+                    it, or None if it has not been filled.
+        available_copies: A list mapping the id of a word to the integer 
+                          number of copies of it that have not been put in a
+                          line yet, so that checking whether a word can still
+                          be used does not mean looking through every line.
+        num_lines: The number of lines in the puzzle.
+        heuristic: The LineHeuristic rating the lines for the line queue.
+        line_queue: The LineQueue giving the next line to guess.
+        propagate: True if arc consistency should be enforced after every 
+                   guess, rather than only filtering the crossing lines.
+        conflicts: The ConflictSets of the search if it backjumps, or None.
+        table: The TranspositionTable of the search if it remembers finished
+               subproblems, or None.
+        stats: The SearchStats the search is counted in, or None.
+        limits: The SearchLimits the search is held to, or None.
+    """
+    
+    def __init__(self, puzzle, word_index, fitting_words, options=None, 
+                 stats=None, limits=None):
+        if options is None:
+            options = SearchOptions()
+        
+        self.puzzle = puzzle
+        self.word_index = word_index
+        self.current_solution = {}
+        self.line_words = [None] * len(puzzle)
+        self.available_copies = list(word_index.copies)
+        self.num_lines = len(puzzle)
+        self.heuristic = HEURISTICS[options.heuristic](puzzle, 
+                                                       options.tie_break)
+        self.line_queue = LineQueue(self)
+        self.domains = DOMAIN_STORES[options.engine](
+            puzzle, word_index, fitting_words, self.line_queue.push)
+        self.propagate = options.propagate
+        self.conflicts = None
+        if options.backjump or options.max_nogoods:
+            self.conflicts = ConflictSets(puzzle, options.max_nogoods)
+        self.table = None
+        if options.table_size:
+            self.table = TranspositionTable(options.table_size)
+        self.stats = stats
+        self.limits = limits
+    
+    def record_wipeout(self, target_id, source_id):
+        """
+        Notes that checking a line against a line crossing it left it without
+        any words that fit it.
+        
+        Args:
+            target_id: The id of the line left without words.
+            source_id: The id of the line it was checked against.
+        """
+        
+        self.heuristic.record_wipeout(self, target_id, source_id)
+        if self.stats:
+            self.stats.wipeouts += 1
+    
+    def record_prune(self, target_id, source_id, num_removed):
+        """
+        Counts the words a line lost to a line crossing it in the search's
+        SearchStats, which must not be None.
+        
+        Args:
+            target_id: The id of the line that lost words.
+            source_id: The id of the line it was checked against.
+            num_removed: The integer number of words it lost.
+        """
+        
+        self.stats.record_prune(self.puzzle.line_ids[source_id], 
+                                self.puzzle.line_ids[target_id], num_removed)
+
+class SearchOptions(object):
+    """
+    The settings that change how a search goes about finding solutions, 
+    without changing which solutions it finds.
+    
+    Attributes:
+        propagate: True if arc consistency should be enforced again after 
+                   every guess, rather than only once before the search.
+        heuristic: The name of the rule used to pick the next line to guess,
+                   which is one of the keys of HEURISTICS.
+        tie_break: How to choose between lines the heuristic rates equally,
+                   either TIE_BREAK_ORDER or TIE_BREAK_INTERSECTIONS.
+        backjump: True if a failed search branch should jump straight back to
+                  the latest guess to blame for it, rather than trying the next
+                  word of the line guessed just before.
+        max_nogoods: The number of failed sets of guesses to remember, so that
+                     other branches making the same guesses are cut short. 
+                     Remembering any turns on backjumping.
+        engine: The name of the way the words that can still fit at each line
+                are kept track of, which is one of the keys of DOMAIN_STORES.
+        table_size: The number of finished subproblems to remember, so that
+                    the search does not repeat them when other guesses leave
+                    them again. See TranspositionTable.
+    """
+    
+    def __init__(self, propagate=False, heuristic=DEFAULT_HEURISTIC, 
+                 tie_break=TIE_BREAK_ORDER, backjump=False, max_nogoods=0,
+                 engine=DEFAULT_ENGINE, table_size=0):
+        if heuristic not in HEURISTICS:
+            raise ValueError("Unknown heuristic: {}".format(heuristic))
+        if tie_break not in (TIE_BREAK_ORDER, TIE_BREAK_INTERSECTIONS):
+            raise ValueError("Unknown tie break: {}".format(tie_break))
+        if max_nogoods < 0:
+            raise ValueError("max_nogoods must not be negative")
+        if table_size < 0:
+            raise ValueError("table_size must not be negative")
+        if engine not in DOMAIN_STORES:
+            raise ValueError("Unknown engine: {}".format(engine))
+        if engine == ENGINE_NUMPY and not numpy_engine.is_available():
+            raise ImportError("The numpy engine needs NumPy to be installed")
+        
+        self.propagate = propagate
+        self.heuristic = heuristic
+        self.tie_break = tie_break
+        self.backjump = backjump
+        self.max_nogoods = max_nogoods
+        self.engine = engine
+        self.table_size = table_size
+
+class SearchStats(object):
+    """
+    Counts of what a search did, to show where its time goes. Passing one to 
+    solve, iter_solutions or count_solutions turns counting on, and otherwise 
+    the search only checks that it has none.
+    
+    Attributes:
+        nodes: The number of words put in lines.
+        prunes: A collections.Counter mapping a tuple of the ids, in the 
+                source puzzle, of two crossing lines to the number of words
+                removed from the domain of the second line because of the
+                first.
+        wipeouts: The number of times a line was left without any words that
+                  fit it.
+        backtracks: The number of words taken back out of a line without
+                    having led to a solution.
+        solutions: The number of solutions found so far. When solutions are
+                   only counted, they are added once the count is done.
+        nodes_by_depth: A list mapping a number of filled lines to the number
+                        of words put in a line when that many lines were
+                        already filled.
+        seconds_by_depth: A list mapping a number of filled lines to the 
+                          seconds spent on words put in a line when that many
+                          lines were already filled, not counting the time
+                          spent on the lines filled after them. It stays empty
+                          unless time_depths is True.
+        time_depths: True if the time spent at each depth is being measured.
+        on_progress: An optional function called with this object every 
+                     progress_interval words put in lines.
+        progress_interval: The number of words put in lines between calls to
+                           on_progress.
+    """
+    
+    def __init__(self, time_depths=False, on_progress=None, 
+                 progress_interval=PROGRESS_INTERVAL):
+        self.nodes = 0
+        self.prunes = collections.Counter()
+        self.wipeouts = 0
+        self.backtracks = 0
+        self.solutions = 0
+        self.nodes_by_depth = []
+        self.seconds_by_depth = []
+        self.time_depths = time_depths
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self._depth = None
+        self._paused_depth = None
+        self._clock_time = None
+    
+    def __getstate__(self):
+        # The progress function may not be able to be pickled, and only
+        # matters to the process that made it.
+        state = dict(self.__dict__)
+        state["on_progress"] = None
+        return state
+    
+    def total_prunes(self):
+        """
+        Gets the number of words removed from the domains of lines because of
+        the lines crossing them.
+        
+        Returns:
+            The integer sum of the counts in prunes.
+        """
+        
+        return sum(self.prunes.values())
+    
+    def enter_node(self, depth):
+        """
+        Counts a word being put in a line.
+        
+        Args:
+            depth: The number of lines that were filled before the word was
+                   put in.
+        """
+        
+        self.nodes = self.nodes + 1
+        if depth >= len(self.nodes_by_depth):
+            self.nodes_by_depth.extend([0] * (depth + 1 - 
+                                              len(self.nodes_by_depth)))
+        self.nodes_by_depth[depth] = self.nodes_by_depth[depth] + 1
+        
+        if self.time_depths:
+            self._run_clock(depth)
+        if self.on_progress and self.nodes % self.progress_interval == 0:
+            self.on_progress(self)
+    
+    def leave_node(self, depth):
+        """
+        Notes that a word counted by enter_node has been taken back out of its
+        line.
+        
+        Args:
+            depth: The depth enter_node was called with.
+        """
+        
+        if self.time_depths:
+            self._run_clock(depth - 1)
+    
+    def pause(self):
+        """
+        Stops timing the search while a solution is handed to the caller.
+        """
+        
+        if self.time_depths:
+            self._paused_depth = self._depth
+            self._run_clock(-1)
+    
+    def resume(self):
+        """
+        Starts timing the search again where pause stopped it.
+        """
+        
+        if self.time_depths:
+            self._run_clock(self._paused_depth)
+    
+    def record_prune(self, first_id, second_id, num_removed):
+        """
+        Counts words removed from the domain of a line because of a line 
+        crossing it.
+        
+        Args:
+            first_id: The id, in the source puzzle, of the line that caused
+                      the removal.
+            second_id: The id, in the source puzzle, of the line that lost
+                       words.
+            num_removed: The integer number of words it lost.
+        """
+        
+        self.prunes[(first_id, second_id)] += num_removed
+    
+    def merge(self, other):
+        """
+        Adds the counts of another search to these, such as those of a 
+        subproblem searched in another process, and calls on_progress.
+        
+        Args:
+            other: A SearchStats object.
+        """
+        
+        self.nodes = self.nodes + other.nodes
+        self.prunes.update(other.prunes)
+        self.wipeouts = self.wipeouts + other.wipeouts
+        self.backtracks = self.backtracks + other.backtracks
+        self.solutions = self.solutions + other.solutions
+        for depth_list, other_list in ((self.nodes_by_depth, 
+                                        other.nodes_by_depth),
+                                       (self.seconds_by_depth, 
+                                        other.seconds_by_depth)):
+            for depth, value in enumerate(other_list):
+                if depth < len(depth_list):
+                    depth_list[depth] = depth_list[depth] + value
+                else:
+                    depth_list.append(value)
+        
+        if self.on_progress:
+            self.on_progress(self)
+    
+    def _run_clock(self, depth):
+        """
+        Adds the time since the clock was last run to the depth it was run 
+        for, and starts timing the provided depth.
+        
+        Args:
+            depth: The depth the search is now at, or a negative number if the
+                   time until the clock is next run should not be counted.
+        """
+        
+        now = time.perf_counter()
+        if self._depth is not None:
+            seconds = self.seconds_by_depth
+            if self._depth >= len(seconds):
+                seconds.extend([0.0] * (self._depth + 1 - len(seconds)))
+            seconds[self._depth] = seconds[self._depth] + now - self._clock_time
+        
+        self._depth = depth if depth is not None and depth >= 0 else None
+        self._clock_time = now
+
+class SearchLimits(object):
+    """
+    The limits a search is held to, so that a search that would take too long
+    can be stopped cleanly, keeping the solutions it has found. A SearchLimits
+    object counts the words its search puts in lines, so each one must only be
+    used for one search.
+    
+    Attributes:
+        deadline: The value of time.monotonic after which the search stops, or
+                  None if it has no deadline.
+        max_nodes: The most words the search may put in lines, or None if 
+                   there is no limit.
+        cancel_event: An optional object with an is_set method, such as a 
+                      threading.Event, that stops the search once it is set.
+        nodes: The number of words the search has put in lines so far.
+        reason: STOP_DEADLINE, STOP_NODES or STOP_CANCELLED once the search 
+                has been stopped, and None until then.
+        node_budget: An optional multiprocessing.Value shared with searches
+                     running in other processes, holding the number of words
+                     they may still put in lines between them.
+    """
+    
+    def __init__(self, timeout=None, max_nodes=None, cancel_event=None,
+                 deadline=None, node_budget=None):
+        """
+        Args:
+            timeout: An optional number of seconds, from now, the search may
+                     run for.
+            max_nodes: An optional limit on the number of words the search
+                       may put in lines.
+            cancel_event: An optional object with an is_set method that stops
+                          the search once it is set.
+            deadline: An optional value of time.monotonic after which the 
+                      search stops. If a timeout is also given, the search 
+                      stops at whichever comes first.
+            node_budget: An optional multiprocessing.Value of a signed integer
+                         type shared by searches running at the same time, 
+                         holding the number of words they may still put in 
+                         lines between them. Once the search has put in 
+                         max_nodes words, which is 0 if it is not provided, it
+                         takes LIMIT_CHECK_INTERVAL more from the budget at a
+                         time, and only stops once the budget runs out.
+        """
+        
+        if timeout is not None:
+            timeout_deadline = time.monotonic() + timeout
+            if deadline is None or timeout_deadline < deadline:
+                deadline = timeout_deadline
+        if node_budget is not None and max_nodes is None:
+            max_nodes = 0
+        
+        self.deadline = deadline
+        self.max_nodes = max_nodes
+        self.cancel_event = cancel_event
+        self.nodes = 0
+        self.reason = None
+        self.node_budget = node_budget
+    
+    def poll(self):
+        """
+        Checks whether the search should stop, setting reason if it should.
+        
+        Returns:
+            The reason the search should stop, or None if it should not.
+        """
+        
+        if self.reason is None:
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                self.reason = STOP_CANCELLED
+            elif (self.deadline is not None and 
+                  time.monotonic() >= self.deadline):
+                self.reason = STOP_DEADLINE
+            elif (self.max_nodes is not None and 
+                  self.nodes >= self.max_nodes and not self.take_nodes()):
+                self.reason = STOP_NODES
+        
+        return self.reason
+    
+    def count_node(self):
+        """
+        Counts a word about to be put in a line, checking the deadline and 
+        the cancellation event every LIMIT_CHECK_INTERVAL words.
+        
+        Raises:
+            SearchStopped: The search should stop before putting the word in.
+        """
+        
+        if (self.max_nodes is not None and self.nodes >= self.max_nodes and
+                not self.take_nodes()):
+            self.reason = self.reason or STOP_NODES
+            raise SearchStopped(self.reason)
+        
+        if self.nodes % LIMIT_CHECK_INTERVAL == 0 and self.poll():
+            raise SearchStopped(self.reason)
+        
+        self.nodes = self.nodes + 1
+    
+    def take_nodes(self):
+        """
+        Takes up to LIMIT_CHECK_INTERVAL more words the search may put in 
+        lines from the shared node budget, if it has one.
+        
+        Returns:
+            True if any words were taken, and False if not.
+        """
+        
+        if self.node_budget is None:
+            return False
+        
+        with self.node_budget.get_lock():
+            taken = min(LIMIT_CHECK_INTERVAL, self.node_budget.value)
+            self.node_budget.value = self.node_budget.value - taken
+        self.max_nodes = self.max_nodes + taken
+        return taken > 0
+    
+    def return_nodes(self):
+        """
+        Gives the words taken from the shared node budget that the search did
+        not use back to it, once the search is finished.
+        """
+        
+        if self.node_budget is None or self.nodes >= self.max_nodes:
+            return
+        
+        with self.node_budget.get_lock():
+            self.node_budget.value = (self.node_budget.value + 
+                                      self.max_nodes - self.nodes)
+        self.max_nodes = self.nodes
+
+class SearchStopped(Exception):
+    """
+    Raised inside a search when its SearchLimits stop it. The functions that
+    take limits catch it, so callers only see the limits' reason being set.
+    
+    Attributes:
+        reason: The reason the search was stopped, as in SearchLimits.
+    """
+    
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+class PartialSolutions(list):
+    """
+    The solutions a search found before its SearchLimits stopped it, returned
+    by solve in place of the full list of solutions.
+    
+    Attributes:
+        reason: The reason the search was stopped, as in SearchLimits.
+        partial: Always True, since the list does not hold every solution.
+    """
+    
+    partial = True
+    
+    def __init__(self, solutions, reason):
+        super().__init__(solutions)
+        self.reason = reason
+
+class ComponentSearch(object):
+    """
+    The search of one group of connected lines, which can be iterated over any
+    number of times, so that the solutions of a group can be combined with 
+    those of the others. The first iteration runs the search, keeping the 
+    solutions it finds unless there are more than COMPONENT_SOLUTIONS_KEPT, 
+    and later iterations go over the kept solutions, or run the search again
+    if there were too many to keep. Only one iteration may be under way at a
+    time.
+    """
+    
+    def __init__(self, puzzle, word_index, fitting_words, options=None, 
+                 stats=None, limits=None):
+        """
+        Args:
+            puzzle: The puzzle made from the group of lines.
+            word_index: The WordIndex built from the word bank.
+            fitting_words: A list mapping every line id in puzzle to a set of
+                           the ids, in word_index, of the words that are the
+                           right size to fit in that line.
+            options: An optional SearchOptions object holding the settings of
+                     the search.
+            stats: An optional SearchStats object the search is counted in,
+                   every time it is run.
+            limits: An optional SearchLimits object the search is held to.
+        """
+        
+        self._puzzle = puzzle
+        self._word_index = word_index
+        self._fitting_words = fitting_words
+        self._options = options
+        self._stats = stats
+        self._limits = limits
+        self._search = None
+        self._first_solution = None
+        self._started = False
+        self._kept = None
+    
+    def __iter__(self):
+        if self._kept is not None:
+            return iter(self._kept)
+        if self._started:
+            return self._run_search()
+        
+        self._started = True
+        return self._keep_solutions()
+    
+    def has_solutions(self):
+        """
+        Runs the search up to its first solution, which is then the first 
+        solution of the first iteration, rather than being searched for again.
+        
+        Returns:
+            True if the group has any solutions.
+        """
+        
+        self._search = self._run_search()
+        self._first_solution = next(self._search, None)
+        if self._first_solution is None:
+            return False
+        
+        self._first_solution = copy.copy(self._first_solution)
+        return True
+    
+    def _run_search(self):
+        return search_solutions(self._puzzle, self._word_index, 
+                                self._fitting_words, self._options, 
+                                self._stats, self._limits)
+    
+    def _keep_solutions(self):
+        """
+        Runs the search for the first iteration, carrying on from has_solutions
+        if it was called, and keeps the solutions if there are few enough.
+        
+        Yields:
+            Every solution to the group.
+        """
+        
+        search = self._search or self._run_search()
+        kept = []
+        if self._first_solution is not None:
+            kept.append(self._first_solution)
+            yield self._first_solution
+        self._search = self._first_solution = None
+        
+        for solution in search:
+            if kept is not None:
+                if len(kept) < COMPONENT_SOLUTIONS_KEPT:
+                    kept.append(copy.copy(solution))
+                else:
+                    kept = None
+            yield solution
+        
+        self._kept = kept
+
+class LineQueue(object):
+    """
+    A priority queue of the lines that have not been filled yet, ordered by 
+    the rating the search's heuristic gives them, so that picking the next line
+    to guess does not mean rating every line.
+    
+    Rather than being moved when its rating changes, a line is pushed again,
+    and the entries pushed for it before are skipped when they reach the front
+    of the queue. Pushes are only marked when they happen, and are carried out
+    the next time a line is popped, so a line whose domain changes many times
+    between two guesses is only rated once.
+    """
+    
+    def __init__(self, state):
+        """
+        Args:
+            state: The SearchState of the search, whose line_words tell the
+                   queue which lines have been filled.
+        """
+        
+        self._state = state
+        self._heap = []
+        self._versions = [0] * len(state.puzzle)
+        self._pending_ids = set(range(len(state.puzzle)))
+    
+    def push(self, line_id):
+        """
+        Puts a line back in the queue, or updates its place in the queue after
+        something it is rated by has changed. Lines that are filled when the
+        next line is popped are left out.
+        
+        Args:
+            line_id: The id of the line.
+        """
+        
+        self._pending_ids.add(line_id)
+    
+    def push_neighbours(self, line_id):
+        """
+        Pushes every line crossing the provided line.
+        
+        Args:
+            line_id: The id of the line.
+        """
+        
+        for second_id, unused, unused in self._state.puzzle.crossings[line_id]:
+            self._pending_ids.add(second_id)
+    
+    def pop(self):
+        """
+        Takes the unfilled line the heuristic rates best out of the queue. It
+        must be pushed again if the search leaves it unfilled.
+        
+        Returns:
+            The id of the line, or None if every line is filled.
+        """
+        
+        state = self._state
+        line_words = state.line_words
+        heuristic = state.heuristic
+        heap = self._heap
+        versions = self._versions
+        
+        # Skipped entries pile up over a long search, so once they outnumber 
+        # the lines the queue is built again from the unfilled lines.
+        if len(heap) > 4 * len(versions) + 64:
+            heap.clear()
+            self._pending_ids.update(range(len(versions)))
+        
+        for line_id in self._pending_ids:
+            if line_words[line_id] is None:
+                versions[line_id] = versions[line_id] + 1
+                heapq.heappush(heap, (heuristic.rate(state, line_id), 
+                                      versions[line_id], line_id))
+        self._pending_ids.clear()
+        
+        while heap:
+            rating, version, line_id = heapq.heappop(heap)
+            if version == versions[line_id] and line_words[line_id] is None:
+                versions[line_id] = versions[line_id] + 1
+                return line_id
+        
+        return None
+
+class LineHeuristic(object):
+    """
+    A rule for picking the next line to guess, by rating every line that has
+    not been filled, where the line with the lowest rating is guessed next. 
+    This rule rates lines by the number of words left in their domains.
+    
+    Attributes:
+        uses_neighbours: True if the rating of a line depends on which of the
+                         lines crossing it have been filled, so that they have
+                         to be rated again whenever it is filled or emptied.
+    """
+    
+    uses_neighbours = False
+    
+    def __init__(self, puzzle, tie_break=TIE_BREAK_ORDER):
+        """
+        Args:
+            puzzle: The puzzle being solved.
+            tie_break: How to choose between lines with the same rating, 
+                       either TIE_BREAK_ORDER or TIE_BREAK_INTERSECTIONS.
+        """
+        
+        self._ties = []
+        for line_id, crossings in enumerate(puzzle.crossings):
+            if tie_break == TIE_BREAK_INTERSECTIONS:
+                self._ties.append((-len(crossings), line_id))
+            else:
+                self._ties.append((line_id,))
+    
+    def rate(self, state, line_id):
+        """
+        Rates a line that has not been filled.
+        
+        Args:
+            state: The SearchState of the search.
+            line_id: The id of the line.
+        
+        Returns:
+            A value that compares lower than the rating of every line that 
+            should be guessed after this one.
+        """
+        
+        return (self.score(state, line_id), self._ties[line_id])
+    
+    def score(self, state, line_id):
+        """
+        Scores a line that has not been filled, before ties are broken.
+        
+        Args:
+            state: The SearchState of the search.
+            line_id: The id of the line.
+        
+        Returns:
+            A number, where lines with lower numbers are guessed first.
+        """
+        
+        return state.domains.size(line_id)
+    
+    def record_wipeout(self, state, first_id, second_id):
+        """
+        Notes that the crossing between two lines left one of them without any
+        words that fit it.
+        
+        Args:
+            state: The SearchState of the search.
+            first_id: The id of one of the lines.
+            second_id: The id of the other line.
+        """
+        
+        pass
+
+class DomDegHeuristic(LineHeuristic):
+    """
+    Rates lines by the number of words left in their domains, divided by the
+    number of lines crossing them that have not been filled, so that lines
+    that constrain more of the puzzle are guessed earlier.
+    """
+    
+    uses_neighbours = True
+    
+    def score(self, state, line_id):
+        degree = 0
+        line_words = state.line_words
+        for second_id, unused, unused in state.puzzle.crossings[line_id]:
+            if line_words[second_id] is None:
+                degree = degree + 1
+        
+        if not degree:
+            return float("inf")
+        return state.domains.size(line_id) / degree
+
+class DomWdegHeuristic(LineHeuristic):
+    """
+    Rates lines like DomDegHeuristic, but counts each crossing as many times as
+    it has left a line without any words, plus one, so that the search learns
+    which parts of the puzzle are hard and guesses them earlier.
+    """
+    
+    uses_neighbours = True
+    
+    def __init__(self, puzzle, tie_break=TIE_BREAK_ORDER):
+        super().__init__(puzzle, tie_break)
+        self._weights = {}
+    
+    def score(self, state, line_id):
+        weighted_degree = 0
+        line_words = state.line_words
+        for second_id, unused, unused in state.puzzle.crossings[line_id]:
+            if line_words[second_id] is None:
+                weighted_degree = weighted_degree + self._weights.get(
+                    (line_id, second_id), 1)
+        
+        if not weighted_degree:
+            return float("inf")
+        return state.domains.size(line_id) / weighted_degree
+    
+    def record_wipeout(self, state, first_id, second_id):
+        weight = self._weights.get((first_id, second_id), 1) + 1
+        self._weights[(first_id, second_id)] = weight
+        self._weights[(second_id, first_id)] = weight
+        state.line_queue.push(first_id)
+        state.line_queue.push(second_id)
+
+# The rules for picking the next line to guess, by name.
+HEURISTICS = {
+    HEURISTIC_DOM: LineHeuristic,
+    HEURISTIC_DOM_DEG: DomDegHeuristic,
+    HEURISTIC_DOM_WDEG: DomWdegHeuristic,
+}
+
+class ConflictSets(object):
+    """
+    The reasons the search is where it is, kept so that a failed search branch
+    can be blamed on the filled lines that actually caused it, in the manner of
+    conflict-directed backjumping. For every line, it keeps the filled lines
+    that took words out of its domain, and for every word, the lines holding
+    its copies. When every word of a line fails, the lines to blame for each
+    failure are gathered, and if the line just guessed is not among them, the
+    search can jump back past it.
+    
+    A set of lines to blame, along with their words, is a nogood: those words
+    in those lines cannot be part of any solution. A bounded number of nogoods
+    are remembered, dropping the least recently used first, so that branches
+    making the same guesses again fail as soon as they do.
+    
+    Attributes:
+        failure: A set of the ids of the filled lines to blame for the last 
+                 guess place_word failed to make.
+    """
+    
+    def __init__(self, puzzle, max_nogoods=0):
+        """
+        Args:
+            puzzle: The puzzle being solved.
+            max_nogoods: The integer number of nogoods to remember.
+        """
+        
+        self.failure = None
+        self._filled_ids = []
+        self._depths = {}
+        self._words = {}
+        self._pruned_by = [[] for line_id in range(len(puzzle))]
+        self._pruned_ids = {}
+        self._holders = collections.defaultdict(list)
+        self._max_nogoods = max_nogoods
+        self._nogoods = collections.OrderedDict()
+        self._nogoods_by_word = {}
+    
+    def fill(self, line_id, word_id):
+        """
+        Notes that a word has been put in a line.
+        
+        Args:
+            line_id: The id of the line.
+            word_id: The id of the word.
+        """
+        
+        self._depths[line_id] = len(self._filled_ids)
+        self._filled_ids.append(line_id)
+        self._words[line_id] = word_id
+        self._pruned_ids[line_id] = []
+        self._holders[word_id].append(line_id)
+    
+    def empty(self, line_id, word_id):
+        """
+        Notes that the word last put in a line has been taken back out. Lines
+        must be emptied in the reverse of the order they were filled.
+        
+        Args:
+            line_id: The id of the line.
+            word_id: The id of the word.
+        """
+        
+        for pruned_id in reversed(self._pruned_ids.pop(line_id)):
+            self._pruned_by[pruned_id].pop()
+        self._holders[word_id].pop()
+        del self._words[line_id]
+        del self._depths[line_id]
+        self._filled_ids.pop()
+    
+    def prune(self, line_id, pruned_id, after_all=False):
+        """
+        Notes that filling a line took words out of the domain of another.
+        
+        Args:
+            line_id: The id of the line that was filled.
+            pruned_id: The id of the line that lost words.
+            after_all: True if the words were taken out because of every line
+                       filled so far, rather than the filled line alone.
+        """
+        
+        self._pruned_by[pruned_id].append((line_id, after_all))
+        self._pruned_ids[line_id].append(pruned_id)
+    
+    def filled_lines(self):
+        """
+        Gets every filled line.
+        
+        Returns:
+            A new set of the ids of every filled line.
+        """
+        
+        return set(self._filled_ids)
+    
+    def line_conflict(self, line_id):
+        """
+        Gets the filled lines to blame for the words taken out of the domain of
+        a line.
+        
+        Args:
+            line_id: The id of the line.
+        
+        Returns:
+            A new set of line ids.
+        """
+        
+        conflict = set()
+        for pruning_id, after_all in self._pruned_by[line_id]:
+            if after_all:
+                conflict.update(
+                    self._filled_ids[:self._depths[pruning_id] + 1])
+            else:
+                conflict.add(pruning_id)
+        
+        return conflict
+    
+    def word_conflict(self, word_id):
+        """
+        Gets the filled lines to blame for a word having no copies left.
+        
+        Args:
+            word_id: The id of the word.
+        
+        Returns:
+            A list of line ids. It must not be modified.
+        """
+        
+        return self._holders[word_id]
+    
+    def record_nogood(self, conflict):
+        """
+        Remembers that the words currently in a set of lines cannot be part of
+        any solution, forgetting the least recently used nogood if there are 
+        too many.
+        
+        Args:
+            conflict: A set of the ids of filled lines.
+        """
+        
+        if not self._max_nogoods or not conflict:
+            return
+        
+        nogood = frozenset((line_id, self._words[line_id]) 
+                           for line_id in conflict)
+        if nogood in self._nogoods:
+            self._nogoods.move_to_end(nogood)
+            return
+        
+        if len(self._nogoods) >= self._max_nogoods:
+            old_nogood, unused = self._nogoods.popitem(last=False)
+            for pair in old_nogood:
+                nogoods = self._nogoods_by_word[pair]
+                nogoods.remove(old_nogood)
+                if not nogoods:
+                    del self._nogoods_by_word[pair]
+        
+        self._nogoods[nogood] = None
+        for pair in nogood:
+            if pair not in self._nogoods_by_word:
+                self._nogoods_by_word[pair] = []
+            self._nogoods_by_word[pair].append(nogood)
+    
+    def find_nogood(self, line_id, word_id):
+        """
+        Checks whether a word just put in a line completes a remembered nogood.
+        
+        Args:
+            line_id: The id of the line, which must already be filled.
+            word_id: The id of the word in it.
+        
+        Returns:
+            A new set of the ids of the lines in the nogood, or None if there is
+            no such nogood.
+        """
+        
+        words = self._words
+        for nogood in self._nogoods_by_word.get((line_id, word_id), ()):
+            if all(words.get(other_id) == other_word 
+                   for other_id, other_word in nogood):
+                self._nogoods.move_to_end(nogood)
+                return {other_id for other_id, other_word in nogood}
+        
+        return None
+
+class TranspositionTable(object):
+    """
+    The results of subproblems the search has already finished, so that when
+    different guesses leave the same subproblem, it is not searched again. A
+    subproblem is the lines that have not been filled, along with the words
+    left in their domains and the copies left of the filled words that could
+    still go in them. Lines that were filled do not matter beyond that, as the
+    words they took out of the other lines' domains are already gone.
+    
+    The words left in the domain of a line are those of its domain before the
+    search that have the letters the filled lines put where they cross it, 
+    narrowed further to arc consistency if the search propagates. Either way,
+    they only depend on those letters, so the letters are what the subproblem
+    is known by, which is much quicker than comparing the domains themselves.
+    
+    A bounded number of subproblems are remembered, dropping the least 
+    recently used first. Each is remembered with its number of solutions, or 
+    with 0 if it was only found to have none.
+    
+    Attributes:
+        hits: The integer number of times a subproblem was looked up and found.
+        misses: The integer number of times a subproblem was looked up and not
+                found.
+    """
+    
+    def __init__(self, max_entries):
+        """
+        Args:
+            max_entries: The integer number of subproblems to remember.
+        """
+        
+        self.hits = 0
+        self.misses = 0
+        self._max_entries = max_entries
+        self._entries = collections.OrderedDict()
+    
+    def signature(self, state):
+        """
+        Makes a key for the subproblem left by the lines filled in a search.
+        
+        Args:
+            state: The SearchState of the search.
+        
+        Returns:
+            A hashable key that is the same for every search state leaving the
+            same subproblem, or None if the subproblem has fewer than 
+            TABLE_MIN_LINES lines.
+        """
+        
+        line_words = state.line_words
+        open_ids = [line_id for line_id, word_id in enumerate(line_words) 
+                    if word_id is None]
+        if len(open_ids) < TABLE_MIN_LINES:
+            return None
+        
+        puzzle = state.puzzle
+        words = state.word_index.words
+        crossing_letters = tuple(
+            "".join(words[line_words[second_id]][second_intersect]
+                    for second_id, first_intersect, second_intersect 
+                    in puzzle.crossings[open_id]
+                    if line_words[second_id] is not None)
+            for open_id in open_ids)
+        
+        # Only the filled words that could still go in an open line change
+        # what the open lines can be filled with.
+        domains = state.domains
+        lengths = puzzle.lengths
+        open_ids_by_length = collections.defaultdict(list)
+        for open_id in open_ids:
+            open_ids_by_length[lengths[open_id]].append(open_id)
+        available_copies = state.available_copies
+        used_words = set()
+        for line_id, word_id in enumerate(line_words):
+            if word_id is None or word_id in used_words:
+                continue
+            if any(domains.contains(open_id, word_id) 
+                   for open_id in open_ids_by_length.get(lengths[line_id], 
+                                                         ())):
+                used_words.add(word_id)
+        
+        return (tuple(open_ids), crossing_letters,
+                tuple((word_id, available_copies[word_id]) 
+                      for word_id in sorted(used_words)))
+    
+    def get(self, key):
+        """
+        Looks up the result of a subproblem.
+        
+        Args:
+            key: A key made by signature.
+        
+        Returns:
+            The integer number of solutions the subproblem was remembered with,
+            or None if it is not remembered.
+        """
+        
+        num_solutions = self._entries.get(key)
+        if num_solutions is None:
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return num_solutions
+    
+    def store(self, key, num_solutions):
+        """
+        Remembers the result of a subproblem, forgetting the least recently 
+        used one if there are too many.
+        
+        Args:
+            key: A key made by signature.
+            num_solutions: The integer number of solutions of the subproblem,
+                           or 0 if it only is known to have none.
+        """
+        
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        elif len(self._entries) >= self._max_entries:
+            self._entries.popitem(last=False)
+        self._entries[key] = num_solutions
+
+class WordIndex(object):
+    """
+    The words of a word bank, along with an index from a word length, a
+    position, and a letter to the set of words of that length with that letter
+    at that position. Words are referred to by integer ids, so that the sets
+    stay small and cheap to intersect. A word that is in the word bank more 
+    than once has a single id, and the number of times it is in the word bank
+    is the number of lines it can be used in.
+    
+    Attributes:
+        words: A list of the distinct words in the word bank, where the id of a
+               word is its position in the list.
+        copies: A list mapping the id of a word to the integer number of times
+                it is in the word bank, which is 0 for words that have been
+                removed.
+    """
+    
+    def __init__(self, word_by_length, load_letters=None):
+        """
+        Args:
+            word_by_length: A dictionary mapping an integer length to a list of
+                            the words from the word bank with that length.
+            load_letters: An optional function taking a length, a position and
+                          the id of the first word of that length, and 
+                          returning the letters at that position of the words
+                          with that length, in the form letters returns them,
+                          with the words numbered on from the first id in the
+                          order word_by_length lists them. If it is provided,
+                          the words must all be different, and the letters at
+                          each position are loaded from it the first time they
+                          are needed, instead of being indexed up front.
+        """
+        
+        self.words = []
+        self.copies = []
+        self._id_by_word = {}
+        self._ids_by_length = {}
+        self._ids_by_letter = {}
+        self._load_letters = load_letters
+        self._first_ids = {}
+        
+        if load_letters is not None:
+            for length, words in word_by_length.items():
+                first_id = len(self.words)
+                ids = list(range(first_id, first_id + len(words)))
+                self.words.extend(words)
+                self.copies.extend([1] * len(words))
+                self._id_by_word.update(zip(words, ids))
+                self._ids_by_length[length] = ids
+                self._first_ids[length] = first_id
+            return
+        
+        for length, words in word_by_length.items():
+            ids = []
+            for word in words:
+                if word in self._id_by_word:
+                    self.copies[self._id_by_word[word]] += 1
+                    continue
+                
+                word_id = len(self.words)
+                self.words.append(word)
+                self.copies.append(1)
+                self._id_by_word[word] = word_id
+                ids.append(word_id)
+                for position, letter in enumerate(word):
+                    key = (length, position)
+                    if key not in self._ids_by_letter:
+                        self._ids_by_letter[key] = {}
+                    ids_by_letter = self._ids_by_letter[key]
+                    if letter not in ids_by_letter:
+                        ids_by_letter[letter] = set()
+                    ids_by_letter[letter].add(word_id)
+            self._ids_by_length[length] = ids
+    
+    def id_of(self, word):
+        """
+        Gets the id of a word in the word bank.
+        
+        Args:
+            word: A string from the word bank.
+        
+        Returns:
+            The integer id of the word.
+        """
+        
+        return self._id_by_word[word]
+    
+    def add_word(self, word):
+        """
+        Adds a copy of a word to the word bank. A word that is new, or whose 
+        copies had all been removed, is indexed again under the id it had.
+        
+        Args:
+            word: The string to add.
+        
+        Returns:
+            The integer id of the word.
+        """
+        
+        word_id = self._id_by_word.get(word)
+        if word_id is None:
+            word_id = len(self.words)
+            self.words.append(word)
+            self.copies.append(0)
+            self._id_by_word[word] = word_id
+        
+        self.copies[word_id] += 1
+        if self.copies[word_id] > 1:
+            return word_id
+        
+        # The ids of each length are kept in increasing order, which the numpy
+        # engine relies on.
+        length = len(word)
+        if length not in self._ids_by_length:
+            self._ids_by_length[length] = []
+        bisect.insort(self._ids_by_length[length], word_id)
+        for position, letter in enumerate(word):
+            key = (length, position)
+            self._get_letters(length, position)
+            if key not in self._ids_by_letter:
+                self._ids_by_letter[key] = {}
+            ids_by_letter = self._ids_by_letter[key]
+            if letter not in ids_by_letter:
+                ids_by_letter[letter] = set()
+            ids_by_letter[letter].add(word_id)
+        numpy_engine.forget_tables(self)
+        
+        return word_id
+    
+    def remove_word(self, word):
+        """
+        Removes a copy of a word from the word bank. Once it has no copies 
+        left, the word is no longer indexed, though it keeps its id.
+        
+        Args:
+            word: A string in the word bank.
+        
+        Returns:
+            The integer id of the word.
+        
+        Raises:
+            KeyError: The word has no copies in the word bank.
+        """
+        
+        word_id = self._id_by_word.get(word)
+        if word_id is None or not self.copies[word_id]:
+            raise KeyError(word)
+        
+        self.copies[word_id] -= 1
+        if self.copies[word_id]:
+            return word_id
+        
+        length = len(word)
+        self._ids_by_length[length].remove(word_id)
+        for position, letter in enumerate(word):
+            ids_by_letter = self._get_letters(length, position)
+            ids_by_letter[letter].discard(word_id)
+            if not ids_by_letter[letter]:
+                del ids_by_letter[letter]
+        numpy_engine.forget_tables(self)
+        
+        return word_id
+    
+    def ids_of_length(self, length):
+        """
+        Gets the ids of the words with the provided length.
+        
+        Args:
+            length: The integer length of the words.
+        
+        Returns:
+            A list of word ids, which is empty if there are no such words.
+        """
+        
+        return self._ids_by_length.get(length, [])
+    
+    def matching(self, length, position, letter):
+        """
+        Gets the ids of the words with the provided length that have the
+        provided letter at the provided position.
+        
+        Args:
+            length: The integer length of the words.
+            position: The position in the word the letter is at, starting at 0.
+            letter: The letter the words must have at the position.
+        
+        Returns:
+            A set of word ids. It is shared with the index, so it must not be
+            modified.
+        """
+        
+        return self.letters(length, position).get(letter, _NO_WORDS)
+    
+    def letters(self, length, position):
+        """
+        Gets the letters that appear at the provided position in the words with
+        the provided length, along with the words they appear in.
+        
+        Args:
+            length: The integer length of the words.
+            position: The position in the word the letters are at, starting at
+                      0.
+        
+        Returns:
+            A dictionary mapping each letter to a set of the ids of the words 
+            with that letter at the position. It is shared with the index, so 
+            it must not be modified.
+        """
+        
+        return self._get_letters(length, position) or _NO_LETTERS
+    
+    def __getstate__(self):
+        # The letters not loaded yet are loaded before the index is sent to
+        # another process, since the function loading them may not be able to
+        # go with it.
+        for length, first_id in self._first_ids.items():
+            for position in range(length):
+                self._get_letters(length, position)
+        
+        state = dict(self.__dict__)
+        state["_load_letters"] = None
+        state["_first_ids"] = {}
+        return state
+    
+    def _get_letters(self, length, position):
+        """
+        Gets the letters at a position of the words with a length, as letters
+        does, loading them the first time if they are loaded from a word bank.
+        
+        Args:
+            length: The integer length of the words.
+            position: The position in the word the letters are at, starting at
+                      0.
+        
+        Returns:
+            The dictionary the index keeps the letters in, or None if it has
+            no words with that length.
+        """
+        
+        key = (length, position)
+        ids_by_letter = self._ids_by_letter.get(key)
+        if (ids_by_letter is None and length in self._first_ids and
+                0 <= position < length):
+            ids_by_letter = self._load_letters(length, position, 
+                                               self._first_ids[length])
+            self._ids_by_letter[key] = ids_by_letter
+        
+        return ids_by_letter
+
+class DomainStore(object):
+    """
+    The ids of the words that can still be placed at each line of a puzzle,
+    along with an undo trail, so that the words removed while exploring a
+    search branch can be restored when the search backtracks.
+    
+    A domain is never modified in place. Narrowing a line's domain replaces its
+    set with a smaller one and records the old set on the trail, so restoring it
+    is only a matter of putting the old set back.
+    """
+    
+    def __init__(self, puzzle, word_index, fitting_words, on_change=None):
+        """
+        Args:
+            puzzle: The puzzle being solved.
+            word_index: The WordIndex the ids in fitting_words refer to.
+            fitting_words: A list mapping every line id to a set of the ids of
+                           the words that can fit at that line. The list is
+                           copied, and the sets are never modified.
+            on_change: An optional function called with the id of a line
+                       every time its domain is narrowed or restored.
+        """
+        
+        self._lengths = puzzle.lengths
+        self._word_index = word_index
+        self._domains = list(fitting_words)
+        self._trail = []
+        self._on_change = on_change
+    
+    def size(self, line_id):
+        """
+        Gets the number of words still in the domain of a line.
+        
+        Args:
+            line_id: The id of the line.
+        
+        Returns:
+            The integer number of words that can still fit at the line.
+        """
+        
+        return len(self._domains[line_id])
+    
+    def words(self, line_id):
+        """
+        Gets the words still in the domain of a line. Later changes to the 
+        domain do not affect the returned set, so it is safe to iterate over it
+        while searching.
+        
+        Args:
+            line_id: The id of the line.
+        
+        Returns:
+            A set of the ids of the words that can still fit at the line. It
+            must not be modified.
+        """
+        
+        return self._domains[line_id]
+    
+    def contains(self, line_id, word_id):
+        """
+        Checks whether a word is still in the domain of a line.
+        
+        Args:
+            line_id: The id of the line.
+            word_id: The id of a word with the line's length.
+        
+        Returns:
+            True if the word can still fit at the line, and False if not.
+        """
+        
+        return word_id in self._domains[line_id]
+    
+    def restrict(self, line_id, allowed_words):
+        """
+        Removes every word that is not in allowed_words from the domain of a
+        line, recording the removal on the undo trail.
+        
+        Args:
+            line_id: The id of the line.
+            allowed_words: A set of the word ids that may stay in the domain.
+        """
+        
+        domain = self._domains[line_id]
+        new_domain = domain & allowed_words
+        if len(new_domain) != len(domain):
+            self._trail.append((line_id, domain))
+            self._domains[line_id] = new_domain
+            if self._on_change:
+                self._on_change(line_id)
+    
+    def remove(self, line_id, removed_words):
+        """
+        Removes the provided words from the domain of a line, recording the
+        removal on the undo trail.
+        
+        Args:
+            line_id: The id of the line.
+            removed_words: A set of the word ids to take out of the domain.
+        """
+        
+        domain = self._domains[line_id]
+        new_domain = domain - removed_words
+        if len(new_domain) != len(domain):
+            self._trail.append((line_id, domain))
+            self._domains[line_id] = new_domain
+            if self._on_change:
+                self._on_change(line_id)
+    
+    def keep_letter(self, line_id, position, letter):
+        """
+        Removes every word that does not have the provided letter at the
+        provided position from the domain of a line, recording the removal on
+        the undo trail.
+        
+        Args:
+            line_id: The id of the line.
+            position: The position in the line, starting at 0.
+            letter: The letter the words must have at the position.
+        """
+        
+        self.restrict(line_id, self._word_index.matching(
+            self._lengths[line_id], position, letter))
+    
+    def keep_word(self, line_id, word_id):
+        """
+        Removes every word other than the provided one from the domain of a 
+        line, recording the removal on the undo trail.
+        
+        Args:
+            line_id: The id of the line.
+            word_id: The id of the word that may stay in the domain.
+        """
+        
+        self.restrict(line_id, {word_id})
+    
+    def revise(self, target_id, target_position, source_id, source_position):
+        """
+        Removes the words from the domain of the target line whose letter at the
+        point of intersection does not appear at that point in any of the words
+        in the domain of the source line, recording the removal on the undo 
+        trail.
+        
+        Args:
+            target_id: The id of the line words are being removed from.
+            target_position: The position in the target line the lines 
+                             intersect.
+            source_id: The id of the line the target line is checked against.
+            source_position: The position in the source line the lines 
+                             intersect.
+        
+        Returns:
+            True if any words were removed from the target line, and False if
+            not.
+        """
+        
+        word_index = self._word_index
+        source_words = self._domains[source_id]
+        source_letters = word_index.letters(self._lengths[source_id], 
+                                            source_position)
+        
+        # Whichever of the source domain and the letters at the source position
+        # is smaller decides how we find the letters the source line can still
+        # have.
+        if len(source_words) < len(source_letters):
+            supported = {word_index.words[word_id][source_position] 
+                         for word_id in source_words}
+        else:
+            supported = {letter for letter, ids in source_letters.items() 
+                         if not ids.isdisjoint(source_words)}
+        
+        target_words = self._domains[target_id]
+        target_letters = word_index.letters(self._lengths[target_id], 
+                                            target_position)
+        unsupported = [ids for letter, ids in target_letters.items()
+                       if letter not in supported 
+                       and not ids.isdisjoint(target_words)]
+        
+        if not unsupported:
+            return False
+        
+        self.remove(target_id, set().union(*unsupported))
+        return True
+    
+    def copy_domains(self):
+        """
+        Gets the current domain of every line.
+        
+        Returns:
+            A new list mapping every line id to a set of the ids of the
+            words that can still fit at that line. The sets must not be 
+            modified.
+        """
+        
+        return list(self._domains)
+    
+    def lines_changed_since(self, mark):
+        """
+        Gets the lines whose domains have been narrowed since a mark was taken.
+        
+        Args:
+            mark: A value returned by mark.
+        
+        Returns:
+            A list of line ids, without repeats, in the order they were first
+            narrowed.
+        """
+        
+        return list(dict.fromkeys(
+            line_id for line_id, old_domain in self._trail[mark:]))
+    
+    def mark(self):
+        """
+        Gets a marker for the current position in the undo trail.
+        
+        Returns:
+            A value that can be passed to undo to restore every domain to the
+            state it is in now.
+        """
+        
+        return len(self._trail)
+    
+    def undo(self, mark):
+        """
+        Restores all of the words removed since the provided mark was taken.
+        
+        Args:
+            mark: A value returned by mark.
+        """
+        
+        trail = self._trail
+        domains = self._domains
+        while len(trail) > mark:
+            line_id, old_domain = trail.pop()
+            domains[line_id] = old_domain
+            if self._on_change:
+                self._on_change(line_id)
+
+# The ways of keeping track of the words that can still fit at each line, by
+# name. Every one of them takes the same arguments as DomainStore, and has the
+# same methods.
+DOMAIN_STORES = {
+    ENGINE_PYTHON: DomainStore,
+    ENGINE_NUMPY: numpy_engine.MaskDomainStore,
+}
@@ -0,0 +1,365 @@
+import array
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+# The first bytes of every index file, which change whenever the layout of the
+# file does, so that files written by older versions are built again.
+INDEX_MAGIC = b"CWIDX001"
+
+# The name of the directory index files are kept in when no other directory is
+# given, next to the word list they were built from.
+DEFAULT_CACHE_DIR_NAME = ".word_index_cache"
+
+_HEADER_SIZE = struct.Struct("<Q")
+_ID_TYPE = "i"
+
+def load_word_bank(path, cache_dir=None, encoding="utf-8"):
+    """
+    Loads a word bank from a file holding one word per line. The words are
+    stripped of surrounding whitespace and made lower case, blank lines are
+    skipped, and each word is kept only once.
+    
+    The first time a file is loaded, the words are bucketed by length and
+    indexed by the letter at each of their positions, and the result is written
+    to an index file named after a hash of the path of the word list, along
+    with the size and modification time of the list. Later loads of the list,
+    while it keeps that size and modification time, map the index file into
+    memory without reading the list at all, and only decode the parts of it a
+    puzzle needs. Once the list changes, the index file is built again.
+    
+    Args:
+        path: The path of the word list.
+        cache_dir: An optional directory to keep index files in. If it is not
+                   provided, they are kept in a directory named
+                   DEFAULT_CACHE_DIR_NAME next to the word list.
+        encoding: The text encoding of the word list.
+    
+    Returns:
+        An IndexedWordBank, which can be passed to solver.solve in place of a
+        list of words.
+    """
+    
+    path = os.path.abspath(path)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(path), DEFAULT_CACHE_DIR_NAME)
+    index_name = hashlib.sha1(path.encode("utf-8")).hexdigest() + ".idx"
+    index_path = os.path.join(cache_dir, index_name)
+    
+    # The list is described before it is read, so that if it changes while it
+    # is being read, the index describes the old list and is built again.
+    source = describe_file(path)
+    word_bank = open_index(index_path, source)
+    if word_bank is not None:
+        return word_bank
+    
+    words_by_length = read_words(path, encoding)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        write_index(index_path, words_by_length, source)
+    except OSError:
+        # Without somewhere to keep the index, the words are used straight
+        # from the list, and the next load reads it again.
+        return IndexedWordBank(words_by_length)
+    
+    return open_index(index_path, source) or IndexedWordBank(words_by_length)
+
+def describe_file(path):
+    """
+    Describes a file by its path, size and modification time, which change
+    whenever the file is replaced or written to, without reading it.
+    
+    Args:
+        path: The path of the file.
+    
+    Returns:
+        A dictionary that can be written out as JSON.
+    """
+    
+    file_stat = os.stat(path)
+    return {
+        "path": os.path.abspath(path),
+        "size": file_stat.st_size,
+        "mtime_ns": file_stat.st_mtime_ns,
+    }
+
+def read_words(path, encoding="utf-8"):
+    """
+    Reads the words in a word list one line at a time, as described in
+    load_word_bank.
+    
+    Args:
+        path: The path of the word list.
+        encoding: The text encoding of the word list.
+    
+    Returns:
+        A dictionary mapping an integer length to a list of the distinct words
+        with that length, in the order they first appear in the list.
+    """
+    
+    seen_words = set()
+    words_by_length = {}
+    with open(path, encoding=encoding) as word_file:
+        for line in word_file:
+            word = line.strip().lower()
+            if not word or word in seen_words:
+                continue
+            
+            seen_words.add(word)
+            length = len(word)
+            if length not in words_by_length:
+                words_by_length[length] = []
+            words_by_length[length].append(word)
+    
+    return words_by_length
+
+def write_index(index_path, words_by_length, source=None):
+    """
+    Writes an index file for a word bank. The file starts with INDEX_MAGIC and
+    the size of a JSON header, which is followed by the header and the data it
+    describes. For every length, the data holds the words of that length joined
+    by newlines, and for every position and letter, an array of the positions,
+    in that list, of the words with that letter at that position.
+    
+    The file is written under another name and then renamed, so that a load
+    happening at the same time never sees half of it.
+    
+    Args:
+        index_path: The path of the index file.
+        words_by_length: A dictionary mapping an integer length to a list of
+                         distinct words with that length, none of which hold a
+                         newline.
+        source: An optional description of the word list, made by 
+                describe_file, that open_index checks the list against.
+    """
+    
+    blocks = []
+    data_size = 0
+    def add_block(block):
+        nonlocal data_size
+        offset = data_size
+        blocks.append(block)
+        
+        # Blocks start on a multiple of the size of an id, so the id arrays
+        # can be read straight out of the mapped file.
+        padding = -len(block) % array.array(_ID_TYPE).itemsize
+        blocks.append(b"\0" * padding)
+        data_size = data_size + len(block) + padding
+        return offset
+    
+    lengths = {}
+    for length in sorted(words_by_length.keys()):
+        words = words_by_length[length]
+        word_block = "\n".join(words).encode("utf-8")
+        
+        positions = []
+        for position in range(length):
+            ids_by_letter = {}
+            for word_id, word in enumerate(words):
+                letter = word[position]
+                if letter not in ids_by_letter:
+                    ids_by_letter[letter] = array.array(_ID_TYPE)
+                ids_by_letter[letter].append(word_id)
+            positions.append([
+                [letter, add_block(ids.tobytes()), len(ids)]
+                for letter, ids in sorted(ids_by_letter.items())])
+        
+        lengths[str(length)] = {
+            "count": len(words),
+            "words": [add_block(word_block), len(word_block)],
+            "positions": positions,
+        }
+    
+    header = json.dumps({
+        "byteorder": sys.byteorder,
+        "id_size": array.array(_ID_TYPE).itemsize,
+        "source": source,
+        "lengths": lengths,
+    }).encode("utf-8")
+    
+    temp_path = "{}.{}.tmp".format(index_path, os.getpid())
+    with open(temp_path, "wb") as index_file:
+        index_file.write(INDEX_MAGIC)
+        index_file.write(_HEADER_SIZE.pack(len(header)))
+        index_file.write(header)
+        for block in blocks:
+            index_file.write(block)
+    os.replace(temp_path, index_path)
+
+def open_index(index_path, source=None):
+    """
+    Maps an index file written by write_index into memory.
+    
+    Args:
+        index_path: The path of the index file.
+        source: An optional description of the word list, made by 
+                describe_file, which must match the one the file was written
+                with.
+    
+    Returns:
+        An IndexedWordBank reading from the file, or None if the file does not
+        exist, was not written in a form this machine can read, or was written
+        from another version of the word list.
+    """
+    
+    try:
+        with open(index_path, "rb") as index_file:
+            index_map = mmap.mmap(index_file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    
+    prefix_size = len(INDEX_MAGIC) + _HEADER_SIZE.size
+    if (len(index_map) < prefix_size 
+            or index_map[:len(INDEX_MAGIC)] != INDEX_MAGIC):
+        index_map.close()
+        return None
+    
+    header_size, = _HEADER_SIZE.unpack(index_map[len(INDEX_MAGIC):prefix_size])
+    try:
+        header = json.loads(
+            index_map[prefix_size:prefix_size + header_size].decode("utf-8"))
+    except ValueError:
+        index_map.close()
+        return None
+    
+    if (header["byteorder"] != sys.byteorder
+            or header["id_size"] != array.array(_ID_TYPE).itemsize
+            or (source is not None and header.get("source") != source)):
+        index_map.close()
+        return None
+    
+    return IndexedWordBank(None, index_map, header, prefix_size + header_size)
+
+class IndexedWordBank(object):
+    """
+    A word bank of distinct words, bucketed by length, whose words and letter
+    index can be read from a mapped index file one length at a time, and whose
+    letters are only decoded one position at a time as they are asked for. 
+    Iterating over it gives every word, so it can be used wherever a list of
+    words is.
+    """
+    
+    def __init__(self, words_by_length, index_map=None, header=None,
+                 data_offset=0):
+        """
+        Args:
+            words_by_length: A dictionary mapping an integer length to a list of
+                             the distinct words with that length, or None if
+                             the words are read from index_map.
+            index_map: An optional mmap.mmap of an index file.
+            header: The decoded header of the index file.
+            data_offset: The position in index_map the data after the header
+                         starts at.
+        """
+        
+        self._words_by_length = words_by_length
+        self._index_map = index_map
+        self._header = header
+        self._data_offset = data_offset
+        if words_by_length is None:
+            self._lengths = {int(length): info
+                             for length, info in header["lengths"].items()}
+        else:
+            self._lengths = {length: len(words)
+                             for length, words in words_by_length.items()}
+    
+    def __iter__(self):
+        for length in sorted(self._lengths.keys()):
+            yield from self.words_of_length(length)
+    
+    def __len__(self):
+        if self._words_by_length is None:
+            return sum(info["count"] for info in self._lengths.values())
+        return sum(self._lengths.values())
+    
+    def lengths(self):
+        """
+        Gets the lengths of the words in the word bank.
+        
+        Returns:
+            A sorted list of integer lengths.
+        """
+        
+        return sorted(self._lengths.keys())
+    
+    def words_of_length(self, length):
+        """
+        Gets the words with the provided length.
+        
+        Args:
+            length: The integer length of the words.
+        
+        Returns:
+            A new list of the words, in the order they first appear in the word
+            list, which is empty if there are no such words.
+        """
+        
+        if length not in self._lengths:
+            return []
+        if self._words_by_length is not None:
+            return list(self._words_by_length[length])
+        
+        offset, size = self._lengths[length]["words"]
+        start = self._data_offset + offset
+        return self._index_map[start:start + size].decode("utf-8").split("\n")
+    
+    def letters(self, length, position, first_id=0):
+        """
+        Gets the letters that appear at the provided position in the words with
+        the provided length, along with the words they appear in, in the form
+        solver.WordIndex keeps them.
+        
+        Args:
+            length: The integer length of the words.
+            position: The position in the word the letters are at, starting at
+                      0.
+            first_id: The id given to the first word of the length. The rest
+                      are numbered on from it in the order words_of_length
+                      returns them.
+        
+        Returns:
+            A new dictionary mapping each letter to a set of the ids of the
+            words with that letter at the position.
+        """
+        
+        if length not in self._lengths or not 0 <= position < length:
+            return {}
+        
+        if self._words_by_length is not None:
+            ids_by_letter = {}
+            for word_id, word in enumerate(self._words_by_length[length],
+                                           first_id):
+                letter = word[position]
+                if letter not in ids_by_letter:
+                    ids_by_letter[letter] = set()
+                ids_by_letter[letter].add(word_id)
+            return ids_by_letter
+        
+        data = memoryview(self._index_map)
+        ids_by_letter = {}
+        for letter, offset, count in self._lengths[length]["positions"][
+                position]:
+            start = self._data_offset + offset
+            ids = data[start:start + count * self._header["id_size"]].cast(
+                _ID_TYPE)
+            if first_id:
+                ids_by_letter[letter] = set(map(first_id.__add__, ids))
+            else:
+                ids_by_letter[letter] = set(ids)
+            ids.release()
+        data.release()
+        
+        return ids_by_letter
+    
+    def close(self):
+        """
+        Unmaps the index file, if there is one. The word bank cannot be read
+        from afterwards.
+        """
+        
+        if self._index_map is not None:
+            self._index_map.close()